@@ -1,9 +1,10 @@
 import streamlit as st
-import pandas as pd
+from core.models import BulkProfile
 from core.rule_engine import evaluate_patient
-from protocol_loader import load_protocol_yaml
-from data_adapters.block1_adapter import adapt_block1
-from data_adapters.block2_adapter import adapt_block2
+from protocol_loader import load_compiled_protocol, load_protocol_features
+from data_adapters.block1_adapter import Block1Extractor
+from data_adapters.block1_source import BLOCK1_PATH, Block1Dataset, load_block1_dataset
+from data_adapters.block2_study import load_block2_study
 
 # === Настройка страницы ===
 st.set_page_config(
@@ -16,171 +17,114 @@ st.set_page_config(
 st.title("🧠 EnrollOrNot")
 st.caption("Explainable, Traceable Eligibility Screening for Clinical Trials & RWE")
 
-# === Данные Block 1 ===
-def load_block1_data():
-    """Загружает данные Block 1 с автоматическим определением кодировки"""
-    try:
-        return pd.read_csv("data/block1_data.tsv", sep="\t", encoding="cp1252")
-    except:
-        return pd.read_csv("data/block1_data.tsv", sep="\t", encoding="utf-8")
+# === Сценарии ===
+SCENARIOS = {
+    "Block 1: DAPA-HF": {"protocol": "protocols/dapa_hf.yaml", "trial_id": "NCT03036124"},
+    "Block 1: SIGIR-20141": {"protocol": "protocols/sigir_20141.yaml", "trial_id": "NCT03057977"},
+    "Block 2: Study W01": {"protocol": "protocols/w01.yaml", "study_dir": "data/Study W01"},
+    "Block 2: Study W02": {"protocol": "protocols/w02.yaml", "study_dir": "data/Study W02"},
+}
+
+# === Кэшируемые ресурсы (загружаются один раз, а не при каждом клике) ===
+@st.cache_resource
+def load_protocol(path: str):
+    """Протокол, скомпилированный один раз на процесс."""
+    return load_compiled_protocol(path)
+
+@st.cache_resource
+def load_block1_data() -> Block1Dataset:
+    """Загружает данные Block 1: критерии каждого исследования хранятся один раз"""
+    return load_block1_dataset(BLOCK1_PATH)
+
+@st.cache_data(show_spinner="Screening all patients of the trial…")
+def screen_block1(trial_id: str, protocol_path: str) -> dict:
+    """
+    Оценивает сразу всех пациентов исследования — переключение между ними
+    дальше не требует ни извлечения, ни оценки.
+    """
+    plan = load_protocol(protocol_path)
+    extractor = Block1Extractor(plan.fields)  # только поля, на которые ссылается протокол
+    results = {}
+    for row in load_block1_data().rows(trial_id):
+        profile = BulkProfile(row["patient_id"], **extractor.extract(row["note"]))
+        results[row["patient_id"]] = {
+            "assessment": row.get("expert_eligibility", "N/A"),
+            "result": evaluate_patient(profile, plan),
+        }
+    return results
+
+@st.cache_data(show_spinner="Loading study and screening all patients…")
+def screen_block2(study_dir: str, protocol_path: str) -> dict:
+    """Весь Block 2 за один проход загрузчика исследования (load_block2_study)."""
+    plan = load_protocol(protocol_path)
+    study = load_block2_study(study_dir, fields=plan.fields)
+    features = study.features(load_protocol_features(protocol_path))
+    labels = dict(zip(study.manifest["patient_id"], study.manifest["eligible_label"]))
+    results = {}
+    for patient_id, profile in study.bulk_profiles().items():
+        profile.update(features.get(patient_id, {}))
+        results[patient_id] = {
+            "assessment": str(labels.get(patient_id, "N/A")).lower(),
+            "result": evaluate_patient(profile, plan),
+        }
+    return results
+
+# === Отображение результата ===
+def render_result(result: dict, assessment: str, plan) -> None:
+    # Визуализация статуса
+    status_color = {
+        "included": "🟢",
+        "excluded": "🔴",
+        "not enough information": "⚠️"
+    }
+    status_display = result['overall_status'].replace("_", " ").title()
+    st.subheader(f"{status_color.get(result['overall_status'], '❓')} **{status_display}**")
+    st.write(f"**Initial Assessment**: {assessment}")
+
+    # Пояснение для неопределённого статуса
+    if result['overall_status'] == "not enough information":
+        st.info("💡 Decision requires additional data. See missing fields below.")
+        missing_fields = []
+        for r in result["rule_results"]:
+            if r["status"] == "missing":
+                missing_fields.extend(sorted(plan.rule_fields.get(r["rule_id"], {r["rule_id"]})))
+        if missing_fields:
+            st.write(f"**Missing data**: {', '.join(missing_fields)}")
+
+    # Детали по правилам
+    with st.expander("Rule-by-Rule Breakdown"):
+        for rule_res in result["rule_results"]:
+            rule = plan.rules_by_id[rule_res["rule_id"]]
+            status = rule_res["status"]
+            icon = "✅" if status == "passed" else "❌" if status == "failed" else "❓"
+            st.markdown(f"{icon} **{rule['description']}** → `{status.upper()}`")
 
 # === Выбор сценария ===
 scenario = st.selectbox(
     "Select Scenario",
-    [
-        "Block 1: DAPA-HF",
-        "Block 1: SIGIR-20141",
-        "Block 2: Study W01",
-        "Block 2: Study W02"
-    ],
+    list(SCENARIOS),
     key="scenario_selector"
 )
+config = SCENARIOS[scenario]
+plan = load_protocol(config["protocol"])
 
 # === Обработка Block 1 ===
 if "Block 1" in scenario:
-    df_block1 = load_block1_data()
-    
-    if "DAPA-HF" in scenario:
-        protocol = load_protocol_yaml("protocols/dapa_hf.yaml")
-        trial_id = "NCT03036124"
-        filtered_df = df_block1[df_block1["trial_id"] == trial_id]
-    else:  # SIGIR-20141
-        protocol = load_protocol_yaml("protocols/sigir_20141.yaml")
-        trial_id = "NCT03057977"  # ✅ ИСПРАВЛЕНО!
-        filtered_df = df_block1[df_block1["trial_id"] == trial_id]
-    
-    if filtered_df.empty:
-        st.error(f"No data found for trial {trial_id}")
-        st.write("Available trial_ids in dataset:", df_block1["trial_id"].unique().tolist())
+    results = screen_block1(config["trial_id"], config["protocol"])
+    if not results:
+        st.error(f"No data found for trial {config['trial_id']}")
+        st.write("Available trial_ids in dataset:", load_block1_data().trial_ids())
     else:
-        patient_id = st.selectbox(
-            "Select Patient",
-            filtered_df["patient_id"].tolist(),
-            key="block1_patient"
-        )
+        patient_id = st.selectbox("Select Patient", list(results), key="block1_patient")
         if patient_id:
-            row = filtered_df[filtered_df["patient_id"] == patient_id].iloc[0].to_dict()
-            profile = adapt_block1(row)
-            result = evaluate_patient(profile.dict(), protocol)
-            
-            # Визуализация статуса
-            status_color = {
-                "included": "🟢",
-                "excluded": "🔴",
-                "not enough information": "⚠️"
-            }
-            status_display = result['overall_status'].replace("_", " ").title()
-            st.subheader(f"{status_color.get(result['overall_status'], '❓')} **{status_display}**")
-            st.write(f"**Initial Assessment**: {row.get('expert_eligibility', 'N/A')}")
-            
-            # Пояснение для неопределённого статуса
-            if result['overall_status'] == "not enough information":
-                st.info("💡 Decision requires additional data. See missing fields below.")
-                rule_id_to_field = {r["id"]: r["field"] for r in protocol}
-                missing_fields = []
-                for r in result["rule_results"]:
-                    if r["status"] == "missing":
-                        field = rule_id_to_field.get(r["rule_id"], r["rule_id"])
-                        missing_fields.append(field)
-                if missing_fields:
-                    st.write(f"**Missing data**: {', '.join(missing_fields)}")
-            
-            # Детали по правилам
-            with st.expander("Rule-by-Rule Breakdown"):
-                for rule_res in result["rule_results"]:
-                    rule = next(r for r in protocol if r["id"] == rule_res["rule_id"])
-                    status = rule_res["status"]
-                    icon = "✅" if status == "passed" else "❌" if status == "failed" else "❓"
-                    st.markdown(f"{icon} **{rule['description']}** → `{status.upper()}`")
-
-# === Обработка Block 2: W01 ===
-elif "W01" in scenario:
-    eligible_ids = [f"P{str(i).zfill(4)}" for i in range(1, 6)]
-    ineligible_ids = [f"P{str(i).zfill(4)}" for i in range(6, 11)]
-    all_ids = eligible_ids + ineligible_ids
-    
-    patient_id = st.selectbox(
-        "Select Patient",
-        all_ids,
-        key="w01_patient"
-    )
-    if patient_id:
-        base_path = "data/Study W01/Eligible Patients" if patient_id in eligible_ids else "data/Study W01/Not Eligible Patients"
-        profile = adapt_block2(patient_id, base_path)
-        protocol = load_protocol_yaml("protocols/w01.yaml")
-        result = evaluate_patient(profile.dict(), protocol)
-        
-        status_color = {
-            "included": "🟢",
-            "excluded": "🔴",
-            "not enough information": "⚠️"
-        }
-        status_display = result['overall_status'].replace("_", " ").title()
-        st.subheader(f"{status_color.get(result['overall_status'], '❓')} **{status_display}**")
-        ground_truth = "eligible" if patient_id in eligible_ids else "ineligible"
-        st.write(f"**Initial Assessment**: {ground_truth}")
-        
-        # Пояснение для неопределённого статуса
-        if result['overall_status'] == "not enough information":
-            st.info("💡 Decision requires additional data. See missing fields below.")
-            rule_id_to_field = {r["id"]: r["field"] for r in protocol}
-            missing_fields = []
-            for r in result["rule_results"]:
-                if r["status"] == "missing":
-                    field = rule_id_to_field.get(r["rule_id"], r["rule_id"])
-                    missing_fields.append(field)
-            if missing_fields:
-                st.write(f"**Missing data**: {', '.join(missing_fields)}")
-        
-        with st.expander("Rule-by-Rule Breakdown"):
-            for rule_res in result["rule_results"]:
-                rule = next(r for r in protocol if r["id"] == rule_res["rule_id"])
-                status = rule_res["status"]
-                icon = "✅" if status == "passed" else "❌" if status == "failed" else "❓"
-                st.markdown(f"{icon} **{rule['description']}** → `{status.upper()}`")
+            entry = results[patient_id]
+            render_result(entry["result"], entry["assessment"], plan)
 
-# === Обработка Block 2: W02 ===
-else:  # W02
-    eligible_ids = [f"S{str(i).zfill(4)}" for i in range(1, 16)]
-    ineligible_ids = [f"S{str(i).zfill(4)}" for i in range(16, 31)]
-    all_ids = eligible_ids + ineligible_ids
-    
-    patient_id = st.selectbox(
-        "Select Patient",
-        all_ids,
-        key="w02_patient"
-    )
+# === Обработка Block 2: W01 / W02 ===
+else:
+    results = screen_block2(config["study_dir"], config["protocol"])
+    key = "w01_patient" if "W01" in scenario else "w02_patient"
+    patient_id = st.selectbox("Select Patient", list(results), key=key)
     if patient_id:
-        base_path = "data/Study W02/Eligible Patients" if patient_id in eligible_ids else "data/Study W02/Not Eligible Patients"
-        profile = adapt_block2(patient_id, base_path)
-        protocol = load_protocol_yaml("protocols/w02.yaml")
-        result = evaluate_patient(profile.dict(), protocol)
-        
-        status_color = {
-            "included": "🟢",
-            "excluded": "🔴",
-            "not enough information": "⚠️"
-        }
-        status_display = result['overall_status'].replace("_", " ").title()
-        st.subheader(f"{status_color.get(result['overall_status'], '❓')} **{status_display}**")
-        ground_truth = "eligible" if patient_id in eligible_ids else "ineligible"
-        st.write(f"**Initial Assessment**: {ground_truth}")
-        
-        # Пояснение для неопределённого статуса
-        if result['overall_status'] == "not enough information":
-            st.info("💡 Decision requires additional data. See missing fields below.")
-            rule_id_to_field = {r["id"]: r["field"] for r in protocol}
-            missing_fields = []
-            for r in result["rule_results"]:
-                if r["status"] == "missing":
-                    field = rule_id_to_field.get(r["rule_id"], r["rule_id"])
-                    missing_fields.append(field)
-            if missing_fields:
-                st.write(f"**Missing data**: {', '.join(missing_fields)}")
-        
-        with st.expander("Rule-by-Rule Breakdown"):
-            for rule_res in result["rule_results"]:
-                rule = next(r for r in protocol if r["id"] == rule_res["rule_id"])
-                status = rule_res["status"]
-                icon = "✅" if status == "passed" else "❌" if status == "failed" else "❓"
-                st.markdown(f"{icon} **{rule['description']}** → `{status.upper()}`")
\ No newline at end of file
+        entry = results[patient_id]
+        render_result(entry["result"], entry["assessment"], plan)
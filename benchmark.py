@@ -0,0 +1,358 @@
+"""
+Бенчмарк извлечения, оценки и сквозного скрининга на синтетических когортах.
+
+Примеры:
+    python benchmark.py --sizes 1000 10000 -o bench.json
+    python benchmark.py --sizes 100000 --stages adapt_block1 evaluate_patient --workers 8
+
+Синтетические когорты строятся размножением реальных данных: строки
+data/block1_data.tsv и файлы пациентов исследования Block 2 (по умолчанию
+Study W02) копируются с новыми patient_id. Сгенерированные данные
+сохраняются в --workdir и переиспользуются между запусками.
+
+Каждая пара (этап, размер) выполняется в отдельном процессе, поэтому
+max_process_rss_mb относится именно к этому этапу: это пик самого
+большого процесса — этапа или одного из его исполнителей (не сумма по
+исполнителям screen; на Windows — null). Результат — JSON:
+    {"meta": {...}, "results": [{"stage", "size", "patients", "seconds",
+     "patients_per_sec", "p50_ms", "p99_ms", "max_process_rss_mb"}, ...]}
+
+С --cold-start N в отчёт добавляется "cold_start": время от запуска нового
+интерпретатора до первого результата для точек входа (COLD_START_TARGETS),
+медиана из N запусков, и тяжёлые модули (pandas, pydantic, ...), которые
+при этом были импортированы:
+    python benchmark.py --stages --cold-start 5
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+STAGES = ("adapt_block1", "adapt_block2", "evaluate_patient", "screen_block1", "screen_block2")
+# Этапы на когорте Block 1 (остальные — на когорте Block 2)
+BLOCK1_STAGES = ("adapt_block1", "evaluate_patient", "screen_block1")
+
+BLOCK1_SOURCE = "data/block1_data.tsv"
+BLOCK1_PROTOCOL = "protocols/dapa_hf.yaml"
+BLOCK2_SOURCE = "data/Study W02"
+BLOCK2_PROTOCOL = "protocols/w02.yaml"
+
+# Точки входа для замера холодного старта: код до первого результата
+COLD_START_TARGETS = {
+    "import_screen": "import screen",
+    "import_service": "import service",
+    "evaluate_patient": (
+        "from core.rule_engine import evaluate_patient\n"
+        "from protocol_loader import load_compiled_protocol\n"
+        f"evaluate_patient({{'age': 64, 'lvef': 35.0}}, load_compiled_protocol({BLOCK1_PROTOCOL!r}))"
+    ),
+    # Процесс-исполнитель screen.py: инициализация и первая строка Block 1
+    "screen_block1_worker": (
+        "import screen\n"
+        f"screen._init_worker({BLOCK1_PROTOCOL!r})\n"
+        "screen._screen_block1_chunk([{'patient_id': 'P1', "
+        "'note': '64-year-old man, LVEF 35%, NYHA class II, eGFR 48'}])"
+    ),
+    "adapt_block2": (
+        "import glob, os\n"
+        "from data_adapters.block2_adapter import adapt_block2\n"
+        f"path = sorted(glob.glob(os.path.join({BLOCK2_SOURCE!r}, '*', '*_clinical_note.csv')))[0]\n"
+        "adapt_block2(os.path.basename(path)[:-len('_clinical_note.csv')], os.path.dirname(path))"
+    ),
+}
+
+# Модули, импорт которых заметен при старте
+HEAVY_MODULES = ("pandas", "numpy", "pydantic", "pyarrow", "yaml", "streamlit")
+
+# === Синтетические когорты ===
+def make_block1_cohort(size: int, workdir: str, source: str = BLOCK1_SOURCE) -> str:
+    """TSV Block 1 из size строк: строки исходного файла по кругу с новыми patient_id."""
+    from data_adapters.block1_source import iter_block1_rows
+
+    path = os.path.join(workdir, f"block1_{size}.tsv")
+    if os.path.exists(path):
+        return path
+    os.makedirs(workdir, exist_ok=True)
+    template = list(iter_block1_rows(source))
+    columns = list(template[0])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, delimiter="\t")
+        writer.writeheader()
+        for i in range(size):
+            row = dict(template[i % len(template)])
+            row["patient_id"] = f"syn-{i:07d}"
+            writer.writerow(row)
+    os.replace(tmp_path, path)
+    return path
+
+def make_block2_cohort(size: int, workdir: str, source: str = BLOCK2_SOURCE) -> str:
+    """
+    Папка исследования Block 2 из size пациентов: файлы пациентов-шаблонов
+    копируются с заменой patient_id в имени и содержимом; manifest.csv — тоже.
+    """
+    import pandas as pd
+
+    study_name = os.path.basename(os.path.normpath(source)).replace(" ", "_")
+    study_dir = os.path.join(workdir, f"block2_{study_name}_{size}")
+    if os.path.exists(os.path.join(study_dir, "manifest.csv")):
+        return study_dir
+
+    manifest = pd.read_csv(os.path.join(source, "manifest.csv"), dtype={"patient_id": str})
+    templates = []
+    for record in manifest.to_dict("records"):
+        pid = record["patient_id"]
+        files = {}
+        for folder in sorted(os.listdir(source)):
+            folder_path = os.path.join(source, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in os.listdir(folder_path):
+                if name.startswith(f"{pid}_"):
+                    with open(os.path.join(folder_path, name), encoding="utf-8") as f:
+                        files[(folder, name[len(pid):])] = f.read()
+        templates.append((record, files))
+
+    shutil.rmtree(study_dir, ignore_errors=True)
+    rows = []
+    width = max(4, len(str(size)))
+    for i in range(size):
+        record, files = templates[i % len(templates)]
+        old_pid, new_pid = record["patient_id"], f"X{i:0{width}d}"
+        for (folder, suffix), text in files.items():
+            folder_path = os.path.join(study_dir, folder)
+            os.makedirs(folder_path, exist_ok=True)
+            with open(os.path.join(folder_path, new_pid + suffix), "w", encoding="utf-8") as f:
+                f.write(text.replace(old_pid, new_pid))
+        rows.append({
+            k: (v.replace(old_pid, new_pid) if isinstance(v, str) else v)
+            for k, v in record.items()
+        })
+    # manifest.csv пишется последним: по нему определяется, что когорта готова
+    pd.DataFrame(rows, columns=manifest.columns).to_csv(os.path.join(study_dir, "manifest.csv"), index=False)
+    return study_dir
+
+# === Этапы ===
+def _latency_stats(latencies_ns: List[int], seconds: float, patients: int) -> Dict[str, Any]:
+    import numpy as np
+
+    stats = {
+        "patients": patients,
+        "seconds": round(seconds, 6),
+        "patients_per_sec": round(patients / seconds, 2) if seconds > 0 else None,
+        "p50_ms": None,
+        "p99_ms": None,
+    }
+    if latencies_ns:
+        p50, p99 = np.percentile(np.asarray(latencies_ns, dtype=np.int64), [50, 99]) / 1e6
+        stats["p50_ms"], stats["p99_ms"] = round(float(p50), 4), round(float(p99), 4)
+    return stats
+
+def _timed(fn, items) -> Dict[str, Any]:
+    """Вызывает fn для каждого элемента, замеряя задержку на пациента."""
+    clock = time.perf_counter_ns
+    latencies = []
+    start = clock()
+    for item in items:
+        t0 = clock()
+        fn(item)
+        latencies.append(clock() - t0)
+    return _latency_stats(latencies, (clock() - start) / 1e9, len(latencies))
+
+def _bench_adapt_block1(path: str, **_) -> Dict[str, Any]:
+    from data_adapters.block1_adapter import adapt_block1
+    from data_adapters.block1_source import iter_block1_rows
+
+    rows = list(iter_block1_rows(path, usecols=("patient_id", "note")))
+    return _timed(adapt_block1, rows)
+
+def _bench_adapt_block2(path: str, **_) -> Dict[str, Any]:
+    from data_adapters.block2_adapter import adapt_block2
+    from data_adapters.block2_study import load_block2_study
+
+    # Папки пациентов — по их текстам врача (самые маленькие файлы)
+    base_paths = load_block2_study(path, fields=("type1_diabetes",)).base_paths
+    return _timed(lambda pid: adapt_block2(pid, base_paths[pid]), list(base_paths))
+
+def _bench_evaluate_patient(path: str, **_) -> Dict[str, Any]:
+    from core.rule_engine import evaluate_patient
+    from data_adapters.block1_source import iter_block1_profiles
+    from protocol_loader import load_compiled_protocol
+
+    plan = load_compiled_protocol(BLOCK1_PROTOCOL)
+    profiles = [profile.model_dump() for profile in iter_block1_profiles(path)]
+    return _timed(lambda profile: evaluate_patient(profile, plan), profiles)
+
+def _bench_screen(path: str, protocol: str, workers: int, workdir: str, **_) -> Dict[str, Any]:
+    from screen import screen
+
+    output = os.path.join(workdir, "screen_output.csv")
+    start = time.perf_counter()
+    counts = screen(protocol, path, output, workers=workers)
+    seconds = time.perf_counter() - start
+    # Сквозной этап: задержка на пациента не измеряется, только пропускная способность
+    return _latency_stats([], seconds, sum(counts.values()))
+
+def _run_stage(stage: str, size: int, workdir: str, workers: int) -> Dict[str, Any]:
+    """Выполняется в отдельном процессе: пиковая память относится только к этапу."""
+    if stage in BLOCK1_STAGES:
+        path = make_block1_cohort(size, workdir)
+        protocol = BLOCK1_PROTOCOL
+    else:
+        path = make_block2_cohort(size, workdir)
+        protocol = BLOCK2_PROTOCOL
+
+    bench = {
+        "adapt_block1": _bench_adapt_block1,
+        "adapt_block2": _bench_adapt_block2,
+        "evaluate_patient": _bench_evaluate_patient,
+        "screen_block1": _bench_screen,
+        "screen_block2": _bench_screen,
+    }[stage]
+    result = bench(path=path, protocol=protocol, workers=workers, workdir=workdir)
+
+    return {"stage": stage, "size": size, **result, "max_process_rss_mb": _max_process_rss_mb()}
+
+def _max_process_rss_mb() -> Optional[float]:
+    """
+    Пиковая память самого большого процесса: текущего или одного из завершённых
+    дочерних (RUSAGE_CHILDREN.ru_maxrss — максимум по процессам, а не сумма).
+    None, если модуля resource нет (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss — в КБ на Linux и в байтах на macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return round(peak * scale / 2 ** 20, 1)
+
+# === Холодный старт ===
+_COLD_START_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile(sys.argv[1], "<cold-start>", "exec"))
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "heavy_modules": [m for m in sys.argv[2].split(",") if m in sys.modules],
+    "modules": len(sys.modules),
+}))
+"""
+
+def measure_cold_start(targets: Optional[List[str]] = None, repeat: int = 5) -> List[Dict[str, Any]]:
+    """
+    Холодный старт точек входа: каждый запуск — новый интерпретатор (python -c).
+    seconds — от начала кода цели до первого результата (импорты, загрузка
+    протокола, первый пациент), process_seconds — вместе с запуском самого
+    интерпретатора; медианы из repeat запусков.
+    """
+    results = []
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")]))}
+    for target in targets or list(COLD_START_TARGETS):
+        runs, process_seconds = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, "-c", _COLD_START_PROBE, COLD_START_TARGETS[target], ",".join(HEAVY_MODULES)],
+                capture_output=True, text=True, check=True, env=env,
+            ).stdout
+            process_seconds.append(time.perf_counter() - start)
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        result = {
+            "target": target,
+            "seconds": round(statistics.median(r["seconds"] for r in runs), 6),
+            "process_seconds": round(statistics.median(process_seconds), 6),
+            "modules": runs[-1]["modules"],
+            "heavy_modules": runs[-1]["heavy_modules"],
+        }
+        print(
+            f"cold start {target:<22} {result['seconds'] * 1000:.1f} ms "
+            f"(process {result['process_seconds'] * 1000:.1f} ms), heavy: {', '.join(result['heavy_modules']) or '-'}",
+            file=sys.stderr,
+        )
+        results.append(result)
+    return results
+
+def run_benchmark(
+    sizes: List[int],
+    stages: List[str] = STAGES,
+    workdir: str = ".bench",
+    workers: int = 1,
+    cold_start_repeat: int = 0,
+) -> Dict[str, Any]:
+    """
+    Все этапы для всех размеров; каждый этап — в новом процессе (spawn).
+    cold_start_repeat > 0 — ещё и холодный старт (measure_cold_start).
+    """
+    # Когорты генерируются заранее, чтобы генерация не попадала в замеры памяти этапов
+    for size in sizes:
+        if any(stage in BLOCK1_STAGES for stage in stages):
+            make_block1_cohort(size, workdir)
+        if any(stage not in BLOCK1_STAGES for stage in stages):
+            make_block2_cohort(size, workdir)
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        for stage in stages:
+            with context.Pool(1) as pool:
+                result = pool.apply(_run_stage, (stage, size, workdir, workers))
+            print(
+                f"{stage:<18} n={size:<8} {result['patients_per_sec']} patients/s, "
+                f"p50={result['p50_ms']} ms, p99={result['p99_ms']} ms, "
+                f"max process RSS={result['max_process_rss_mb']} MB",
+                file=sys.stderr,
+            )
+            results.append(result)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": workers,
+        },
+        "results": results,
+    }
+    if cold_start_repeat > 0:
+        report["cold_start"] = measure_cold_start(repeat=cold_start_repeat)
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EnrollOrNot throughput benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="synthetic cohort sizes (default: 1000 10000)")
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=list(STAGES),
+                        help="stages to run (none: only --cold-start)")
+    parser.add_argument("--workdir", default=".bench", help="where synthetic cohorts are generated and kept")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for screen stages")
+    parser.add_argument("--cold-start", type=int, default=0, metavar="N",
+                        help="also measure cold start of entry points, N runs each")
+    parser.add_argument("-o", "--output", help="JSON report path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.sizes, args.stages, args.workdir, args.workers, args.cold_start)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from core.rule_engine import CompiledProtocol, Expression, compile_protocol
+
+RULE_STATUSES = ["passed", "failed", "missing"]
+OVERALL_STATUSES = ["included", "excluded", "not enough information"]
+
+def _compare_column(values: pd.Series, func, threshold) -> np.ndarray:
+    """
+    Сравнивает колонку с порогом одной векторной операцией.
+    Если типы несовместимы, сравнение идёт поэлементно, а ошибки считаются
+    нарушением правила — как в evaluate_patient.
+    """
+    try:
+        return np.asarray(func(values, threshold), dtype=bool)
+    except Exception:
+        pass
+
+    def safe(value):
+        try:
+            return bool(func(value, threshold))
+        except Exception:
+            return False
+
+    return np.fromiter((safe(v) for v in values), dtype=bool, count=len(values))
+
+def _expression_codes(profiles_df: pd.DataFrame, node: Expression, cache: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Коды статусов узла составного правила по всей когорте (0 passed,
+    1 failed, 2 missing) — та же трёхзначная логика, что Expression.status.
+    Общие узлы и поля вычисляются один раз (cache: key узла → коды).
+    """
+    codes = cache.get(node.key)
+    if codes is not None:
+        return codes
+
+    n = len(profiles_df)
+    if node.kind == "leaf":
+        if node.field in profiles_df.columns:
+            column = profiles_df[node.field]
+            missing = column.isna().to_numpy()
+        else:
+            column = None
+            missing = np.ones(n, dtype=bool)
+        passed = np.zeros(n, dtype=bool)
+        present = ~missing
+        if present.any():
+            passed[present] = _compare_column(column[present], node.func, node.value)
+        codes = np.where(missing, 2, np.where(passed, 0, 1)).astype(np.int8)
+    elif node.kind == "not":
+        child = _expression_codes(profiles_df, node.children[0], cache)
+        codes = np.where(child == 2, 2, 1 - np.minimum(child, 1)).astype(np.int8)
+    else:
+        children = [_expression_codes(profiles_df, child, cache) for child in node.children]
+        decisive, other = (1, 0) if node.kind == "all" else (0, 1)
+        any_decisive = np.logical_or.reduce([c == decisive for c in children])
+        any_missing = np.logical_or.reduce([c == 2 for c in children])
+        codes = np.select([any_decisive, any_missing], [decisive, 2], default=other).astype(np.int8)
+
+    cache[node.key] = codes
+    return codes
+
+def evaluate_cohort(
+    profiles_df: pd.DataFrame,
+    rules: Union[List[Dict], CompiledProtocol]
+) -> pd.DataFrame:
+    """
+    Оценивает всю когорту против протокола: каждое правило — одна операция над колонкой.
+
+    Аргументы:
+        profiles_df: DataFrame профилей (строка = пациент, колонки = поля PatientProfile),
+            например pd.DataFrame([p.model_dump() for p in profiles]).
+            Пустые значения (None/NaN) считаются отсутствующими.
+        rules: список правил из YAML или CompiledProtocol
+
+    Возвращает:
+        DataFrame с тем же индексом: по категориальной колонке на каждое rule_id
+        со статусом "passed" | "failed" | "missing" и колонка "overall_status".
+        Результаты совпадают с evaluate_patient для каждой строки.
+    """
+    plan = compile_protocol(rules)
+    n = len(profiles_df)
+
+    statuses: Dict[str, pd.Categorical] = {}
+    any_missing = np.zeros(n, dtype=bool)
+    failed = []
+
+    expression_cache: Dict[str, np.ndarray] = {}
+
+    for rule_id, field, func, threshold in plan.checks:
+        if field is None:
+            # Составное правило: func — корневой узел Expression
+            codes = _expression_codes(profiles_df, func, expression_cache)
+            missing = codes == 2
+            failed.append(codes == 1)
+            any_missing |= missing
+            statuses[rule_id] = pd.Categorical.from_codes(codes, categories=RULE_STATUSES)
+            continue
+
+        if field in profiles_df.columns:
+            column = profiles_df[field]
+            missing = column.isna().to_numpy()
+        else:
+            column = None
+            missing = np.ones(n, dtype=bool)
+
+        passed = np.zeros(n, dtype=bool)
+        present = ~missing
+        if present.any():
+            passed[present] = _compare_column(column[present], func, threshold)
+
+        rule_failed = present & ~passed
+        failed.append(rule_failed)
+        any_missing |= missing
+        codes = np.where(missing, 2, np.where(passed, 0, 1)).astype(np.int8)
+        statuses[rule_id] = pd.Categorical.from_codes(codes, categories=RULE_STATUSES)
+
+    # Итоговый статус: missing важнее всего, затем любое failed-правило inclusion/exclusion
+    any_failed = np.zeros(n, dtype=bool)
+    for i in plan.inclusion_idx + plan.exclusion_idx:
+        any_failed |= failed[i]
+
+    matrix = pd.DataFrame(statuses, index=profiles_df.index)
+    overall_codes = np.select([any_missing, any_failed], [2, 1], default=0).astype(np.int8)
+    matrix["overall_status"] = pd.Categorical.from_codes(overall_codes, categories=OVERALL_STATUSES)
+    return matrix
@@ -0,0 +1,265 @@
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Union
+from urllib.parse import quote, unquote
+
+from core.models import PROFILE_FIELDS, PROFILE_SCHEMA
+from core.rule_engine import OPERATORS, CompiledProtocol, compile_protocol
+
+STATUS_PREFIX = "status."
+PART_NAME = "part-0.parquet"
+
+# Тип значения временного признака по его виду (см. protocol_loader.FEATURE_KINDS)
+FEATURE_TYPES = {"latest": "float64", "count": "int64", "encounter_count": "int64", "panel_complete": "bool_",
+                 "units_standard": "bool_"}
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required for the cohort store. "
+            "Install it with: pip install pyarrow"
+        )
+    return pa, pq
+
+def _arrow_type(pa, annotation) -> Any:
+    """Optional[int] → int64, Optional[float] → float64, Optional[bool] → bool, прочее — строка."""
+    args = getattr(annotation, "__args__", (annotation,))
+    for t, arrow in ((bool, pa.bool_()), (int, pa.int64()), (float, pa.float64()), (str, pa.string())):
+        if t in args:
+            return arrow
+    return pa.string()
+
+def cohort_schema(
+    protocol_rules: Union[List[Dict], CompiledProtocol],
+    feature_specs: Optional[Dict[str, Dict[str, Any]]] = None
+):
+    """Схема раздела: поля профиля, признаки протокола, статусы его правил."""
+    pa, _ = _pyarrow()
+    plan = compile_protocol(protocol_rules)
+    status = pa.dictionary(pa.int8(), pa.string())
+    fields = [pa.field("patient_id", pa.string())]
+    for name in PROFILE_FIELDS:
+        if name == "patient_id":
+            continue
+        annotation = PROFILE_SCHEMA[name][0]
+        fields.append(pa.field(name, _arrow_type(pa, annotation)))
+    for name, spec in (feature_specs or {}).items():
+        if name not in PROFILE_FIELDS:
+            fields.append(pa.field(name, getattr(pa, FEATURE_TYPES.get(spec.get("kind"), "string"))()))
+    for rule_id in dict.fromkeys(check[0] for check in plan.checks):
+        fields.append(pa.field(STATUS_PREFIX + rule_id, status))
+    fields.append(pa.field("overall_status", status))
+    return pa.schema(fields)
+
+def cohort_record(patient_id: str, profile: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Плоская запись для CohortWriter: поля профиля (PatientProfile, BulkProfile
+    или словарь) плюс status.<rule_id> и overall_status из evaluate_patient.
+    """
+    if hasattr(profile, "to_dict"):
+        record = profile.to_dict()
+    elif hasattr(profile, "model_dump"):
+        record = profile.model_dump()
+    else:
+        record = dict(profile)
+    record["patient_id"] = patient_id
+    for r in result["rule_results"]:
+        record[STATUS_PREFIX + r["rule_id"]] = r["status"]
+    record["overall_status"] = result["overall_status"]
+    return record
+
+class CohortWriter:
+    """
+    Пишет раздел частями (append) в ParquetWriter. Файл становится видимым
+    только после close(): запись идёт во временный файл, затем os.replace.
+    """
+
+    def __init__(self, path: str, schema):
+        pa, pq = _pyarrow()
+        self._pa = pa
+        self.path = path
+        self.schema = schema
+        self._tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._writer = pq.ParquetWriter(self._tmp_path, schema)
+        self.rows = 0
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        columns = {}
+        for field in self.schema:
+            values = [record.get(field.name) for record in records]
+            if field.name == "source_files":
+                values = [json.dumps(v, ensure_ascii=False) if v is not None else None for v in values]
+            columns[field.name] = values
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self.schema))
+        self.rows += len(records)
+
+    def close(self) -> None:
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+class CohortStore:
+    """
+    Колоночное хранилище когорт: извлечённые поля профилей и статусы правил
+    в Parquet, по разделу на пару (исследование, протокол):
+
+        <root>/study=<исследование>/protocol=<протокол>/part-0.parquet
+
+    Колонки: patient_id, поля PatientProfile (source_files — JSON-строкой),
+    временные признаки протокола, status.<rule_id> и overall_status.
+    Чтение — через memory map и только нужных колонок, поэтому запросы
+    осуществимости («сколько пройдёт при eGFR ≥ 25») не требуют повторного
+    извлечения. Нужен pyarrow (импортируется при первом обращении).
+
+    Пример:
+        store = CohortStore("cohorts")
+        store.write("Study W02", "w02", plan, records)
+        store.count_where("Study W02", "w02", "egfr", ">=", 25)
+        store.what_if("Study W02", "w02", amended_rules)["overall_status"].value_counts()
+        store.sweep("Study W02", "w02", rules, "R4", range(100, 161, 5))
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def partition_path(self, study: str, protocol: str) -> str:
+        return os.path.join(
+            self.root,
+            f"study={quote(study, safe='')}",
+            f"protocol={quote(protocol, safe='')}",
+            PART_NAME,
+        )
+
+    def partitions(self) -> List[tuple]:
+        """Пары (исследование, протокол), для которых есть данные."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for study_dir in sorted(os.listdir(self.root)):
+            if not study_dir.startswith("study="):
+                continue
+            for protocol_dir in sorted(os.listdir(os.path.join(self.root, study_dir))):
+                path = os.path.join(self.root, study_dir, protocol_dir, PART_NAME)
+                if protocol_dir.startswith("protocol=") and os.path.exists(path):
+                    found.append((unquote(study_dir[len("study="):]), unquote(protocol_dir[len("protocol="):])))
+        return found
+
+    # === Запись ===
+    def writer(
+        self,
+        study: str,
+        protocol: str,
+        protocol_rules: Union[List[Dict], CompiledProtocol],
+        feature_specs: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> CohortWriter:
+        """Потоковая запись раздела; существующий раздел заменяется при close()."""
+        return CohortWriter(self.partition_path(study, protocol), cohort_schema(protocol_rules, feature_specs))
+
+    def write(
+        self,
+        study: str,
+        protocol: str,
+        protocol_rules: Union[List[Dict], CompiledProtocol],
+        records: Iterable[Dict[str, Any]],
+        feature_specs: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> int:
+        writer = self.writer(study, protocol, protocol_rules, feature_specs)
+        try:
+            writer.append(list(records))
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+        return writer.rows
+
+    # === Чтение ===
+    def read(self, study: str, protocol: str, columns: Optional[List[str]] = None):
+        """pyarrow.Table раздела (memory map; читаются только нужные колонки)."""
+        _, pq = _pyarrow()
+        path = self.partition_path(study, protocol)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cohort partition not found: {path}")
+        if columns is not None:
+            available = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in available]
+        return pq.read_table(path, columns=columns, memory_map=True)
+
+    def dataset(self):
+        """Все разделы как pyarrow.dataset с колонками study и protocol."""
+        _pyarrow()
+        import pyarrow.dataset as ds
+
+        return ds.dataset(self.root, format="parquet", partitioning="hive")
+
+    # === Запросы осуществимости ===
+    def count_where(self, study: str, protocol: str, field: str, operator: str, value: Any) -> Dict[str, int]:
+        """
+        Сколько пациентов прошли бы одно условие «field operator value»:
+        {"passed", "failed", "missing"} — просмотр одной колонки.
+        Операторы — как в правилах (OPERATORS): between — value [low, high],
+        in — список значений.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator}")
+        if operator == "between" and not (isinstance(value, (list, tuple)) and len(value) == 2):
+            raise ValueError(f"Operator between needs value [low, high], got {value!r}")
+        if operator == "in" and not isinstance(value, (list, tuple)):
+            raise ValueError(f"Operator in needs a list of values, got {value!r}")
+        table = self.read(study, protocol, columns=[field])
+        if field not in table.column_names:
+            return {"passed": 0, "failed": 0, "missing": self.read(study, protocol, ["patient_id"]).num_rows}
+        column = table[field]
+        if operator == "between":
+            low, high = value
+            matched = pc.and_(pc.greater_equal(column, low), pc.less_equal(column, high))
+        elif operator == "in":
+            matched = pc.is_in(column, value_set=pa.array(list(value), type=column.type))
+        else:
+            compare = {
+                ">=": pc.greater_equal, "<=": pc.less_equal, ">": pc.greater,
+                "<": pc.less, "==": pc.equal, "!=": pc.not_equal,
+            }[operator]
+            matched = compare(column, value)
+        missing = column.null_count
+        passed = pc.sum(matched).as_py() or 0
+        return {"passed": passed, "failed": len(column) - missing - passed, "missing": missing}
+
+    def what_if(self, study: str, protocol: str, protocol_rules: Union[List[Dict], CompiledProtocol]):
+        """
+        Статусы пациентов раздела по другому (например, изменённому) протоколу:
+        evaluate_cohort по сохранённым колонкам, без повторного извлечения.
+        """
+        from core.cohort_engine import evaluate_cohort
+
+        plan = compile_protocol(protocol_rules)
+        table = self.read(study, protocol, columns=["patient_id", *sorted(plan.fields)])
+        profiles = table.to_pandas().set_index("patient_id")
+        return evaluate_cohort(profiles, plan)
+
+    def sweep(
+        self,
+        study: str,
+        protocol: str,
+        protocol_rules: Union[List[Dict], CompiledProtocol],
+        rule_id: str,
+        thresholds: Iterable[float]
+    ):
+        """Перебор порога правила по сохранённым колонкам (см. core.feasibility.sweep_threshold)."""
+        from core.feasibility import sweep_threshold
+
+        plan = compile_protocol(protocol_rules)
+        table = self.read(study, protocol, columns=["patient_id", *sorted(plan.fields)])
+        return sweep_threshold(table.to_pandas().set_index("patient_id"), plan, rule_id, thresholds)
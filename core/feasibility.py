@@ -0,0 +1,134 @@
+import numbers
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from core.cohort_engine import OVERALL_STATUSES, evaluate_cohort
+from core.rule_engine import CompiledProtocol, compile_protocol
+
+# Операторы с одним числовым порогом (between, in и составные правила перебирать нечего)
+_THRESHOLD_OPERATORS = (">=", ">", "<=", "<", "==", "!=")
+
+def _numeric_values(column: pd.Series) -> np.ndarray:
+    """
+    Значения колонки как float; NaN — у значений, которые не числа.
+    Строки ("45") не приводятся к числу: evaluate_patient сравнивает их
+    с порогом как есть, и правило не проходит.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=float)
+    numeric = column.map(lambda v: isinstance(v, (numbers.Real, np.bool_))).to_numpy(dtype=bool)
+    values = np.full(len(column), np.nan)
+    values[numeric] = column[numeric].to_numpy(dtype=float)
+    return values
+
+class ThresholdSweep:
+    """
+    Индекс для перебора порога одного правила («LVEF ≤ 40 → ≤ 45»).
+
+    Остальные правила оцениваются один раз (evaluate_cohort). Дальше важны
+    только «кандидаты» — пациенты без missing и без failed по другим
+    правилам: их значения поля сортируются, и число включённых при любом
+    пороге — один бинарный поиск по этому массиву. Число «not enough
+    information» от порога не зависит (missing важнее failed).
+
+    Пример:
+        sweep = ThresholdSweep(profiles_df, rules, "R4")
+        sweep.counts(range(20, 41))   # строки — пороги, колонки — итоговые статусы
+    """
+
+    def __init__(
+        self,
+        profiles_df: pd.DataFrame,
+        rules: Union[List[Dict], CompiledProtocol],
+        rule_id: str
+    ):
+        plan = compile_protocol(rules)
+        positions = [i for i, check in enumerate(plan.checks) if check[0] == rule_id]
+        if not positions:
+            raise ValueError(f"Rule not found in protocol: {rule_id}")
+        target = positions[0]
+        rule = plan.rules[target]
+        if rule.get("operator") not in _THRESHOLD_OPERATORS:
+            raise ValueError(f"Rule {rule_id} is not a single comparison with a threshold")
+        self.rule_id = rule_id
+        self.field = rule["field"]
+        self.operator = rule["operator"]
+        self.n = len(profiles_df)
+
+        others = [r for i, r in enumerate(plan.rules) if i != target]
+        other_plan = compile_protocol(others)
+        statuses = evaluate_cohort(profiles_df, other_plan)
+        other_missing = np.zeros(self.n, dtype=bool)
+        other_failed = np.zeros(self.n, dtype=bool)
+        for i, (other_id, _, _, _) in enumerate(other_plan.checks):
+            column = statuses[other_id]
+            other_missing |= (column == "missing").to_numpy()
+            if i in other_plan.inclusion_idx or i in other_plan.exclusion_idx:
+                other_failed |= (column == "failed").to_numpy()
+
+        if self.field in profiles_df.columns:
+            column = profiles_df[self.field]
+            missing = column.isna().to_numpy()
+        else:
+            column = pd.Series(np.nan, index=profiles_df.index)
+            missing = np.ones(self.n, dtype=bool)
+
+        self.not_enough_information = int((other_missing | missing).sum())
+        candidates = ~other_missing & ~missing & ~other_failed
+        values = _numeric_values(column[candidates])
+        # Нечисловые значения с числовым порогом несравнимы: правило для них
+        # failed (как в evaluate_patient), для "!=" — passed
+        self._non_numeric = int(np.isnan(values).sum())
+        self._sorted = np.sort(values[~np.isnan(values)])
+        # Правило без типа inclusion/exclusion на итог не влияет
+        self._counts_toward_status = target in plan.inclusion_idx or target in plan.exclusion_idx
+
+    def passed(self, thresholds: Iterable[float]) -> np.ndarray:
+        """Сколько кандидатов прошли бы правило при каждом пороге."""
+        t = np.asarray(list(thresholds), dtype=float)
+        values = self._sorted
+        total = len(values)
+        if not self._counts_toward_status:
+            return np.full(len(t), total + self._non_numeric, dtype=np.int64)
+        left = np.searchsorted(values, t, side="left")
+        right = np.searchsorted(values, t, side="right")
+        op = self.operator
+        if op == ">=":
+            return total - left
+        if op == ">":
+            return total - right
+        if op == "<=":
+            return right
+        if op == "<":
+            return left
+        if op == "==":
+            return right - left
+        if op == "!=":
+            return total - (right - left) + self._non_numeric
+        raise ValueError(f"Unsupported operator: {op}")
+
+    def counts(self, thresholds: Iterable[float]) -> pd.DataFrame:
+        """Итоговые статусы когорты по порогам: индекс — порог, колонки — OVERALL_STATUSES."""
+        thresholds = list(thresholds)
+        included = self.passed(thresholds)
+        table = pd.DataFrame({
+            "included": included,
+            "excluded": self.n - self.not_enough_information - included,
+            "not enough information": self.not_enough_information,
+        }, index=pd.Index(thresholds, name="threshold"))
+        return table[OVERALL_STATUSES]
+
+def sweep_threshold(
+    profiles_df: pd.DataFrame,
+    rules: Union[List[Dict], CompiledProtocol],
+    rule_id: str,
+    thresholds: Iterable[float]
+) -> pd.DataFrame:
+    """
+    Сколько пациентов было бы included / excluded / not enough information,
+    если бы порог правила rule_id был равен каждому из thresholds.
+    Результат совпадает с evaluate_cohort по протоколу с изменённым порогом.
+    """
+    return ThresholdSweep(profiles_df, rules, rule_id).counts(thresholds)
@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+# === Таймеры ===
+class _NullTimer:
+    """Таймер выключенных метрик: ничего не измеряет (один общий объект)."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ("_metrics", "_stage", "_start")
+
+    def __init__(self, metrics: "Metrics", stage: str):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self._metrics.observe(self._stage, time.perf_counter_ns() - self._start)
+        return False
+
+# === Метрики ===
+class Metrics:
+    """
+    Таймеры этапов и счётчики одного процесса.
+
+    По умолчанию выключены: timer() возвращает общий пустой таймер, а горячие
+    места проверяют METRICS.enabled перед подсчётом — стоимость выключенных
+    метрик — одна проверка атрибута.
+
+    Счётчики (incr) могут иметь метки: incr("files_opened_total", kind="renal_labs").
+    Процессы-исполнители screen.py передают снимки (drain) родителю, тот
+    объединяет их (merge). observe и incr можно вызывать из нескольких
+    потоков (чтение файлов в data_adapters.block2_ingest).
+
+    Пример:
+        METRICS.enable()
+        with METRICS.timer("block2.adapt"):
+            ...
+        METRICS.write("metrics.json")   # или metrics.prom — формат Prometheus
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        # этап → [число вызовов, суммарное время в нс]
+        self.timers: Dict[str, list] = {}
+        # (имя, метки) → значение
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def timer(self, stage: str):
+        return _Timer(self, stage) if self.enabled else _NULL_TIMER
+
+    def observe(self, stage: str, elapsed_ns: int) -> None:
+        with self._lock:
+            entry = self.timers.get(stage)
+            if entry is None:
+                self.timers[stage] = [1, elapsed_ns]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed_ns
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # === Передача между процессами ===
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "timers": {stage: list(entry) for stage, entry in self.timers.items()},
+            "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+        }
+
+    def drain(self) -> Dict[str, Any]:
+        """Снимок с обнулением — чтобы не передать одни и те же значения дважды."""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        for stage, (calls, elapsed_ns) in snapshot["timers"].items():
+            entry = self.timers.setdefault(stage, [0, 0])
+            entry[0] += calls
+            entry[1] += elapsed_ns
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # === Экспорт ===
+    def summary(self) -> Dict[str, Any]:
+        """
+        Сводка для JSON: этапы (вызовы, секунды, среднее в мс), счётчики,
+        доля missing по правилам (из rule_status_total) и доли статусов узлов
+        составных правил (из expression_status_total) — по ним следующий
+        прогон упорядочивает проверки (core.rule_engine.selectivity_from_metrics).
+        """
+        stages = {
+            stage: {
+                "calls": calls,
+                "seconds": round(elapsed_ns / 1e9, 6),
+                "mean_ms": round(elapsed_ns / calls / 1e6, 4) if calls else None,
+            }
+            for stage, (calls, elapsed_ns) in sorted(self.timers.items())
+        }
+
+        counters: Dict[str, Any] = {}
+        rules: Dict[str, Dict[str, Any]] = {}
+        expressions: Dict[str, Dict[str, Any]] = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            label_map = dict(labels)
+            if name == "rule_status_total":
+                rule = rules.setdefault(label_map["rule"], {"evaluated": 0, "missing": 0})
+                rule["evaluated"] += value
+                if label_map.get("status") == "missing":
+                    rule["missing"] += value
+            elif name == "expression_status_total":
+                node = expressions.setdefault(label_map["node"], {"evaluated": 0, "passed": 0, "failed": 0})
+                node["evaluated"] += value
+                if label_map.get("status") in ("passed", "failed"):
+                    node[label_map["status"]] += value
+            if labels:
+                key = ",".join(f"{k}={v}" for k, v in labels)
+                counters.setdefault(name, {})[key] = value
+            else:
+                counters[name] = value
+        for rule in rules.values():
+            rule["missing_rate"] = round(rule["missing"] / rule["evaluated"], 6) if rule["evaluated"] else None
+        for node in expressions.values():
+            for status in ("passed", "failed"):
+                node[f"{status}_rate"] = round(node[status] / node["evaluated"], 6) if node["evaluated"] else None
+
+        return {"stages": stages, "counters": counters, "rules": rules, "expressions": expressions}
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix: str = "enrollornot") -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        lines = [
+            f"# TYPE {prefix}_stage_seconds_total counter",
+            *(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {elapsed_ns / 1e9:.9f}'
+              for stage, (_, elapsed_ns) in sorted(self.timers.items())),
+            f"# TYPE {prefix}_stage_calls_total counter",
+            *(f'{prefix}_stage_calls_total{{stage="{stage}"}} {calls}'
+              for stage, (calls, _) in sorted(self.timers.items())),
+        ]
+        declared = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f"{prefix}_{name}"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """JSON-сводка, а для *.prom / *.txt — формат Prometheus."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json() + "\n"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Метрики процесса (включаются METRICS.enable(), например флагом screen.py --metrics)
+METRICS = Metrics()
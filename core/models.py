@@ -1,56 +1,133 @@
-from typing import Any, Dict, List, Optional
-from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
 
-class Rule(BaseModel):
-    id: str
-    type: str = Field(..., pattern="^(inclusion|exclusion)$")
-    field: str
-    operator: str = Field(..., pattern="^(>=|<=|==|>|<|!=)$")
-    value: Any
-    description: Optional[str] = None
-
-class PatientProfile(BaseModel):
-    patient_id: str
+# Поля профиля пациента: имя → (тип, значение по умолчанию; ... — обязательное).
+# По ним строятся pydantic-модель PatientProfile (core.schemas) и слоты BulkProfile
+PROFILE_SCHEMA: Dict[str, tuple] = {
+    "patient_id": (str, ...),
 
     # --- Общие ---
-    age: Optional[int] = None
-    gender: Optional[str] = None
+    "age": (Optional[int], None),
+    "gender": (Optional[str], None),
 
     # --- DAPA-HF ---
-    lvef: Optional[float] = None
-    nt_probnp: Optional[float] = None
-    nyha_class: Optional[int] = None
-    gdmtd_hf_therapy: Optional[bool] = None
-    egfr: Optional[float] = None
-    sglt2_inhibitor: Optional[bool] = None
-    type1_diabetes: Optional[bool] = None
-    bp_systolic: Optional[int] = None
-    bp_diastolic: Optional[int] = None
+    "lvef": (Optional[float], None),
+    "nt_probnp": (Optional[float], None),
+    "nyha_class": (Optional[int], None),
+    "gdmtd_hf_therapy": (Optional[bool], None),
+    "egfr": (Optional[float], None),
+    "sglt2_inhibitor": (Optional[bool], None),
+    "type1_diabetes": (Optional[bool], None),
+    "bp_systolic": (Optional[int], None),
+    "bp_diastolic": (Optional[int], None),
 
     # --- SIGIR-20141 (добавлено) ---
-    congestive_hf: Optional[bool] = None
-    unstable_angina: Optional[bool] = None
-    calcium_channel_blocker: Optional[bool] = None
-    sbp: Optional[int] = None  # systolic blood pressure (альтернатива bp_systolic)
+    "congestive_hf": (Optional[bool], None),
+    "unstable_angina": (Optional[bool], None),
+    "calcium_channel_blocker": (Optional[bool], None),
+    "sbp": (Optional[int], None),  # systolic blood pressure (альтернатива bp_systolic)
 
     # --- W01/W02 ---
-    hba1c: Optional[float] = None
-    uacr: Optional[float] = None
+    "hba1c": (Optional[float], None),
+    "uacr": (Optional[float], None),
 
     # --- Трассировка ---
-    source_files: Optional[Dict[str, str]] = None
-
-class RuleResult(BaseModel):
-    rule_id: str
-    status: str = Field(..., pattern="^(passed|failed|missing)$")
-
-class EvaluationResult(BaseModel):
-    patient_id: str
-    rule_results: List[RuleResult]
-    overall_status: str = Field(..., pattern="^(included|excluded|not enough information)$")
-
-    def get_rule_status(self, rule_id: str) -> str:
-        for r in self.rule_results:
-            if r.rule_id == rule_id:
-                return r.status
-        return "unknown"
\ No newline at end of file
+    "source_files": (Optional[Dict[str, str]], None),
+}
+
+# Модели pydantic (Rule, PatientProfile, ...) живут в core.schemas и
+# импортируются при первом обращении: процессы скрининга работают с
+# BulkProfile и не платят за импорт pydantic при старте
+_SCHEMAS = ("Rule", "PatientProfile", "RuleResult", "EvaluationResult")
+
+def __getattr__(name: str) -> Any:
+    if name in _SCHEMAS:
+        from core import schemas
+
+        return getattr(schemas, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# === Компактный профиль для пакетной обработки ===
+# Поля PatientProfile в порядке объявления
+PROFILE_FIELDS = tuple(PROFILE_SCHEMA)
+_PROFILE_FIELD_SET = frozenset(PROFILE_FIELDS)
+
+class BulkProfile:
+    """
+    Профиль пациента без валидации pydantic: поля PatientProfile хранятся в
+    __slots__, дополнительные поля (например, временные признаки протокола) —
+    в словаре _extra, который создаётся только при необходимости.
+
+    Читается evaluate_patient напрямую (get), без model_dump() в словарь.
+    Незаданные поля не занимают памяти и читаются как None.
+    Для проверки типов на границах API — to_profile(), обратно — from_profile().
+
+    Пример:
+        profile = BulkProfile("P1", lvef=35.0, egfr=48.0)
+        profile.update({"baseline_ldl": 160.0})
+        evaluate_patient(profile, plan)
+    """
+
+    __slots__ = PROFILE_FIELDS + ("_extra",)
+
+    def __init__(self, patient_id: str, **fields: Any):
+        self.patient_id = patient_id
+        self._extra: Optional[Dict[str, Any]] = None
+        if fields:
+            self.update(fields)
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        for name, value in fields.items():
+            if name in _PROFILE_FIELD_SET:
+                setattr(self, name, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[name] = value
+
+    def get(self, field: str, default: Any = None) -> Any:
+        if field in _PROFILE_FIELD_SET:
+            return getattr(self, field, None)
+        if self._extra is not None:
+            return self._extra.get(field, default)
+        return default
+
+    def __getitem__(self, field: str) -> Any:
+        if field in _PROFILE_FIELD_SET:
+            return getattr(self, field, None)
+        if self._extra is not None and field in self._extra:
+            return self._extra[field]
+        raise KeyError(field)
+
+    def __contains__(self, field: str) -> bool:
+        return field in _PROFILE_FIELD_SET or (self._extra is not None and field in self._extra)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, BulkProfile):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items() if v is not None)
+        return f"BulkProfile({fields})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь как у PatientProfile.model_dump() плюс дополнительные поля."""
+        data = {name: getattr(self, name, None) for name in PROFILE_FIELDS}
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def to_profile(self) -> "PatientProfile":
+        """PatientProfile с валидацией (дополнительные поля не входят)."""
+        from core.schemas import PatientProfile
+
+        return PatientProfile(**{name: getattr(self, name, None) for name in PROFILE_FIELDS})
+
+    @classmethod
+    def from_profile(cls, profile: "PatientProfile") -> "BulkProfile":
+        bulk = cls(profile.patient_id)
+        for name in PROFILE_FIELDS:
+            value = getattr(profile, name)
+            if value is not None:
+                setattr(bulk, name, value)
+        return bulk
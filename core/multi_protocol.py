@@ -0,0 +1,135 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from core.rule_engine import CompiledProtocol, Expression, compile_protocol, is_missing, resolve_overall_status
+
+def _condition_key(field: str, func: Any, value: Any) -> Tuple:
+    try:
+        hash(value)
+        return field, func, value
+    except TypeError:
+        return field, func, repr(value)
+
+class MultiProtocol:
+    """
+    Несколько протоколов, оцениваемых за один проход по профилю.
+
+    Правила всех протоколов сводятся в индекс поле → уникальные условия
+    (field, operator, value): одинаковое условие из разных протоколов
+    проверяется один раз, а статус каждого правила — ссылка на статус его
+    условия. Составные правила (expr) — условия по key корневого узла.
+    Итог по протоколу — resolve_overall_status, как в evaluate_patient.
+
+    Пример:
+        multi = load_protocols("protocols")
+        extractor = Block1Extractor(multi.fields)      # извлечение — один раз
+        multi.overall(extractor.extract(note))         # {"dapa_hf": "excluded", ...}
+    """
+
+    def __init__(
+        self,
+        protocols: Dict[str, Union[List[Dict], CompiledProtocol]],
+        features: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        # Временные признаки всех протоколов (секции features:), вычисляются один раз
+        self.features = features or {}
+        self.plans: Dict[str, CompiledProtocol] = {name: compile_protocol(rules) for name, rules in protocols.items()}
+        self.names: List[str] = list(self.plans)
+
+        conditions: Dict[Tuple, int] = {}
+        # поле → [(номер условия, функция оператора, порог)]
+        self.by_field: Dict[str, List[Tuple[int, Any, Any]]] = {}
+        # составные правила: [(номер условия, корневой Expression)]; узлы с
+        # одинаковым key разных протоколов оцениваются один раз (общий memo)
+        self.expressions: List[Tuple[int, Expression]] = []
+        # протокол → номера условий в порядке plan.checks
+        self.condition_idx: Dict[str, List[int]] = {}
+        self.fields = set()
+        for name, plan in self.plans.items():
+            idx = []
+            for _, field, func, threshold in plan.checks:
+                key = ("expr", func.key) if field is None else _condition_key(field, func, threshold)
+                if key not in conditions:
+                    conditions[key] = len(conditions)
+                    if field is None:
+                        self.expressions.append((conditions[key], func))
+                    else:
+                        self.by_field.setdefault(field, []).append((conditions[key], func, threshold))
+                idx.append(conditions[key])
+            self.condition_idx[name] = idx
+            self.fields |= plan.fields
+        self.n_conditions = len(conditions)
+
+    def condition_statuses(self, profile: Any) -> List[str]:
+        """Статус каждого уникального условия для профиля (passed / failed / missing)."""
+        statuses = [None] * self.n_conditions
+        for field, conditions in self.by_field.items():
+            value = profile.get(field)
+            if is_missing(value):
+                for k, _, _ in conditions:
+                    statuses[k] = "missing"
+                continue
+            for k, func, threshold in conditions:
+                try:
+                    passed = func(value, threshold)
+                except Exception:
+                    # Как в evaluate_patient: несовместимые типы — нарушение
+                    passed = False
+                statuses[k] = "passed" if passed else "failed"
+        if self.expressions:
+            memo: Dict[str, str] = {}
+            values: Dict[str, Any] = {}
+            for k, node in self.expressions:
+                statuses[k] = node.status(profile, memo, values)
+        return statuses
+
+    def overall(self, profile: Any) -> Dict[str, str]:
+        """Итоговый статус пациента по каждому протоколу."""
+        statuses = self.condition_statuses(profile)
+        return {
+            name: resolve_overall_status(plan, [statuses[k] for k in self.condition_idx[name]])
+            for name, plan in self.plans.items()
+        }
+
+    def evaluate(self, profile: Any) -> Dict[str, Dict[str, Any]]:
+        """Результаты в формате evaluate_patient по каждому протоколу."""
+        statuses = self.condition_statuses(profile)
+        results = {}
+        for name, plan in self.plans.items():
+            ordered = [statuses[k] for k in self.condition_idx[name]]
+            results[name] = {
+                "rule_results": [
+                    {"rule_id": check[0], "status": status}
+                    for check, status in zip(plan.checks, ordered)
+                ],
+                "overall_status": resolve_overall_status(plan, ordered),
+            }
+        return results
+
+    def matrix(self, profiles: Iterable[Tuple[str, Any]]) -> pd.DataFrame:
+        """Матрица пациент × протокол с итоговыми статусами; profiles — пары (patient_id, профиль)."""
+        rows, index = [], []
+        for pid, profile in profiles:
+            index.append(pid)
+            rows.append(self.overall(profile))
+        return pd.DataFrame(rows, index=pd.Index(index, name="patient_id"), columns=self.names)
+
+def load_protocols(directory: str = "protocols") -> MultiProtocol:
+    """
+    Все протоколы папки (*.yaml); имя протокола — имя файла без расширения.
+    Признаки с одним именем в разных протоколах должны совпадать.
+    """
+    from protocol_loader import load_compiled_protocol, load_protocol_features
+
+    plans, features, owners = {}, {}, {}
+    for filename in sorted(f for f in os.listdir(directory) if f.endswith(".yaml")):
+        name = os.path.splitext(filename)[0]
+        path = os.path.join(directory, filename)
+        plans[name] = load_compiled_protocol(path)
+        for feature, spec in load_protocol_features(path).items():
+            if feature in features and features[feature] != spec:
+                raise ValueError(f"Feature {feature} is defined differently in protocols {owners[feature]} and {name}")
+            features[feature], owners[feature] = spec, name
+    return MultiProtocol(plans, features)
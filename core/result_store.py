@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from core.rule_engine import CompiledProtocol, compile_protocol, evaluate_patient, resolve_overall_status
+
+def rule_hash(rule: Dict[str, Any]) -> str:
+    """
+    Хэш определения правила: field, operator и value (у составного — expr).
+    Статус правила зависит только от них — id, type и description можно менять
+    без переоценки (type учитывается только при пересчёте overall_status).
+    """
+    if "expr" in rule:
+        definition = ["expr", rule["expr"]]
+    else:
+        definition = [rule["field"], rule["operator"], rule["value"]]
+    payload = json.dumps(definition, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _profile_json(profile: Dict[str, Any]) -> str:
+    return json.dumps(profile, ensure_ascii=False, sort_keys=True, default=str)
+
+class ResultStore:
+    """
+    Хранилище результатов скрининга (SQLite) для инкрементального пересчёта.
+
+    Для каждой области (scope — например, исследование + протокол) хранятся:
+        profiles: профиль пациента (словарь, как для evaluate_patient) и отпечаток источника
+        statuses: статус каждого правила, ключ — rule_hash(правило)
+        results: последний overall_status
+
+    screen(scope, plan) оценивает только правила, статусов которых ещё нет:
+    после правки одного порога в YAML пересчитывается одно правило, а
+    overall_status восстанавливается из сохранённых статусов.
+
+    Пример:
+        store = ResultStore(".cache/results.sqlite")
+        store.put_profiles("dapa_hf", {"P1": {"lvef": 35, ...}})
+        update = store.screen("dapa_hf", load_compiled_protocol("protocols/dapa_hf.yaml"))
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " scope TEXT NOT NULL, patient_id TEXT NOT NULL,"
+            " fingerprint TEXT, profile TEXT NOT NULL,"
+            " PRIMARY KEY (scope, patient_id));"
+            "CREATE TABLE IF NOT EXISTS statuses ("
+            " scope TEXT NOT NULL, patient_id TEXT NOT NULL,"
+            " rule_hash TEXT NOT NULL, status TEXT NOT NULL,"
+            " PRIMARY KEY (scope, patient_id, rule_hash));"
+            "CREATE TABLE IF NOT EXISTS results ("
+            " scope TEXT NOT NULL, patient_id TEXT NOT NULL, overall_status TEXT NOT NULL,"
+            " PRIMARY KEY (scope, patient_id));"
+        )
+        self._conn.commit()
+
+    # === Профили ===
+    def put_profiles(
+        self,
+        scope: str,
+        profiles: Dict[str, Dict[str, Any]],
+        fingerprints: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Сохраняет профили; статусы правил этих пациентов сбрасываются
+        (при следующем screen они будут оценены заново).
+        """
+        fingerprints = fingerprints or {}
+        with self._conn:
+            self._conn.executemany(
+                # UPSERT, а не REPLACE: rowid (порядок пациентов) сохраняется
+                "INSERT INTO profiles (scope, patient_id, fingerprint, profile) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (scope, patient_id) DO UPDATE SET"
+                " fingerprint = excluded.fingerprint, profile = excluded.profile",
+                [(scope, pid, fingerprints.get(pid), _profile_json(p)) for pid, p in profiles.items()],
+            )
+            self._conn.executemany(
+                "DELETE FROM statuses WHERE scope = ? AND patient_id = ?",
+                [(scope, pid) for pid in profiles],
+            )
+
+    def remove_patients(self, scope: str, patient_ids: Iterable[str]) -> None:
+        params = [(scope, pid) for pid in patient_ids]
+        with self._conn:
+            for table in ("profiles", "statuses", "results"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE scope = ? AND patient_id = ?", params)
+
+    def patient_ids(self, scope: str) -> List[str]:
+        rows = self._conn.execute("SELECT patient_id FROM profiles WHERE scope = ? ORDER BY rowid", (scope,))
+        return [row[0] for row in rows]
+
+    def fingerprints(self, scope: str) -> Dict[str, Optional[str]]:
+        rows = self._conn.execute("SELECT patient_id, fingerprint FROM profiles WHERE scope = ?", (scope,))
+        return dict(rows.fetchall())
+
+    def overall_statuses(self, scope: str) -> Dict[str, str]:
+        rows = self._conn.execute("SELECT patient_id, overall_status FROM results WHERE scope = ?", (scope,))
+        return dict(rows.fetchall())
+
+    # === Инкрементальный скрининг ===
+    def screen(
+        self,
+        scope: str,
+        protocol_rules: Union[List[Dict], CompiledProtocol]
+    ) -> Dict[str, Any]:
+        """
+        Приводит сохранённые результаты области в соответствие протоколу.
+
+        Оцениваются только пары (пациент, правило), для которых нет статуса
+        с тем же rule_hash: новые и изменённые правила, новые и обновлённые
+        пациенты. Статусы удалённых правил удаляются.
+
+        Returns:
+            {
+                "results": {patient_id: {"rule_results": [...], "overall_status": ...}},
+                "evaluated": число оценённых пар (пациент, правило),
+                "changed": {patient_id: (старый overall_status или None, новый)}
+            }
+        """
+        plan = compile_protocol(protocol_rules)
+        hashes = [rule_hash(rule) for rule in plan.rules]
+        wanted = set(hashes)
+
+        stored: Dict[str, Dict[str, str]] = {pid: {} for pid in self.patient_ids(scope)}
+        rows = self._conn.execute("SELECT patient_id, rule_hash, status FROM statuses WHERE scope = ?", (scope,))
+        for pid, h, status in rows:
+            if pid in stored and h in wanted:
+                stored[pid][h] = status
+        previous = self.overall_statuses(scope)
+
+        # Пациенты с одинаковым набором недостающих правил оцениваются одним подпланом
+        pending: Dict[Tuple[str, ...], List[str]] = {}
+        for pid, statuses in stored.items():
+            missing = tuple(h for h in dict.fromkeys(hashes) if h not in statuses)
+            if missing:
+                pending.setdefault(missing, []).append(pid)
+
+        rule_for_hash = dict(zip(hashes, plan.rules))
+        new_rows = []
+        evaluated = 0
+        for missing, pids in pending.items():
+            subplan = compile_protocol([rule_for_hash[h] for h in missing])
+            for pid, profile in self._load_profiles(scope, pids):
+                result = evaluate_patient(profile, subplan)
+                for h, r in zip(missing, result["rule_results"]):
+                    stored[pid][h] = r["status"]
+                    new_rows.append((scope, pid, h, r["status"]))
+                evaluated += len(missing)
+
+        results = {}
+        changed = {}
+        for pid, statuses in stored.items():
+            ordered = [statuses[h] for h in hashes]
+            overall = resolve_overall_status(plan, ordered)
+            results[pid] = {
+                "rule_results": [
+                    {"rule_id": check[0], "status": status}
+                    for check, status in zip(plan.checks, ordered)
+                ],
+                "overall_status": overall,
+            }
+            if previous.get(pid) != overall:
+                changed[pid] = (previous.get(pid), overall)
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO statuses (scope, patient_id, rule_hash, status) VALUES (?, ?, ?, ?)",
+                new_rows,
+            )
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS _wanted (rule_hash TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM _wanted")
+            self._conn.executemany("INSERT INTO _wanted VALUES (?)", [(h,) for h in wanted])
+            self._conn.execute(
+                "DELETE FROM statuses WHERE scope = ? AND rule_hash NOT IN (SELECT rule_hash FROM _wanted)",
+                (scope,),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (scope, patient_id, overall_status) VALUES (?, ?, ?)",
+                [(scope, pid, new) for pid, (_, new) in changed.items()],
+            )
+
+        return {"results": results, "evaluated": evaluated, "changed": changed}
+
+    def _load_profiles(self, scope: str, patient_ids: List[str]):
+        for start in range(0, len(patient_ids), 500):
+            part = patient_ids[start:start + 500]
+            marks = ",".join("?" * len(part))
+            rows = self._conn.execute(
+                f"SELECT patient_id, profile FROM profiles WHERE scope = ? AND patient_id IN ({marks})",
+                [scope, *part],
+            )
+            for pid, profile in rows:
+                yield pid, json.loads(profile)
+
+    def clear(self, scope: Optional[str] = None) -> None:
+        with self._conn:
+            for table in ("profiles", "statuses", "results"):
+                if scope is None:
+                    self._conn.execute(f"DELETE FROM {table}")
+                else:
+                    self._conn.execute(f"DELETE FROM {table} WHERE scope = ?", (scope,))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -1,35 +1,308 @@
-from typing import Any, Dict, List
+import hashlib
+import json
+import operator
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from core.instrumentation import METRICS
+
+def _between(value: Any, bounds: Any) -> bool:
+    low, high = bounds
+    # & вместо and: работает и для чисел, и для колонок pandas (evaluate_cohort)
+    return (value >= low) & (value <= high)
+
+def _in(value: Any, values: Any) -> bool:
+    if hasattr(value, "isin"):
+        return value.isin(values)
+    return value in values
+
+# Таблица операторов: строка из YAML → готовая функция сравнения
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "between": _between,   # value: [нижняя, верхняя], границы включительно
+    "in": _in,             # value: [допустимые значения]
+}
+
+def is_missing(value: Any) -> bool:
+    """
+    Значение поля отсутствует: None или NaN (пустая ячейка pandas, float("nan")
+    из адаптеров) — как column.isna() в evaluate_cohort.
+    """
+    # NaN — единственное значение, не равное самому себе
+    return value is None or value != value
+
+def _check_operator(op: str, value: Any) -> Callable[[Any, Any], bool]:
+    if op not in OPERATORS:
+        raise ValueError(f"Unsupported operator: {op}")
+    if op == "between" and not (isinstance(value, (list, tuple)) and len(value) == 2):
+        raise ValueError(f"Operator between needs value [low, high], got {value!r}")
+    if op == "in" and not isinstance(value, (list, tuple)):
+        raise ValueError(f"Operator in needs a list of values, got {value!r}")
+    return OPERATORS[op]
 
 def apply_operator(value: Any, op: str, threshold: Any) -> bool:
     """
     Применяет оператор к значению и порогу.
-    Поддерживаемые операторы: '>=', '<=', '==', '>', '<', '!='
-    """
-    if op == ">=":
-        return value >= threshold
-    elif op == "<=":
-        return value <= threshold
-    elif op == ">":
-        return value > threshold
-    elif op == "<":
-        return value < threshold
-    elif op == "==":
-        return value == threshold
-    elif op == "!=":
-        return value != threshold
-    else:
+    Поддерживаемые операторы: '>=', '<=', '==', '>', '<', '!=', 'between', 'in'
+    """
+    try:
+        func = OPERATORS[op]
+    except KeyError:
         raise ValueError(f"Unsupported operator: {op}")
+    return func(value, threshold)
+
+# === Составные выражения ===
+EXPRESSION_KINDS = ("all", "any", "not")
+
+# Доля passed/failed узла, если статистики нет (см. selectivity_from_metrics)
+_DEFAULT_RATE = 0.5
+
+class Expression:
+    """
+    Узел DAG составного правила: сравнение поля (leaf) или all / any / not.
+
+    key — каноническая запись узла (JSON; дети all/any отсортированы), по ней
+    одинаковые подвыражения разных правил сводятся в один узел и один раз
+    оцениваются для пациента. label — короткий стабильный хэш key для метрик
+    (expression_status_total) и статистики селективности.
+
+    Статус — трёхзначная логика (Клини): failed в all и passed в any решают
+    исход независимо от missing остальных детей; до них оценка и
+    останавливается, поэтому дети упорядочены по селективности.
+    """
+
+    __slots__ = ("kind", "key", "label", "children", "field", "func", "value", "fields")
+
+    def __init__(self, kind: str, key: str, children: Tuple["Expression", ...] = (),
+                 field: Optional[str] = None, func: Optional[Callable] = None, value: Any = None):
+        self.kind = kind
+        self.key = key
+        self.label = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+        self.children = children
+        self.field = field
+        self.func = func
+        self.value = value
+        self.fields = frozenset({field}) if kind == "leaf" else frozenset().union(*(c.fields for c in children))
+
+    def status(self, profile: Any, memo: Dict[str, str], values: Dict[str, Any]) -> str:
+        """
+        "passed" | "failed" | "missing" для профиля. memo (key → статус) и
+        values (поле → значение) общие для всех правил пациента: каждый узел
+        оценивается, а каждое поле читается из профиля не больше одного раза.
+        """
+        status = memo.get(self.key)
+        if status is not None:
+            return status
+
+        kind = self.kind
+        if kind == "leaf":
+            field = self.field
+            if field in values:
+                value = values[field]
+            else:
+                value = values[field] = profile.get(field)
+            if is_missing(value):
+                status = "missing"
+            else:
+                try:
+                    status = "passed" if self.func(value, self.value) else "failed"
+                except Exception:
+                    # Как у простых правил: несовместимые типы — нарушение
+                    status = "failed"
+        elif kind == "not":
+            status = self.children[0].status(profile, memo, values)
+            if status != "missing":
+                status = "failed" if status == "passed" else "passed"
+        else:
+            decisive = "failed" if kind == "all" else "passed"
+            status = "failed" if decisive == "passed" else "passed"
+            for child in self.children:
+                child_status = child.status(profile, memo, values)
+                if child_status == decisive:
+                    status = decisive
+                    break
+                if child_status == "missing":
+                    status = "missing"
+
+        memo[self.key] = status
+        if METRICS.enabled:
+            METRICS.incr("expression_status_total", node=self.label, status=status)
+        return status
+
+def _expression_key(node: Any) -> str:
+    return json.dumps(node, sort_keys=True, default=str, ensure_ascii=False)
+
+class _ExpressionBuilder:
+    """Строит узлы Expression из YAML, переиспользуя узлы с одинаковым key."""
+
+    def __init__(self, selectivity: Optional[Dict[str, Dict[str, float]]] = None):
+        self.nodes: Dict[str, Expression] = {}
+        self.selectivity = selectivity or {}
+
+    def _rate(self, node: Expression, status: str) -> float:
+        stats = self.selectivity.get(node.label) or {}
+        rate = stats.get(f"{status}_rate")
+        return _DEFAULT_RATE if rate is None else rate
+
+    def _order(self, kind: str, children: List[Expression]) -> Tuple[Expression, ...]:
+        # all останавливается на failed, any — на passed: первыми идут узлы,
+        # которые чаще решают исход; при равенстве — листья (одно сравнение)
+        decisive = "failed" if kind == "all" else "passed"
+        return tuple(sorted(children, key=lambda c: (-self._rate(c, decisive), c.kind != "leaf", c.key)))
+
+    def build(self, spec: Any, where: str) -> Expression:
+        if not isinstance(spec, dict):
+            raise ValueError(f"{where}: expression must be a mapping, got {spec!r}")
+        kinds = [k for k in EXPRESSION_KINDS if k in spec]
+        if len(kinds) > 1 or (kinds and len(spec) != 1):
+            raise ValueError(f"{where}: expression must have exactly one of all / any / not, "
+                             f"or field / operator / value")
+
+        if not kinds:
+            missing = {"field", "operator", "value"} - spec.keys()
+            if missing:
+                raise ValueError(f"{where}: comparison missing keys: {missing}")
+            op, value = spec["operator"], spec["value"]
+            func = _check_operator(op, value)
+            key = _expression_key(["leaf", spec["field"], op, value])
+            return self._share(Expression("leaf", key, field=spec["field"], func=func, value=value))
+
+        kind = kinds[0]
+        if kind == "not":
+            child = self.build(spec["not"], f"{where}.not")
+            return self._share(Expression("not", _expression_key(["not", child.key]), (child,)))
+
+        items = spec[kind]
+        if not isinstance(items, list) or not items:
+            raise ValueError(f"{where}: {kind} needs a non-empty list of expressions")
+        unique: Dict[str, Expression] = {}
+        for i, item in enumerate(items):
+            child = self.build(item, f"{where}.{kind}[{i}]")
+            unique.setdefault(child.key, child)
+        if len(unique) == 1:
+            # all/any из одного выражения — само выражение
+            return next(iter(unique.values()))
+        key = _expression_key([kind, sorted(unique)])
+        if key in self.nodes:
+            return self.nodes[key]
+        return self._share(Expression(kind, key, self._order(kind, list(unique.values()))))
+
+    def _share(self, node: Expression) -> Expression:
+        return self.nodes.setdefault(node.key, node)
+
+def selectivity_from_metrics(summary: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """
+    Статистика селективности узлов из сводки метрик прошлого прогона
+    (Metrics.summary() или файл screen.py --metrics *.json): label узла →
+    {"passed_rate": ..., "failed_rate": ...}.
+    """
+    return {
+        label: {"passed_rate": stats["passed_rate"], "failed_rate": stats["failed_rate"]}
+        for label, stats in (summary.get("expressions") or {}).items()
+        if stats.get("evaluated")
+    }
+
+# === Скомпилированный протокол ===
+class CompiledProtocol:
+    """
+    Скомпилированный протокол: правила разобраны один раз при загрузке YAML.
+
+    Атрибуты:
+        rules: исходный список правил (в порядке YAML)
+        checks: список (rule_id, field, функция оператора, порог) в том же порядке;
+            у составного правила (expr) — (rule_id, None, корневой Expression, None)
+        inclusion_idx / exclusion_idx: индексы правил в checks по типу
+        rules_by_id: словарь rule_id → правило
+        fields: множество полей профиля, на которые ссылается протокол
+        rule_fields: словарь rule_id → поля правила (у составного — все поля выражения)
+        expressions: все узлы составных правил (key → Expression), общие узлы — один объект
+    """
+
+    __slots__ = ("rules", "checks", "inclusion_idx", "exclusion_idx", "rules_by_id", "fields",
+                 "rule_fields", "expressions")
+
+    def __init__(
+        self,
+        protocol_rules: List[Dict],
+        selectivity: Optional[Dict[str, Dict[str, float]]] = None
+    ):
+        self.rules = list(protocol_rules)
+        self.checks = []
+        self.inclusion_idx = []
+        self.exclusion_idx = []
+        self.rules_by_id = {}
+        self.rule_fields = {}
+        builder = _ExpressionBuilder(selectivity)
+
+        for rule in self.rules:
+            if "expr" in rule:
+                node = builder.build(rule["expr"], f"Rule {rule['id']}")
+                self.checks.append((rule["id"], None, node, None))
+                fields = node.fields
+            else:
+                func = _check_operator(rule["operator"], rule["value"])
+                self.checks.append((rule["id"], rule["field"], func, rule["value"]))
+                fields = frozenset({rule["field"]})
+            # Первое правило с данным id выигрывает — так же, как в прежнем next(...)
+            self.rules_by_id.setdefault(rule["id"], rule)
+            self.rule_fields.setdefault(rule["id"], fields)
+
+        # Тип берётся по rule_id (как и раньше), поэтому дубли id ведут себя одинаково
+        for i, (rule_id, _, _, _) in enumerate(self.checks):
+            rule_type = self.rules_by_id[rule_id].get("type")
+            if rule_type == "inclusion":
+                self.inclusion_idx.append(i)
+            elif rule_type == "exclusion":
+                self.exclusion_idx.append(i)
+
+        self.expressions = builder.nodes
+        self.fields = set().union(*self.rule_fields.values()) if self.rule_fields else set()
+
+def compile_protocol(
+    protocol_rules: Union[List[Dict], CompiledProtocol],
+    selectivity: Optional[Dict[str, Dict[str, float]]] = None
+) -> CompiledProtocol:
+    """
+    Компилирует список правил из YAML в CompiledProtocol.
+    Уже скомпилированный протокол возвращается как есть.
+    selectivity — статистика прошлых прогонов (selectivity_from_metrics):
+    по ней упорядочиваются дети all/any составных правил.
+    """
+    if isinstance(protocol_rules, CompiledProtocol):
+        return protocol_rules
+    return CompiledProtocol(protocol_rules, selectivity)
+
+def resolve_overall_status(plan: CompiledProtocol, statuses: List[str]) -> str:
+    """
+    Итоговый статус по списку статусов правил (в порядке plan.checks).
+    """
+    if "missing" in statuses:
+        return "not enough information"
+    # Если есть ЛЮБОЕ failed-правило типа "exclusion" или "inclusion" → excluded
+    for i in plan.exclusion_idx:
+        if statuses[i] == "failed":
+            return "excluded"
+    for i in plan.inclusion_idx:
+        if statuses[i] == "failed":
+            return "excluded"
+    return "included"
 
 def evaluate_patient(
     patient_profile: Dict[str, Any],
-    protocol_rules: List[Dict]
+    protocol_rules: Union[List[Dict], CompiledProtocol],
+    stop_at_missing: bool = False
 ) -> Dict[str, Any]:
     """
     Оценивает соответствие пациента протоколу.
 
     Аргументы:
         patient_profile: словарь вида {"lvef": 35, "egfr": 45, ...}
-        protocol_rules: список правил из YAML, каждый элемент:
+        protocol_rules: список правил из YAML или CompiledProtocol
+            (см. compile_protocol), каждое правило:
             {
                 "id": "R1",
                 "type": "inclusion" или "exclusion",
@@ -37,6 +310,17 @@ def evaluate_patient(
                 "operator": "<=",
                 "value": 40
             }
+            или составное правило {"id": ..., "type": ..., "expr": {"any": [...]}}
+            (см. protocol_loader.load_protocol_yaml)
+
+        stop_at_missing: остановиться на первом правиле со статусом missing —
+            итог уже "not enough information" (missing важнее failed).
+            Раньше итог не считается решённым. rule_results тогда содержит
+            только проверенные правила. Профиль может вычислять поля лениво
+            (Block1Extractor.lazy) — поля непроверенных правил не извлекаются.
+            failed-правило оценку не останавливает: у остальных правил всё
+            равно нужно проверить наличие поля, а сравнение с порогом рядом с
+            этим ничего не стоит. overall_status всегда совпадает с полной оценкой.
 
     Возвращает:
         {
@@ -46,51 +330,46 @@ def evaluate_patient(
             "overall_status": "included" | "excluded" | "not enough information"
         }
     """
-    rule_results = []
-    has_missing = False
+    plan = compile_protocol(protocol_rules)
+    statuses = []
+    # Общие для составных правил: статусы узлов и прочитанные поля
+    memo: Dict[str, str] = {}
+    values: Dict[str, Any] = {}
 
-    for rule in protocol_rules:
-        field = rule["field"]
-        if field not in patient_profile or patient_profile[field] is None:
-            rule_results.append({"rule_id": rule["id"], "status": "missing"})
-            has_missing = True
+    for _, field, func, threshold in plan.checks:
+        if field is None:
+            status = func.status(patient_profile, memo, values)
+            statuses.append(status)
+            if stop_at_missing and status == "missing":
+                break
             continue
 
-        value = patient_profile[field]
-        threshold = rule["value"]
-        op = rule["operator"]
+        value = patient_profile.get(field)
+        if value is None or value != value:   # is_missing без вызова функции
+            statuses.append("missing")
+            if stop_at_missing:
+                break
+            continue
 
         try:
-            passed = apply_operator(value, op, threshold)
-        except Exception as e:
+            passed = func(value, threshold)
+        except Exception:
             # Если типы несовместимы (редко), считаем как нарушение
-            rule_results.append({"rule_id": rule["id"], "status": "failed"})
-            continue
+            passed = False
 
-        status = "passed" if passed else "failed"
-        rule_results.append({"rule_id": rule["id"], "status": status})
-
-    # Определяем итоговый статус
-    if has_missing:
-        overall_status = "not enough information"
-    else:
-        # Проверяем: если есть ЛЮБОЕ failed-правило типа "exclusion" → excluded
-        # Или: если НЕ ВСЕ inclusion-правила passed → excluded
-        exclusion_failed = any(
-            r["status"] == "failed" for r in rule_results
-            if next((rule for rule in protocol_rules if rule["id"] == r["rule_id"]), {}).get("type") == "exclusion"
-        )
-        inclusion_not_passed = any(
-            r["status"] == "failed" for r in rule_results
-            if next((rule for rule in protocol_rules if rule["id"] == r["rule_id"]), {}).get("type") == "inclusion"
-        )
-
-        if exclusion_failed or inclusion_not_passed:
-            overall_status = "excluded"
-        else:
-            overall_status = "included"
+        statuses.append("passed" if passed else "failed")
+
+    rule_results = [
+        {"rule_id": check[0], "status": status}
+        for check, status in zip(plan.checks, statuses)
+    ]
+    if METRICS.enabled:
+        for r in rule_results:
+            METRICS.incr("rule_status_total", rule=r["rule_id"], status=r["status"])
 
+    overall_status = resolve_overall_status(plan, statuses)
     return {
         "rule_results": rule_results,
         "overall_status": overall_status
-    }
\ No newline at end of file
+    }
+
@@ -0,0 +1,43 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, create_model, model_validator
+
+from core.models import PROFILE_SCHEMA
+
+class Rule(BaseModel):
+    id: str
+    type: str = Field(..., pattern="^(inclusion|exclusion)$")
+    # Простое правило: field / operator / value
+    field: Optional[str] = None
+    operator: Optional[str] = Field(None, pattern="^(>=|<=|==|>|<|!=|between|in)$")
+    value: Any = None
+    # Составное правило: {"all": [...]}, {"any": [...]}, {"not": {...}} из сравнений
+    expr: Optional[Dict[str, Any]] = None
+    description: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _one_form(self) -> "Rule":
+        # value: None — допустимое значение (== null), поэтому проверяется наличие ключа
+        simple = self.field is not None or self.operator is not None or "value" in self.model_fields_set
+        if simple == (self.expr is not None):
+            raise ValueError("Rule needs either field/operator/value or expr")
+        if simple and (self.field is None or self.operator is None or "value" not in self.model_fields_set):
+            raise ValueError("Rule needs field, operator and value")
+        return self
+
+# Поля — core.models.PROFILE_SCHEMA (общие с BulkProfile)
+PatientProfile = create_model("PatientProfile", **PROFILE_SCHEMA)
+
+class RuleResult(BaseModel):
+    rule_id: str
+    status: str = Field(..., pattern="^(passed|failed|missing)$")
+
+class EvaluationResult(BaseModel):
+    patient_id: str
+    rule_results: List[RuleResult]
+    overall_status: str = Field(..., pattern="^(included|excluded|not enough information)$")
+
+    def get_rule_status(self, rule_id: str) -> str:
+        for r in self.rule_results:
+            if r.rule_id == rule_id:
+                return r.status
+        return "unknown"
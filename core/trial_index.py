@@ -0,0 +1,169 @@
+import math
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Union
+
+from core.rule_engine import CompiledProtocol, compile_protocol, evaluate_patient, is_missing
+
+def _is_number(value: Any) -> bool:
+    """Числа и bool (True == 1 в правилах и в evaluate_patient); NaN — нет."""
+    return isinstance(value, (int, float)) and not (isinstance(value, float) and math.isnan(value))
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class TrialIndex:
+    """
+    Обратный индекс «пациент → подходящие протоколы» для больших каталогов.
+
+    Числовые и логические правила каждого поля нормализуются в отрезки
+    числовой оси: все пороги поля t1 < ... < tk делят её на 2k + 1 сегментов
+    ((-inf, t1), [t1], (t1, t2), ..., (tk, inf)); для каждого сегмента
+    хранится битовая маска протоколов (int), все правила которых по этому
+    полю выполняются на сегменте. Поиск — бинарный поиск сегмента по каждому
+    полю профиля и AND масок; кандидаты затем подтверждаются evaluate_patient.
+
+    between — отрезок из двух порогов. Правила с нечисловым порогом
+    (например, gender == "male"), in и составные правила (expr) в индекс не
+    входят и проверяются только при подтверждении; так же — нечисловые
+    значения профиля (маска поля — все протоколы).
+
+    Пример:
+        index = build_trial_index("protocols")
+        index.match(profile)                          # {"sigir_20141": "included"}
+        index.match(profile, include_unknown=True)    # и протоколы с not enough information
+    """
+
+    def __init__(self, protocols: Dict[str, Union[List[Dict], CompiledProtocol]]):
+        self.plans: Dict[str, CompiledProtocol] = {name: compile_protocol(rules) for name, rules in protocols.items()}
+        self.names: List[str] = list(self.plans)
+        self._all = (1 << len(self.names)) - 1
+
+        # поле → маска протоколов, у которых есть правило по полю (для missing)
+        self._referencing: Dict[str, int] = {}
+        # протоколы с составными правилами: их missing индекс не видит
+        self._compound = 0
+        # поле → {протокол: [(оператор, порог)]} — числовые правила
+        numeric: Dict[str, Dict[int, list]] = {}
+        for i, plan in enumerate(self.plans.values()):
+            for rule in plan.rules:
+                if "expr" in rule:
+                    # Составное правило (например, any с missing-полем) может
+                    # выполниться и без части полей — проверяется только при подтверждении
+                    self._compound |= 1 << i
+                    continue
+                field, op, value = rule["field"], rule["operator"], rule["value"]
+                self._referencing[field] = self._referencing.get(field, 0) | (1 << i)
+                if op == "between" and all(_is_number(v) for v in value):
+                    numeric.setdefault(field, {}).setdefault(i, []).extend([(">=", value[0]), ("<=", value[1])])
+                elif op != "in" and _is_number(value):
+                    numeric.setdefault(field, {}).setdefault(i, []).append((op, value))
+
+        # поле → (отсортированные пороги, маски сегментов)
+        self._fields: Dict[str, tuple] = {}
+        for field, by_protocol in numeric.items():
+            thresholds = sorted({float(t) for rules in by_protocol.values() for _, t in rules})
+            self._fields[field] = (thresholds, self._segment_masks(thresholds, by_protocol))
+
+    def _segment_masks(self, thresholds: List[float], by_protocol: Dict[int, list]) -> List[int]:
+        """
+        Маски сегментов одного поля. Правила протокола по полю сужают диапазон
+        сегментов [lo, hi] (>=, >, <=, <, ==) и выкалывают точки (!=);
+        маски строятся одним проходом по сегментам с событиями начала и конца
+        диапазонов — O(сегменты + правила) операций над масками.
+        """
+        position = {t: 2 * i + 1 for i, t in enumerate(thresholds)}
+        n_segments = 2 * len(thresholds) + 1
+        starts = [0] * (n_segments + 1)
+        ends = [0] * (n_segments + 1)
+        holes = [0] * n_segments
+        free = self._all
+        for i, rules in by_protocol.items():
+            bit = 1 << i
+            free &= ~bit
+            lo, hi, points = 0, n_segments - 1, []
+            for op, t in rules:
+                p = position[float(t)]
+                if op == ">=":
+                    lo = max(lo, p)
+                elif op == ">":
+                    lo = max(lo, p + 1)
+                elif op == "<=":
+                    hi = min(hi, p)
+                elif op == "<":
+                    hi = min(hi, p - 1)
+                elif op == "==":
+                    lo, hi = max(lo, p), min(hi, p)
+                else:
+                    points.append(p)
+            if lo > hi:
+                continue
+            starts[lo] |= bit
+            ends[hi + 1] |= bit
+            for p in points:
+                holes[p] |= bit
+
+        masks = []
+        active = 0
+        for s in range(n_segments):
+            active = (active | starts[s]) & ~ends[s]
+            masks.append(free | (active & ~holes[s]))
+        return masks
+
+    def _field_mask(self, field: str, value: Any) -> int:
+        thresholds, masks = self._fields[field]
+        if not _is_number(value):
+            return self._all
+        i = bisect_left(thresholds, value)
+        if i < len(thresholds) and thresholds[i] == value:
+            return masks[2 * i + 1]
+        return masks[2 * i]
+
+    def candidates(self, profile: Any) -> List[str]:
+        """Протоколы, числовые правила которых выполняются (без подтверждения)."""
+        return [self.names[i] for i in _bits(self._candidate_mask(profile)[0])]
+
+    def _candidate_mask(self, profile: Any):
+        """(маска кандидатов, маска протоколов с отсутствующими полями)."""
+        mask = self._all
+        unknown = 0
+        for field, referencing in self._referencing.items():
+            value = profile.get(field)
+            if is_missing(value):
+                # missing → у протоколов с правилом по полю итог not enough information
+                unknown |= referencing
+                mask &= ~referencing
+            elif field in self._fields:
+                mask &= self._field_mask(field, value)
+        return mask & ~unknown, unknown
+
+    def match(self, profile: Any, include_unknown: bool = False) -> Dict[str, str]:
+        """
+        Протоколы, по которым пациент включается (подтверждено evaluate_patient).
+        include_unknown=True добавляет протоколы с итогом "not enough information":
+        при отсутствующем поле итог известен без оценки.
+        """
+        mask, unknown = self._candidate_mask(profile)
+        if include_unknown:
+            # Отсеянный индексом протокол с составным правилом может оказаться
+            # not enough information (missing важнее failed)
+            mask |= self._compound & ~unknown
+        matches = {}
+        for i in _bits(mask):
+            name = self.names[i]
+            status = evaluate_patient(profile, self.plans[name])["overall_status"]
+            if status == "included" or (include_unknown and status == "not enough information"):
+                # not enough information здесь — от полей составных правил
+                matches[name] = status
+        if include_unknown:
+            for i in _bits(unknown):
+                matches[self.names[i]] = "not enough information"
+        return matches
+
+def build_trial_index(directory: str = "protocols") -> TrialIndex:
+    """Индекс по всем протоколам папки (см. core.multi_protocol.load_protocols)."""
+    from core.multi_protocol import load_protocols
+
+    return TrialIndex(load_protocols(directory).plans)
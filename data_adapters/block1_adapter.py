@@ -1,106 +1,265 @@
 import re
-from typing import Dict, Any
-from core.models import PatientProfile
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Optional
+from core.instrumentation import METRICS
+
+if TYPE_CHECKING:
+    from core.models import PatientProfile
+
+# Версия экстрактора заметок; увеличивается при изменении паттернов или ключевых слов
+EXTRACTOR_VERSION = "1"
+
+# === Паттерны (компилируются один раз при импорте) ===
+LVEF_RE = re.compile(r'(?:LVEF|ejection fraction)[^0-9]*?(\d+\.?\d*)%', re.IGNORECASE)
+NT_PROBNP_RE = re.compile(r'NT-proBNP\D*(\d[\d,]*)', re.IGNORECASE)
+EGFR_RE = re.compile(r'eGFR\D*(\d+\.?\d*)', re.IGNORECASE)
+BP_RE = re.compile(r'(\d+)/(\d+)\s*mmHg', re.IGNORECASE)
+NYHA_RE = re.compile(r'NYHA class (II|III|IV|II–III|II-III)', re.IGNORECASE)
+AGE_RE = re.compile(r'(\d+)-year-old', re.IGNORECASE)
+GENDER_RE = re.compile(r'(woman|man|female|male)', re.IGNORECASE)
+
+# === Ключевые слова (ищутся в note.lower()) ===
+SGLT2_DRUGS = ('empagliflozin', 'dapagliflozin', 'canagliflozin')
+SGLT2_NEGATIONS = ('no history', 'never received', 'not received')
+TYPE1_DIABETES = 'type 1 diabetes'
+TYPE1_NEGATION = 'no history'
+GDMT_GROUPS = (
+    ('ace inhibitor', 'arni'),
+    ('beta-blocker',),
+    ('mra', 'mineralocorticoid receptor antagonist'),
+    ('diuretic',),
+)
+CONGESTIVE_HF_PHRASES = ('congestive', 'heart failure', 'hf')
+UNSTABLE_ANGINA_PHRASES = (
+    'unstable angina', 'at rest', 'worsening', 'new-onset',
+    'first time in life', 'acute coronary syndrome'
+)
+CCB_PHRASES = ('calcium channel blocker', 'ccb', 'amlodipine')
+
+def _nyha_from_match(match) -> Optional[int]:
+    if match:
+        nyha_str = match.group(1)
+        if 'II' in nyha_str and ('III' in nyha_str or 'IV' in nyha_str):
+            return 3
+        return {'II': 2, 'III': 3, 'IV': 4}.get(nyha_str.strip(), None)
+    return None
+
+def _gender_from_match(match) -> Optional[str]:
+    if match:
+        gender = match.group(1).lower()
+        return 'female' if gender in ('woman', 'female') else 'male'
+    return None
 
 def extract_lvef(note: str) -> float:
-    match = re.search(r'(?:LVEF|ejection fraction)[^0-9]*?(\d+\.?\d*)%', note, re.IGNORECASE)
+    match = LVEF_RE.search(note)
     return float(match.group(1)) if match else None
 
 def extract_nt_probnp(note: str) -> float:
-    match = re.search(r'NT-proBNP\D*(\d[\d,]*)', note, re.IGNORECASE)
+    match = NT_PROBNP_RE.search(note)
     return float(match.group(1).replace(',', '')) if match else None
 
 def extract_egfr(note: str) -> float:
-    match = re.search(r'eGFR\D*(\d+\.?\d*)', note, re.IGNORECASE)
+    match = EGFR_RE.search(note)
     return float(match.group(1)) if match else None
 
 def extract_systolic_bp(note: str) -> int:
-    match = re.search(r'(\d+)/\d+\s*mmHg', note, re.IGNORECASE)
+    match = BP_RE.search(note)
     return int(match.group(1)) if match else None
 
 def extract_diastolic_bp(note: str) -> int:
-    match = re.search(r'\d+/(\d+)\s*mmHg', note, re.IGNORECASE)
-    return int(match.group(1)) if match else None
+    match = BP_RE.search(note)
+    return int(match.group(2)) if match else None
 
 def extract_sglt2_inhibitor(note: str) -> bool:
     note_lower = note.lower()
-    sglt2_found = any(drug in note_lower for drug in ['empagliflozin', 'dapagliflozin', 'canagliflozin'])
+    sglt2_found = any(drug in note_lower for drug in SGLT2_DRUGS)
     if sglt2_found:
-        return not any(neg in note_lower for neg in ['no history', 'never received', 'not received'])
+        return not any(neg in note_lower for neg in SGLT2_NEGATIONS)
     return False
 
 def extract_type1_diabetes(note: str) -> bool:
     note_lower = note.lower()
-    return 'type 1 diabetes' in note_lower and 'no history' not in note_lower
+    return TYPE1_DIABETES in note_lower and TYPE1_NEGATION not in note_lower
 
 def extract_nyha_class(note: str) -> int:
-    match = re.search(r'NYHA class (II|III|IV|II–III|II-III)', note, re.IGNORECASE)
-    if match:
-        nyha_str = match.group(1)
-        if 'II' in nyha_str and ('III' in nyha_str or 'IV' in nyha_str):
-            return 3
-        return {'II': 2, 'III': 3, 'IV': 4}.get(nyha_str.strip(), None)
-    return None
+    return _nyha_from_match(NYHA_RE.search(note))
 
 def extract_gdmtd_therapy(note: str) -> bool:
     note_lower = note.lower()
-    has_ace_arni = 'ace inhibitor' in note_lower or 'arni' in note_lower
-    has_beta = 'beta-blocker' in note_lower
-    has_mra = 'mra' in note_lower or 'mineralocorticoid receptor antagonist' in note_lower
-    has_diuretic = 'diuretic' in note_lower
-    return sum([has_ace_arni, has_beta, has_mra, has_diuretic]) >= 2
+    return sum(any(kw in note_lower for kw in group) for group in GDMT_GROUPS) >= 2
 
 def extract_age(note: str) -> int:
-    match = re.search(r'(\d+)-year-old', note, re.IGNORECASE)
+    match = AGE_RE.search(note)
     return int(match.group(1)) if match else None
 
 def extract_gender(note: str) -> str:
-    match = re.search(r'(woman|man|female|male)', note, re.IGNORECASE)
-    if match:
-        gender = match.group(1).lower()
-        return 'female' if gender in ('woman', 'female') else 'male'
-    return None
+    return _gender_from_match(GENDER_RE.search(note))
 
 # --- SIGIR-20141 specific fields ---
 def extract_congestive_hf(note: str) -> bool:
     n = note.lower()
-    return 'congestive' in n or 'heart failure' in n or 'hf' in n
+    return any(phrase in n for phrase in CONGESTIVE_HF_PHRASES)
 
 def extract_unstable_angina(note: str) -> bool:
     n = note.lower()
-    unstable_phrases = [
-        'unstable angina', 'at rest', 'worsening', 'new-onset',
-        'first time in life', 'acute coronary syndrome'
-    ]
-    return any(phrase in n for phrase in unstable_phrases)
+    return any(phrase in n for phrase in UNSTABLE_ANGINA_PHRASES)
 
 def extract_calcium_channel_blocker(note: str) -> bool:
     n = note.lower()
-    return 'calcium channel blocker' in n or 'ccb' in n or 'amlodipine' in n
+    return any(phrase in n for phrase in CCB_PHRASES)
 
 def extract_sbp(note: str) -> int:
     # sbp = systolic blood pressure (дублирует bp_systolic для удобства)
     return extract_systolic_bp(note)
 
-def adapt_block1(row: Dict[str, Any]) -> PatientProfile:
+# === Извлечение по полям ===
+_UNSET = object()
+
+class _Note:
+    """
+    Заметка с общими для нескольких полей промежуточными результатами:
+    lower() считается один раз, каждое ключевое слово проверяется один раз,
+    давление ищется одним поиском для bp_systolic, bp_diastolic и sbp.
+    """
+
+    __slots__ = ("text", "lower", "_hits", "_bp")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self._hits: Dict[str, bool] = {}
+        self._bp = _UNSET
+
+    def has(self, keyword: str) -> bool:
+        hit = self._hits.get(keyword)
+        if hit is None:
+            hit = self._hits[keyword] = keyword in self.lower
+        return hit
+
+    def found(self, phrases) -> bool:
+        return any(self.has(phrase) for phrase in phrases)
+
+    def bp(self):
+        if self._bp is _UNSET:
+            self._bp = BP_RE.search(self.text)
+        return self._bp
+
+def _number(pattern, cast=float):
+    def extract(note: _Note):
+        match = pattern.search(note.text)
+        return cast(match.group(1)) if match else None
+    return extract
+
+def _bp_part(group: int):
+    def extract(note: _Note):
+        bp = note.bp()
+        return int(bp.group(group)) if bp else None
+    return extract
+
+def _nt_probnp(note: _Note) -> Optional[float]:
+    match = NT_PROBNP_RE.search(note.text)
+    return float(match.group(1).replace(',', '')) if match else None
+
+# Поле профиля → функция извлечения (порядок — как в PatientProfile)
+BLOCK1_FIELDS: Dict[str, Callable[[_Note], Any]] = {
+    "age": _number(AGE_RE, int),
+    "gender": lambda note: _gender_from_match(GENDER_RE.search(note.text)),
+    "lvef": _number(LVEF_RE),
+    "nt_probnp": _nt_probnp,
+    "egfr": _number(EGFR_RE),
+    "nyha_class": lambda note: _nyha_from_match(NYHA_RE.search(note.text)),
+    "gdmtd_hf_therapy": lambda note: sum(note.found(group) for group in GDMT_GROUPS) >= 2,
+    "sglt2_inhibitor": lambda note: note.found(SGLT2_DRUGS) and not note.found(SGLT2_NEGATIONS),
+    "type1_diabetes": lambda note: note.has(TYPE1_DIABETES) and not note.has(TYPE1_NEGATION),
+    "bp_systolic": _bp_part(1),
+    "bp_diastolic": _bp_part(2),
+    # --- SIGIR fields ---
+    "congestive_hf": lambda note: note.found(CONGESTIVE_HF_PHRASES),
+    "unstable_angina": lambda note: note.found(UNSTABLE_ANGINA_PHRASES),
+    "calcium_channel_blocker": lambda note: note.found(CCB_PHRASES),
+    "sbp": _bp_part(1),
+}
+
+class LazyFields:
+    """
+    Поля заметки, которые извлекаются при первом обращении (get) и запоминаются.
+    Подходит вместо словаря профиля для evaluate_patient: поля правил,
+    до которых оценка не дошла (stop_at_missing), не извлекаются вовсе.
+    """
+
+    __slots__ = ("_note", "_fields", "_values")
+
+    def __init__(self, note: str, fields: Iterable[str]):
+        self._note = _Note(note)
+        self._fields = frozenset(fields)
+        self._values: Dict[str, Any] = {}
+
+    def get(self, field: str, default: Any = None) -> Any:
+        if field in self._values:
+            return self._values[field]
+        if field not in self._fields:
+            return default
+        value = self._values[field] = BLOCK1_FIELDS[field](self._note)
+        if METRICS.enabled and value is not None and value is not False:
+            METRICS.incr("extractor_matches_total", field=field)
+        return value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Уже извлечённые поля."""
+        return dict(self._values)
+
+class Block1Extractor:
+    """
+    Извлекает поля профиля из текста заметки.
+
+    fields ограничивает извлечение полями, на которые ссылается протокол
+    (например, CompiledProtocol.fields): регулярные выражения и ключевые
+    слова остальных полей не проверяются, в профиле они остаются None.
+    По умолчанию извлекаются все поля.
+    """
+
+    def __init__(self, fields: Optional[Iterable[str]] = None):
+        wanted = None if fields is None else set(fields)
+        self.fields = tuple(f for f in BLOCK1_FIELDS if wanted is None or f in wanted)
+        self._extractors = [(f, BLOCK1_FIELDS[f]) for f in self.fields]
+
+    def extract(self, note: str) -> Dict[str, Any]:
+        """Возвращает словарь полей PatientProfile (без patient_id и source_files)."""
+        parsed = _Note(note)
+        fields = {field: extract(parsed) for field, extract in self._extractors}
+        if METRICS.enabled:
+            # Совпадение — поле найдено в тексте (число или True)
+            for field, value in fields.items():
+                if value is not None and value is not False:
+                    METRICS.incr("extractor_matches_total", field=field)
+            METRICS.incr("notes_extracted_total")
+        return fields
+
+    def lazy(self, note: str) -> LazyFields:
+        """Поля извлекаются по запросу — для evaluate_patient(..., stop_at_missing=True)."""
+        return LazyFields(note, self.fields)
+
+_DEFAULT_EXTRACTOR = Block1Extractor()
+
+def adapt_block1(
+    row: Dict[str, Any],
+    extractor: Optional[Block1Extractor] = None,
+    fields: Optional[Iterable[str]] = None
+) -> "PatientProfile":
+    """
+    Профиль пациента Block 1 из строки TSV.
+    fields — только эти поля (например, CompiledProtocol.fields); для пакетной
+    обработки лучше один раз создать Block1Extractor(fields) и передать его.
+    """
+    from core.models import PatientProfile
+
+    if extractor is None:
+        extractor = _DEFAULT_EXTRACTOR if fields is None else Block1Extractor(fields)
     note = row["note"]
-    return PatientProfile(
-        patient_id=row["patient_id"],
-        age=extract_age(note),
-        gender=extract_gender(note),
-        lvef=extract_lvef(note),
-        nt_probnp=extract_nt_probnp(note),
-        egfr=extract_egfr(note),
-        nyha_class=extract_nyha_class(note),
-        gdmtd_hf_therapy=extract_gdmtd_therapy(note),
-        sglt2_inhibitor=extract_sglt2_inhibitor(note),
-        type1_diabetes=extract_type1_diabetes(note),
-        bp_systolic=extract_systolic_bp(note),
-        bp_diastolic=extract_diastolic_bp(note),
-        # --- SIGIR fields ---
-        congestive_hf=extract_congestive_hf(note),
-        unstable_angina=extract_unstable_angina(note),
-        calcium_channel_blocker=extract_calcium_channel_blocker(note),
-        sbp=extract_sbp(note),
-        source_files={"note": "clinical_note"}
-    )
\ No newline at end of file
+    with METRICS.timer("block1.extract"):
+        fields = extractor.extract(note)
+    with METRICS.timer("profile.construct"):
+        return PatientProfile(
+            patient_id=row["patient_id"],
+            **fields,
+            source_files={"note": "clinical_note"}
+        )
@@ -0,0 +1,190 @@
+import codecs
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Sequence
+
+import pandas as pd
+
+from data_adapters.block1_adapter import adapt_block1
+
+if TYPE_CHECKING:
+    from core.models import PatientProfile
+
+BLOCK1_PATH = "data/block1_data.tsv"
+
+# Кодировки в порядке проверки: utf-8 строгая, cp1252 разбирает почти любые байты
+BLOCK1_ENCODINGS = ("utf-8", "cp1252", "windows-1251")
+
+def _decode_as_cp1252(error: UnicodeDecodeError):
+    # Байты, которые выбранная кодировка не разобрала, читаются как cp1252
+    # (кодировка выгрузок Block 1); неопределённые в cp1252 — как U+FFFD
+    return error.object[error.start:error.end].decode("cp1252", errors="replace"), error.end
+
+# Обработчик ошибок декодирования для чтения TSV (encoding_errors в pd.read_csv):
+# кодировка определяется по префиксу файла, и файл, чей первый мегабайт —
+# чистый ASCII, а дальше встречаются байты cp1252, читается как utf-8.
+# Такие байты не обрывают чтение посреди выгрузки, а декодируются как cp1252
+BLOCK1_ENCODING_ERRORS = "block1-cp1252"
+codecs.register_error(BLOCK1_ENCODING_ERRORS, _decode_as_cp1252)
+
+def sniff_encoding(
+    path: str,
+    prefix_size: int = 1 << 20,
+    encodings: Sequence[str] = BLOCK1_ENCODINGS
+) -> str:
+    """
+    Определяет кодировку по первым prefix_size байтам файла (один раз, без чтения всего файла).
+    Многобайтный символ, обрезанный на границе префикса, ошибкой не считается.
+    Байты после префикса, не подходящие к кодировке, при чтении декодируются
+    как cp1252 (BLOCK1_ENCODING_ERRORS).
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(prefix_size)
+    for encoding in encodings:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return encodings[-1]
+
+def iter_block1_rows(
+    path: str = BLOCK1_PATH,
+    trial_id: Optional[str] = None,
+    chunksize: int = 1000,
+    usecols: Optional[Sequence[str]] = None,
+    encoding: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Построчно отдаёт строки TSV Block 1, читая файл частями по chunksize строк.
+
+    Args:
+        path: путь к TSV
+        trial_id: если задан — только строки этого исследования (фильтр применяется
+            к каждой части сразу после чтения, остальные строки не попадают в память)
+        usecols: колонки, которые нужно прочитать (например, без trial_inclusion/trial_exclusion)
+        encoding: кодировка; по умолчанию определяется sniff_encoding
+    """
+    if usecols is not None and trial_id is not None and "trial_id" not in usecols:
+        usecols = list(usecols) + ["trial_id"]
+    reader = pd.read_csv(
+        path,
+        sep="\t",
+        encoding=encoding or sniff_encoding(path),
+        encoding_errors=BLOCK1_ENCODING_ERRORS,
+        chunksize=chunksize,
+        usecols=usecols,
+    )
+    with reader:
+        for chunk in reader:
+            if trial_id is not None:
+                chunk = chunk[chunk["trial_id"] == trial_id]
+            yield from chunk.to_dict("records")
+
+def iter_block1_profiles(
+    path: str = BLOCK1_PATH,
+    trial_id: Optional[str] = None,
+    chunksize: int = 1000
+) -> Iterator["PatientProfile"]:
+    """adapt_block1 для каждой строки TSV без загрузки файла целиком."""
+    rows = iter_block1_rows(path, trial_id, chunksize, usecols=("patient_id", "note"))
+    for row in rows:
+        yield adapt_block1(row)
+
+# === Нормализованное хранение: критерии исследования отдельно от пациентов ===
+TRIAL_COLUMNS = ("trial_title", "trial_inclusion", "trial_exclusion")
+
+def _na_to_none(value: Any) -> Any:
+    return None if isinstance(value, float) and value != value else value
+
+class Block1Dataset:
+    """
+    Данные Block 1 без повторения текстов критериев в каждой строке.
+
+    trials: по строке на каждый уникальный набор (trial_id, trial_title,
+        trial_inclusion, trial_exclusion); индекс — trial_key. Обычно это одна
+        строка на trial_id, но варианты заголовка одного исследования сохраняются.
+    patients: patient_id, note, expert_eligibility и ссылка на исследование —
+        trial_id (категориальная колонка) и trial_key (int32).
+
+    row(patient_id) восстанавливает исходную строку TSV целиком.
+    """
+
+    def __init__(self, trials: pd.DataFrame, patients: pd.DataFrame, columns: Sequence[str]):
+        self.trials = trials
+        self.patients = patients
+        self.columns = list(columns)
+        self._positions = {pid: i for i, pid in enumerate(patients["patient_id"])}
+
+    def __len__(self) -> int:
+        return len(self.patients)
+
+    def trial_ids(self) -> list:
+        return self.trials["trial_id"].drop_duplicates().tolist()
+
+    def trial(self, trial_id: str) -> Dict[str, Any]:
+        """Заголовок и критерии исследования (первый вариант, если их несколько)."""
+        match = self.trials[self.trials["trial_id"] == trial_id]
+        if match.empty:
+            raise KeyError(trial_id)
+        return match.iloc[0].to_dict()
+
+    def _full_row(self, patient: Dict[str, Any]) -> Dict[str, Any]:
+        trial = self.trials.loc[patient["trial_key"]]
+        merged = {**patient, **{c: trial[c] for c in TRIAL_COLUMNS}}
+        return {c: merged[c] for c in self.columns}
+
+    def row(self, patient_id: str) -> Dict[str, Any]:
+        position = self._positions[patient_id]
+        return self._full_row(self.patients.iloc[position].to_dict())
+
+    def rows(self, trial_id: Optional[str] = None, with_criteria: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Строки пациентов (для adapt_block1). По умолчанию без текстов критериев —
+        они не нужны для извлечения профиля.
+        """
+        patients = self.patients
+        if trial_id is not None:
+            patients = patients[patients["trial_id"] == trial_id]
+        for patient in patients.to_dict("records"):
+            yield self._full_row(patient) if with_criteria else patient
+
+def load_block1_dataset(
+    path: str = BLOCK1_PATH,
+    chunksize: int = 1000,
+    encoding: Optional[str] = None
+) -> Block1Dataset:
+    """
+    Загружает TSV Block 1 частями в нормализованный Block1Dataset:
+    тексты критериев каждого исследования хранятся один раз.
+    """
+    encoding = encoding or sniff_encoding(path)
+    trial_keys: Dict[tuple, int] = {}
+    trial_rows = []
+    parts = []
+    columns = None
+
+    with pd.read_csv(path, sep="\t", encoding=encoding, encoding_errors=BLOCK1_ENCODING_ERRORS,
+                     chunksize=chunksize) as reader:
+        for chunk in reader:
+            columns = columns or list(chunk.columns)
+            keys = []
+            for values in zip(chunk["trial_id"], *(chunk[c] for c in TRIAL_COLUMNS)):
+                values = tuple(_na_to_none(v) for v in values)
+                key = trial_keys.get(values)
+                if key is None:
+                    key = trial_keys[values] = len(trial_rows)
+                    trial_rows.append(values)
+                keys.append(key)
+            patient_part = chunk.drop(columns=list(TRIAL_COLUMNS))
+            patient_part["trial_key"] = pd.array(keys, dtype="int32")
+            parts.append(patient_part)
+
+    trials = pd.DataFrame(trial_rows, columns=["trial_id", *TRIAL_COLUMNS])
+    trials.index.name = "trial_key"
+    if parts:
+        patients = pd.concat(parts, ignore_index=True)
+    else:
+        patients = pd.DataFrame(columns=[c for c in (columns or []) if c not in TRIAL_COLUMNS] + ["trial_key"])
+    patients["trial_id"] = patients["trial_id"].astype("category")
+    if "expert_eligibility" in patients.columns:
+        patients["expert_eligibility"] = patients["expert_eligibility"].astype("category")
+    return Block1Dataset(trials, patients, columns or [])
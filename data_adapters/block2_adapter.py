@@ -1,13 +1,195 @@
-import pandas as pd
+import csv
 import os
-from core.models import PatientProfile
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Mapping, Optional
+from core.instrumentation import METRICS
+from data_adapters.lab_units import convert_value
 
-def adapt_block2(patient_id: str, base_path: str) -> PatientProfile:
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from core.models import PatientProfile
+
+# Версия логики извлечения: меняйте при любом изменении, влияющем на профиль
+# (по ней инвалидируется кэш профилей, см. data_adapters.profile_cache)
+EXTRACTOR_VERSION = "2"
+
+# Файлы пациента, которые может прочитать adapt_block2
+SOURCE_KINDS = ("clinical_note", "anamnesis", "renal_labs", "blood_labs", "urinalysis")
+
+# Поле профиля → файлы, из которых оно извлекается
+FIELD_SOURCES = {
+    "type1_diabetes": ("clinical_note", "anamnesis"),
+    "egfr": ("renal_labs", "blood_labs"),
+    "hba1c": ("renal_labs", "blood_labs"),
+    "uacr": ("urinalysis",),
+}
+
+# Все типы файлов пациента в исследовании (в т.ч. для временных признаков)
+NOTE_KINDS = ("clinical_note", "anamnesis")
+LAB_KINDS = ("renal_labs", "blood_labs", "lipid_labs", "urinalysis")
+TABLE_KINDS = NOTE_KINDS + LAB_KINDS + ("encounters",)
+
+# Строки, которые pd.read_csv по умолчанию читает как пустые значения (NaN)
+NA_VALUES = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+
+def source_paths(patient_id: str, base_path: str) -> list:
+    """
+    Все файлы пациента с именами по умолчанию ({patient_id}_{kind}.csv для
+    TABLE_KINDS, существующие и нет). Имена из manifest.csv — см.
+    block2_study.patient_source_paths.
+    """
+    return [os.path.join(base_path, f"{patient_id}_{kind}.csv") for kind in TABLE_KINDS]
+
+def read_source_csv(path: str) -> "pd.DataFrame":
+    """pd.read_csv файла пациента; при включённых метриках — число файлов, байты и время."""
+    import pandas as pd
+
+    if not METRICS.enabled:
+        return pd.read_csv(path)
+    METRICS.incr("files_opened_total")
+    METRICS.incr("bytes_read_total", os.path.getsize(path))
+    with METRICS.timer("block2.read_csv"):
+        return pd.read_csv(path)
+
+class SourceTable:
+    """
+    Файл пациента, прочитанный модулем csv: имена колонок и строки.
+    Значения — строки как в файле, пустые (NA_VALUES) — None.
+
+    Для adapt_block2 этого достаточно: файлы пациента маленькие, и
+    pd.read_csv на каждый из них в разы медленнее модуля csv, а импорт
+    pandas добавляет к старту процесса больше, чем разбор всех файлов.
+    """
+
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns: List[str], rows: List[List[Optional[str]]]):
+        self.columns = columns
+        self.rows = rows
+
+    @property
+    def empty(self) -> bool:
+        return not self.rows or not self.columns
+
+    def column(self, name: str) -> List[Optional[str]]:
+        """Значения колонки по строкам (короткие строки дополняются None, как в pandas)."""
+        i = self.columns.index(name)
+        return [row[i] if i < len(row) else None for row in self.rows]
+
+def _read_table(path: str) -> SourceTable:
+    # utf-8-sig: BOM в начале файла отбрасывается, как в pd.read_csv
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        # Пустые строки pd.read_csv пропускает (skip_blank_lines)
+        rows = [[None if v in NA_VALUES else v for v in row] for row in reader if row]
+    return SourceTable(columns, rows)
+
+def read_source_table(path: str) -> SourceTable:
+    """SourceTable файла пациента; при включённых метриках — число файлов, байты и время."""
+    if not METRICS.enabled:
+        return _read_table(path)
+    METRICS.incr("files_opened_total")
+    METRICS.incr("bytes_read_total", os.path.getsize(path))
+    with METRICS.timer("block2.read_csv"):
+        return _read_table(path)
+
+def _parse_float(value: Optional[str]) -> float:
+    # Пустая ячейка у pd.read_csv — NaN, и float(NaN) в прежнем адаптере
+    # проходил без ошибки (см. lab_units.normalize_labs, _value_ok)
+    return float("nan") if value is None else float(value)
+
+def _lab_value(test_name: str, value: Optional[str], unit: Optional[str]) -> float:
+    """Значение анализа в стандартной единице (lab_units); ValueError — не число или пересчёт неизвестен."""
+    converted = convert_value(test_name, _parse_float(value), unit)
+    if converted is None:
+        raise ValueError(f"No conversion for {test_name!r} from {unit!r}")
+    return converted
+
+def _lab_rows(table: SourceTable):
+    """(test_name, value, unit) с последней строки файла к первой; без колонки unit — unit=None."""
+    units = table.column("unit") if "unit" in table.columns else [None] * len(table.rows)
+    return reversed(list(zip(table.column("test_name"), table.column("value"), units)))
+
+def has_type1_diabetes(note: str) -> bool:
+    """Тип 1 упомянут в тексте врача и не опровергнут."""
+    note_lower = note.lower()
+    has_type1 = "type 1 diabetes" in note_lower
+    has_negation = (
+        "no history" in note_lower or
+        "not type 1" in note_lower or
+        "type 2 diabetes" in note_lower or
+        "type II diabetes" in note_lower
+    )
+    return has_type1 and not has_negation
+
+def is_egfr_test(test_name: str) -> bool:
+    return "eGFR" in test_name or "egfr" in test_name.lower()
+
+def is_hba1c_test(test_name: str) -> bool:
+    return "HbA1c" in test_name or "hba1c" in test_name.lower()
+
+def is_uacr_test(test_name: str) -> bool:
+    test_lower = test_name.lower()
+    return ("albumin" in test_lower and "creatinine" in test_lower) or "uacr" in test_lower
+
+class _SourceFiles:
+    """Файлы пациента, читаемые по требованию: get(kind) → SourceTable или None, если файла нет."""
+
+    def __init__(self, patient_id: str, base_path: str):
+        self.patient_id = patient_id
+        self.base_path = base_path
+        self._frames = {}
+
+    def get(self, kind: str) -> Optional[SourceTable]:
+        if kind not in self._frames:
+            path = os.path.join(self.base_path, f"{self.patient_id}_{kind}.csv")
+            self._frames[kind] = read_source_table(path) if os.path.exists(path) else None
+        return self._frames[kind]
+
+def adapt_block2(patient_id: str, base_path: str, fields: Optional[Iterable[str]] = None) -> "PatientProfile":
+    """
+    Профиль пациента Block 2 из файлов в папке base_path.
+    fields — только эти поля (например, CompiledProtocol.fields): файлы, из
+    которых они не извлекаются, не читаются, а остальные поля остаются None.
+    """
+    return adapt_block2_frames(patient_id, base_path, _SourceFiles(patient_id, base_path), fields)
+
+def adapt_block2_frames(
+    patient_id: str,
+    base_path: str,
+    frames: Mapping[str, SourceTable],
+    fields: Optional[Iterable[str]] = None
+) -> "PatientProfile":
+    """
+    То же, что adapt_block2, но по уже прочитанным файлам пациента:
+    frames — тип файла (SOURCE_KINDS) → SourceTable (read_source_table);
+    отсутствующего файла в frames нет. base_path нужен только для
+    source_files профиля.
+    См. data_adapters.block2_ingest — чтение файлов заранее и параллельно.
+    """
+    from core.models import PatientProfile
+
+    with METRICS.timer("profile.construct"):
+        return PatientProfile(**extract_block2(patient_id, base_path, frames, fields))
+
+def extract_block2(
+    patient_id: str,
+    base_path: str,
+    frames: Mapping[str, SourceTable],
+    fields: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """Поля профиля (словарь для PatientProfile) по прочитанным файлам пациента; без pydantic."""
+    wanted = FIELD_SOURCES.keys() if fields is None else set(fields)
     profile = {
         "patient_id": patient_id,
-        "type1_diabetes": False,  # Устанавливаем по умолчанию СРАЗУ
         "source_files": {}
     }
+    if "type1_diabetes" in wanted:
+        profile["type1_diabetes"] = False  # Устанавливаем по умолчанию СРАЗУ
     
     # === 1. Текст от врача ===
     note = None
@@ -15,36 +197,28 @@ def adapt_block2(patient_id: str, base_path: str) -> PatientProfile:
 
     # Study W02
     clinical_note_path = os.path.join(base_path, f"{patient_id}_clinical_note.csv")
-    if os.path.exists(clinical_note_path):
-        df = pd.read_csv(clinical_note_path)
+    df = frames.get("clinical_note") if "type1_diabetes" in wanted else None
+    if df is not None:
         if not df.empty and "narrative_note" in df.columns:
-            raw_note = df["narrative_note"].iloc[0]
-            if pd.notna(raw_note) and str(raw_note).strip():
-                note = str(raw_note).strip()
+            raw_note = df.column("narrative_note")[0]
+            if raw_note is not None and raw_note.strip():
+                note = raw_note.strip()
                 note_source = clinical_note_path
 
     # Study W01
-    if note is None:
+    if note is None and "type1_diabetes" in wanted:
         anamnesis_path = os.path.join(base_path, f"{patient_id}_anamnesis.csv")
-        if os.path.exists(anamnesis_path):
-            df = pd.read_csv(anamnesis_path)
+        df = frames.get("anamnesis")
+        if df is not None:
             if not df.empty and "narrative_note" in df.columns:
-                raw_note = df["narrative_note"].iloc[0]
-                if pd.notna(raw_note) and str(raw_note).strip():
-                    note = str(raw_note).strip()
+                raw_note = df.column("narrative_note")[0]
+                if raw_note is not None and raw_note.strip():
+                    note = raw_note.strip()
                     note_source = anamnesis_path
 
     # Анализ текста (только если есть непустой текст)
     if note:
-        note_lower = note.lower()
-        has_type1 = "type 1 diabetes" in note_lower
-        has_negation = (
-            "no history" in note_lower or
-            "not type 1" in note_lower or
-            "type 2 diabetes" in note_lower or
-            "type II diabetes" in note_lower
-        )
-        profile["type1_diabetes"] = has_type1 and not has_negation
+        profile["type1_diabetes"] = has_type1_diabetes(note)
         profile["source_files"]["clinical_note"] = note_source
     # Если текста нет — остаётся False (уже задано выше)
 
@@ -52,54 +226,52 @@ def adapt_block2(patient_id: str, base_path: str) -> PatientProfile:
     labs_df = None
     labs_source = None
 
+    need_labs = "egfr" in wanted or "hba1c" in wanted
     renal_labs_path = os.path.join(base_path, f"{patient_id}_renal_labs.csv")
-    if os.path.exists(renal_labs_path):
-        labs_df = pd.read_csv(renal_labs_path)
+    if need_labs and frames.get("renal_labs") is not None:
+        labs_df = frames.get("renal_labs")
         labs_source = renal_labs_path
 
-    if labs_df is None:
+    if labs_df is None and need_labs:
         blood_labs_path = os.path.join(base_path, f"{patient_id}_blood_labs.csv")
-        if os.path.exists(blood_labs_path):
-            labs_df = pd.read_csv(blood_labs_path)
+        if frames.get("blood_labs") is not None:
+            labs_df = frames.get("blood_labs")
             labs_source = blood_labs_path
 
     if labs_df is not None and not labs_df.empty:
         if "test_name" in labs_df.columns and "value" in labs_df.columns:
-            for _, row in labs_df[::-1].iterrows():
-                test_name = str(row["test_name"])
-                value = row["value"]
-                if profile.get("egfr") is None and ("eGFR" in test_name or "egfr" in test_name.lower()):
+            for test_name, value, unit in _lab_rows(labs_df):
+                test_name = str(test_name)
+                if profile.get("egfr") is None and is_egfr_test(test_name):
                     try:
-                        profile["egfr"] = float(value)
+                        profile["egfr"] = _lab_value(test_name, value, unit)
                     except (ValueError, TypeError):
                         pass
-                if profile.get("hba1c") is None and ("HbA1c" in test_name or "hba1c" in test_name.lower()):
+                if profile.get("hba1c") is None and is_hba1c_test(test_name):
                     try:
-                        profile["hba1c"] = float(value)
+                        profile["hba1c"] = _lab_value(test_name, value, unit)
                     except (ValueError, TypeError):
                         pass
         elif "egfr" in labs_df.columns:
-            last_valid = labs_df["egfr"].dropna()
-            if not last_valid.empty:
-                profile["egfr"] = float(last_valid.iloc[-1])
+            last_valid = [v for v in labs_df.column("egfr") if v is not None]
+            if last_valid:
+                profile["egfr"] = float(last_valid[-1])
         if labs_source:
             profile["source_files"]["labs"] = labs_source
 
     # === 3. UACR (только W01) ===
     urinalysis_path = os.path.join(base_path, f"{patient_id}_urinalysis.csv")
-    if os.path.exists(urinalysis_path):
-        df = pd.read_csv(urinalysis_path)
+    df = frames.get("urinalysis") if "uacr" in wanted else None
+    if df is not None:
         if not df.empty and "test_name" in df.columns and "value" in df.columns:
-            for _, row in df[::-1].iterrows():
-                test_name = str(row["test_name"])
-                value = row["value"]
-                if profile.get("uacr") is None:
-                    test_lower = test_name.lower()
-                    if ("albumin" in test_lower and "creatinine" in test_lower) or "uacr" in test_lower:
-                        try:
-                            profile["uacr"] = float(value)
-                        except (ValueError, TypeError):
-                            pass
+            for test_name, value, unit in _lab_rows(df):
+                if profile.get("uacr") is None and is_uacr_test(str(test_name)):
+                    try:
+                        profile["uacr"] = _lab_value(str(test_name), value, unit)
+                    except (ValueError, TypeError):
+                        pass
             profile["source_files"]["urinalysis"] = urinalysis_path
 
-    return PatientProfile(**profile)
\ No newline at end of file
+    for field in FIELD_SOURCES.keys() - wanted:
+        profile.pop(field, None)
+    return profile
\ No newline at end of file
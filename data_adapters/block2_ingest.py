@@ -0,0 +1,129 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from data_adapters.block2_adapter import (
+    FIELD_SOURCES, SOURCE_KINDS, TABLE_KINDS, SourceTable, adapt_block2_frames, read_source_csv, read_source_table,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from core.models import PatientProfile
+
+# Значения по умолчанию: на сетевом хранилище чтение маленького CSV — это
+# в основном задержка (~5 мс), поэтому потоков больше, чем ядер
+DEFAULT_CONCURRENCY = 16
+DEFAULT_MAX_PENDING = 64
+
+def source_kinds(fields: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+    """Типы файлов, нужные adapt_block2 для полей fields (None — все), в порядке SOURCE_KINDS."""
+    if fields is None:
+        return SOURCE_KINDS
+    kinds = set()
+    for field in fields:
+        kinds.update(FIELD_SOURCES.get(field, ()))
+    return tuple(kind for kind in SOURCE_KINDS if kind in kinds)
+
+def index_study_files(study_dir: str) -> Dict[str, str]:
+    """
+    Карта «имя файла → путь» по всем папкам исследования
+    (по одному listdir на папку вместо os.path.exists на каждый файл).
+    """
+    paths = {}
+    for entry in sorted(os.scandir(study_dir), key=lambda e: e.name):
+        if entry.is_dir():
+            for f in os.scandir(entry.path):
+                if f.is_file():
+                    # Пути собираются так же, как в adapt_block2: os.path.join(base_path, name)
+                    paths.setdefault(f.name, os.path.join(study_dir, entry.name, f.name))
+        elif entry.is_file():
+            paths.setdefault(entry.name, os.path.join(study_dir, entry.name))
+    return paths
+
+def _read_if_exists(path: str) -> Optional[SourceTable]:
+    return read_source_table(path) if os.path.exists(path) else None
+
+def read_many(paths: Sequence[str], concurrency: int = DEFAULT_CONCURRENCY) -> List["pd.DataFrame"]:
+    """pd.read_csv для каждого пути (в том же порядке); до concurrency файлов одновременно."""
+    if concurrency <= 1 or len(paths) <= 1:
+        return [read_source_csv(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(paths)), thread_name_prefix="block2-io") as pool:
+        return list(pool.map(read_source_csv, paths))
+
+def prefetch_patient_files(
+    patients: Iterable[Tuple[str, str]],
+    fields: Optional[Iterable[str]] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_pending: int = DEFAULT_MAX_PENDING
+) -> Iterator[Tuple[str, str, Dict[str, SourceTable]]]:
+    """
+    Читает файлы пациентов (read_source_table) в пуле потоков с опережением.
+
+    patients — пары (patient_id, папка пациента). Все файлы пациента и файлы
+    следующих пациентов читаются одновременно (не больше concurrency
+    чтений); в очереди — не больше max_pending пациентов, так что память
+    ограничена, а чтение идёт, пока вызывающий код извлекает поля.
+
+    Отдаёт (patient_id, папка, {тип файла: SourceTable}) в исходном порядке;
+    отсутствующих файлов в словаре нет.
+    """
+    kinds = source_kinds(fields)
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="block2-io")
+    pending: deque = deque()
+
+    def resolve(item) -> Tuple[str, str, Dict[str, SourceTable]]:
+        pid, base_path, futures = item
+        frames = {}
+        for kind, future in futures.items():
+            df = future.result()
+            if df is not None:
+                frames[kind] = df
+        return pid, base_path, frames
+
+    try:
+        for pid, base_path in patients:
+            futures: Dict[str, Future] = {
+                kind: pool.submit(_read_if_exists, os.path.join(base_path, f"{pid}_{kind}.csv"))
+                for kind in kinds
+            }
+            pending.append((pid, base_path, futures))
+            if len(pending) >= max_pending:
+                yield resolve(pending.popleft())
+        while pending:
+            yield resolve(pending.popleft())
+    finally:
+        # Генератор могли не дочитать: непрочитанные файлы отменяются
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def iter_block2_profiles(
+    study_dir: str,
+    patient_ids: Optional[Iterable[str]] = None,
+    fields: Optional[Iterable[str]] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_pending: int = DEFAULT_MAX_PENDING
+) -> Iterator["PatientProfile"]:
+    """
+    Профили пациентов исследования Block 2 (по manifest.csv) — те же, что
+    adapt_block2, но файлы читаются заранее и параллельно (prefetch_patient_files).
+    pandas не импортируется: manifest и файлы пациентов читает модуль csv.
+
+    Пример:
+        for profile in iter_block2_profiles("data/Study W02", fields=plan.fields, concurrency=32):
+            evaluate_patient(profile.model_dump(), plan)
+    """
+    ids = read_source_table(os.path.join(study_dir, "manifest.csv")).column("patient_id")
+    if patient_ids is not None:
+        wanted = set(patient_ids)
+        ids = [pid for pid in ids if pid in wanted]
+    file_index = index_study_files(study_dir)
+
+    def patients() -> Iterator[Tuple[str, str]]:
+        for pid in ids:
+            paths = (file_index.get(f"{pid}_{kind}.csv") for kind in TABLE_KINDS)
+            path = next((p for p in paths if p), None)
+            yield pid, os.path.dirname(path) if path else study_dir
+
+    for pid, base_path, frames in prefetch_patient_files(patients(), fields, concurrency, max_pending):
+        yield adapt_block2_frames(pid, base_path, frames, fields)
@@ -0,0 +1,364 @@
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from core.instrumentation import METRICS
+from core.models import PROFILE_FIELDS, BulkProfile
+from data_adapters import block2_adapter
+from data_adapters.block2_adapter import (
+    FIELD_SOURCES, LAB_KINDS, NOTE_KINDS, TABLE_KINDS, adapt_block2, has_type1_diabetes,
+)
+from data_adapters.block2_ingest import index_study_files, read_many
+from data_adapters.lab_units import normalize_labs
+
+if TYPE_CHECKING:
+    from core.models import PatientProfile
+
+def kinds_for_fields(fields: Optional[Iterable[str]], index_dates_in_manifest: bool = True) -> set:
+    """
+    Типы файлов, которые нужно прочитать ради полей протокола (None — все).
+    Поля, которых нет в PatientProfile, считаются временными признаками
+    (секция features:) — для них читаются все лаборатории и визиты, а если
+    в manifest нет index_date — ещё и заметки (см. Block2Study.index_dates).
+    """
+    if fields is None:
+        return set(TABLE_KINDS)
+    kinds = set()
+    for field in fields:
+        if field in FIELD_SOURCES:
+            kinds.update(FIELD_SOURCES[field])
+        elif field not in PROFILE_FIELDS:
+            kinds.update(LAB_KINDS + ("encounters",))
+            if not index_dates_in_manifest:
+                kinds.update(NOTE_KINDS)
+    return kinds
+
+def _last_per_patient(labs: pd.DataFrame, mask: pd.Series) -> pd.Series:
+    """Последнее (по порядку строк в файле) разобранное значение на пациента."""
+    rows = labs[mask & labs["_value_ok"]]
+    rows = rows.drop_duplicates("patient_id", keep="last")
+    return rows.set_index("patient_id")["_value"]
+
+def read_manifest(study_dir: str) -> pd.DataFrame:
+    """manifest.csv исследования (patient_id — строки)."""
+    manifest_path = os.path.join(study_dir, "manifest.csv")
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Manifest not found: {manifest_path}")
+    return pd.read_csv(manifest_path, dtype={"patient_id": str})
+
+class Block2Study:
+    """
+    Исследование Block 2, загруженное целиком по manifest.csv.
+
+    Все файлы одного типа (*_blood_labs, *_renal_labs, *_urinalysis, *_encounters, ...)
+    склеиваются в одну «длинную» таблицу frames[kind] с колонками исходного файла плюс:
+        patient_id — из manifest.csv
+        source_file — путь к исходному файлу
+        _row — номер строки внутри файла
+
+    Последние eGFR, HbA1c и UACR выбираются groupby-операциями (latest_labs),
+    профили совпадают с adapt_block2 (profiles).
+    """
+
+    def __init__(
+        self,
+        study_dir: str,
+        patient_ids: Optional[Iterable[str]] = None,
+        file_index: Optional[Dict[str, str]] = None,
+        fields: Optional[Iterable[str]] = None,
+        io_threads: int = 1,
+        manifest: Optional[pd.DataFrame] = None
+    ):
+        self.study_dir = study_dir
+        self.fields = None if fields is None else set(fields)
+        if manifest is None:
+            manifest = read_manifest(study_dir)
+        if patient_ids is not None:
+            wanted = set(patient_ids)
+            manifest = manifest[manifest["patient_id"].isin(wanted)]
+        self.manifest = manifest.reset_index(drop=True)
+        self.patient_ids: List[str] = self.manifest["patient_id"].tolist()
+
+        if file_index is None:
+            file_index = index_study_files(study_dir)
+        # Папка пациента (для fallback на adapt_block2)
+        self.base_paths: Dict[str, str] = {}
+        # Пациенты, у которых есть файл данного типа (в том числе пустой)
+        self.has_file: Dict[str, set] = {}
+        # Файлы, которые не удалось обработать векторно (нестандартный формат)
+        self._fallback = set()
+
+        self._temporal_index = None
+        self.frames: Dict[str, pd.DataFrame] = {}
+        kinds = kinds_for_fields(self.fields, "index_date" in self.manifest.columns)
+        with METRICS.timer("block2_study.load"):
+            # Сначала пути всех нужных файлов, затем чтение — при io_threads > 1
+            # в пуле потоков (см. data_adapters.block2_ingest.read_many)
+            sources = {kind: self._kind_paths(kind, file_index) for kind in TABLE_KINDS if kind in kinds}
+            paths = [path for entries in sources.values() for _, path in entries]
+            read = iter(read_many(paths, io_threads))
+            for kind in TABLE_KINDS:
+                if kind in sources:
+                    entries = sources[kind]
+                    self.frames[kind] = self._build_kind(kind, entries, [next(read) for _ in entries])
+                else:
+                    self.has_file[kind] = set()
+                    self.frames[kind] = pd.DataFrame(columns=["patient_id", "source_file", "_row"])
+
+    def _kind_paths(self, kind: str, file_index: Dict[str, str]) -> List[Tuple[str, str]]:
+        """(patient_id, путь) файлов данного типа по manifest и индексу файлов."""
+        column = f"{kind}_file"
+        if column in self.manifest.columns:
+            names = dict(zip(self.manifest["patient_id"], self.manifest[column]))
+        else:
+            names = {}
+        entries = []
+        self.has_file[kind] = set()
+        for pid in self.patient_ids:
+            name = names.get(pid)
+            if not isinstance(name, str) or not name:
+                name = f"{pid}_{kind}.csv"
+            path = file_index.get(name)
+            if path is None:
+                continue
+            self.base_paths.setdefault(pid, os.path.dirname(path))
+            self.has_file[kind].add(pid)
+            entries.append((pid, path))
+        return entries
+
+    def _build_kind(self, kind: str, entries: List[Tuple[str, str]], dfs: List[pd.DataFrame]) -> pd.DataFrame:
+        parts = []
+        for (pid, path), df in zip(entries, dfs):
+            if kind in LAB_KINDS and not df.empty and not {"test_name", "value"} <= set(df.columns):
+                # Широкий формат (например, колонка egfr) — считаем через adapt_block2
+                self._fallback.add(pid)
+            df["patient_id"] = pid
+            df["source_file"] = path
+            df["_row"] = range(len(df))
+            parts.append(df)
+
+        if not parts:
+            return pd.DataFrame(columns=["patient_id", "source_file", "_row"])
+        frame = pd.concat(parts, ignore_index=True)
+        if "value" in frame.columns:
+            # Числа в стандартных единицах и флаги строк (_value, _value_ok, _unit, _issue)
+            frame = normalize_labs(frame)
+        return frame
+
+    def _lab_table(self) -> pd.DataFrame:
+        """renal_labs пациента, а если файла нет — blood_labs (как в adapt_block2)."""
+        renal = self.frames["renal_labs"]
+        blood = self.frames["blood_labs"]
+        blood = blood[~blood["patient_id"].isin(self.has_file["renal_labs"])]
+        return pd.concat([renal, blood], ignore_index=True)
+
+    def _latest_values(self) -> Dict[str, pd.Series]:
+        """Поле → Series (индекс patient_id) только для пациентов, у которых значение найдено."""
+        latest = {}
+        labs = self._lab_table()
+        if "test_name" in labs.columns and "_value" in labs.columns:
+            names = labs["test_name"].astype(str).str.lower()
+            latest["egfr"] = _last_per_patient(labs, names.str.contains("egfr", regex=False))
+            latest["hba1c"] = _last_per_patient(labs, names.str.contains("hba1c", regex=False))
+
+        urine = self.frames["urinalysis"]
+        if "test_name" in urine.columns and "_value" in urine.columns:
+            names = urine["test_name"].astype(str).str.lower()
+            is_uacr = (
+                names.str.contains("albumin", regex=False) & names.str.contains("creatinine", regex=False)
+            ) | names.str.contains("uacr", regex=False)
+            latest["uacr"] = _last_per_patient(urine, is_uacr)
+        return latest
+
+    def latest_labs(self) -> pd.DataFrame:
+        """
+        Последние eGFR, HbA1c и UACR на пациента (индекс — patient_id).
+        """
+        result = pd.DataFrame(index=pd.Index(self.patient_ids, name="patient_id"))
+        for field, values in self._latest_values().items():
+            result[field] = values
+        return result.reindex(columns=["egfr", "hba1c", "uacr"])
+
+    def notes(self) -> Dict[str, Dict[str, str]]:
+        """
+        Текст врача на пациента: {"patient_id": {"note": ..., "source": path}}.
+        Сначала clinical_note (W02), затем anamnesis (W01) — первая строка файла.
+        """
+        notes = {}
+        for kind in NOTE_KINDS:
+            frame = self.frames[kind]
+            if frame.empty or "narrative_note" not in frame.columns:
+                continue
+            first = frame[frame["_row"] == 0]
+            for pid, raw_note, path in zip(first["patient_id"], first["narrative_note"], first["source_file"]):
+                if pid in notes or not pd.notna(raw_note) or not str(raw_note).strip():
+                    continue
+                notes[pid] = {"note": str(raw_note).strip(), "source": path}
+        return notes
+
+    def index_dates(self) -> Dict[str, Any]:
+        """Дата индекса на пациента: из manifest.csv, иначе из первой строки текста врача."""
+        dates = {}
+        for kind in NOTE_KINDS:
+            frame = self.frames[kind]
+            if "index_date" in frame.columns:
+                first = frame[frame["_row"] == 0]
+                dates.update(zip(first["patient_id"], first["index_date"]))
+        if "index_date" in self.manifest.columns:
+            dates.update(zip(self.manifest["patient_id"], self.manifest["index_date"]))
+        return {pid: value for pid, value in dates.items() if pd.notna(value)}
+
+    def temporal_index(self):
+        """TemporalIndex по всем лабораториям и визитам исследования (строится один раз)."""
+        if self._temporal_index is None:
+            from data_adapters.temporal_features import TemporalIndex
+
+            labs = pd.concat([self.frames[kind] for kind in LAB_KINDS], ignore_index=True)
+            if "test_name" not in labs.columns:
+                labs = None
+            encounters = self.frames["encounters"]
+            if "encounter_date" not in encounters.columns:
+                encounters = None
+            with METRICS.timer("temporal.index"):
+                self._temporal_index = TemporalIndex.from_frames(labs, encounters)
+        return self._temporal_index
+
+    def features(self, specs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Временные признаки протокола (см. protocol_loader.load_protocol_features)
+        на пациента: {"patient_id": {"baseline_ldl": 185.0, ...}}.
+        """
+        from data_adapters.temporal_features import compute_features
+
+        if not specs:
+            return {pid: {} for pid in self.patient_ids}
+        index = self.temporal_index()
+        dates = self.index_dates()
+        return {
+            pid: compute_features(index, pid, dates.get(pid), specs)
+            for pid in self.patient_ids
+        }
+
+    def _profile_fields(self) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        (patient_id, поля профиля) для каждого пациента из manifest;
+        None — файлы нестандартного формата, профиль строит adapt_block2.
+        """
+        latest = self._latest_values()
+        notes = self.notes()
+
+        lab_sources = self._lab_table().drop_duplicates("patient_id").set_index("patient_id")["source_file"]
+        urine = self.frames["urinalysis"]
+        if "test_name" in urine.columns and "value" in urine.columns:
+            urine_sources = urine.drop_duplicates("patient_id").set_index("patient_id")["source_file"]
+        else:
+            urine_sources = pd.Series(dtype=object)
+
+        for pid in self.patient_ids:
+            if pid in self._fallback:
+                yield pid, None
+                continue
+
+            profile = {"patient_id": pid, "type1_diabetes": False, "source_files": {}}
+            if pid in notes:
+                profile["type1_diabetes"] = has_type1_diabetes(notes[pid]["note"])
+                profile["source_files"]["clinical_note"] = notes[pid]["source"]
+            for field, values in latest.items():
+                if pid in values.index:
+                    profile[field] = float(values[pid])
+            if pid in lab_sources.index:
+                profile["source_files"]["labs"] = lab_sources[pid]
+            if pid in urine_sources.index:
+                profile["source_files"]["urinalysis"] = urine_sources[pid]
+            if self.fields is not None:
+                for field in FIELD_SOURCES.keys() - self.fields:
+                    profile.pop(field, None)
+            yield pid, profile
+
+    def profiles(self) -> Dict[str, "PatientProfile"]:
+        """PatientProfile для каждого пациента из manifest — те же, что даёт adapt_block2."""
+        from core.models import PatientProfile
+
+        profiles = {}
+        for pid, fields in self._profile_fields():
+            if fields is None:
+                profiles[pid] = adapt_block2(pid, self.base_paths[pid], self.fields)
+            else:
+                profiles[pid] = PatientProfile(**fields)
+        return profiles
+
+    def bulk_profiles(self) -> Dict[str, BulkProfile]:
+        """Те же профили без валидации pydantic (BulkProfile) — для пакетного скрининга."""
+        profiles = {}
+        for pid, fields in self._profile_fields():
+            if fields is None:
+                profiles[pid] = BulkProfile.from_profile(adapt_block2(pid, self.base_paths[pid], self.fields))
+            else:
+                profiles[pid] = BulkProfile(**fields)
+        return profiles
+
+def load_block2_study(
+    study_dir: str,
+    patient_ids: Optional[Iterable[str]] = None,
+    file_index: Optional[Dict[str, str]] = None,
+    fields: Optional[Iterable[str]] = None,
+    io_threads: int = 1,
+    manifest: Optional[pd.DataFrame] = None
+) -> Block2Study:
+    """
+    Загружает исследование Block 2 (например, "data/Study W02") по manifest.csv.
+
+    Args:
+        study_dir: папка исследования с manifest.csv и подпапками пациентов
+        patient_ids: необязательный список пациентов (по умолчанию — весь manifest)
+        file_index: готовая карта «имя файла → путь» (см. index_study_files),
+            чтобы не сканировать папки заново при загрузке по частям
+        fields: поля протокола (CompiledProtocol.fields); файлы, не нужные
+            для них, не читаются (см. kinds_for_fields)
+        io_threads: сколько файлов читать одновременно (полезно на сетевом
+            хранилище, где чтение маленького CSV — в основном задержка)
+        manifest: уже прочитанный manifest (read_manifest) или его строки —
+            при загрузке по частям manifest.csv не читается заново
+    """
+    return Block2Study(study_dir, patient_ids, file_index, fields, io_threads, manifest)
+
+def patient_source_paths(record: Dict[str, Any], study_dir: str, file_index: Dict[str, str]) -> List[str]:
+    """
+    Пути всех файлов пациента (TABLE_KINDS) по его строке manifest: имя из
+    колонки {kind}_file, иначе {patient_id}_{kind}.csv — как в Block2Study._kind_paths.
+    Для отсутствующего файла — путь в study_dir (см. files_fingerprint).
+    """
+    paths = []
+    for kind in TABLE_KINDS:
+        name = record.get(f"{kind}_file")
+        if not isinstance(name, str) or not name:
+            name = f"{record['patient_id']}_{kind}.csv"
+        paths.append(file_index.get(name) or os.path.join(study_dir, name))
+    return paths
+
+def patient_fingerprints(study_dir: str, file_index: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Отпечаток исходных данных каждого пациента из manifest.csv: строка manifest
+    (index_date, имена файлов) плюс размер и mtime всех его файлов (без чтения
+    содержимого) и версия экстрактора (block2_adapter.EXTRACTOR_VERSION).
+    Изменился отпечаток — пациента нужно извлечь и оценить заново.
+    """
+    from data_adapters.profile_cache import files_fingerprint
+
+    manifest = read_manifest(study_dir)
+    if file_index is None:
+        file_index = index_study_files(study_dir)
+
+    fingerprints = {}
+    for record in manifest.to_dict("records"):
+        pid = record["patient_id"]
+        paths = patient_source_paths(record, study_dir, file_index)
+        payload = (
+            json.dumps(record, sort_keys=True, default=str) + files_fingerprint(paths)
+            + block2_adapter.EXTRACTOR_VERSION
+        )
+        fingerprints[pid] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return fingerprints
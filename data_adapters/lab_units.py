@@ -0,0 +1,177 @@
+import math
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from core.instrumentation import METRICS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Тест → (стандартная единица, {другая единица: (множитель, сдвиг)}):
+# значение в стандартной единице = значение × множитель + сдвиг.
+# Стандарты — criteria.txt W02: липиды и креатинин в mg/dL, ALT/AST в U/L,
+# eGFR в mL/min/1.73 m²
+LAB_UNITS: Dict[str, Tuple[str, Dict[str, Tuple[float, float]]]] = {
+    # --- Липиды ---
+    "ldl-c": ("mg/dL", {"mmol/L": (38.67, 0.0)}),
+    "hdl-c": ("mg/dL", {"mmol/L": (38.67, 0.0)}),
+    "total cholesterol": ("mg/dL", {"mmol/L": (38.67, 0.0)}),
+    "triglycerides": ("mg/dL", {"mmol/L": (88.57, 0.0)}),
+    # --- Печень ---
+    "alt": ("U/L", {"µkat/L": (60.0, 0.0)}),
+    "ast": ("U/L", {"µkat/L": (60.0, 0.0)}),
+    # --- Почки ---
+    "creatinine": ("mg/dL", {"µmol/L": (1 / 88.42, 0.0)}),
+    "bun": ("mg/dL", {"mmol/L": (2.801, 0.0)}),
+    "egfr (ckd-epi)": ("mL/min/1.73 m²", {}),
+    "urine albumin/creatinine ratio": ("mg/g", {"mg/mmol": (8.84, 0.0)}),
+    "urine protein": ("mg/dL", {"g/L": (100.0, 0.0)}),
+    # --- Углеводный обмен, кровь ---
+    "hba1c": ("%", {"mmol/mol": (0.09148, 2.152)}),   # IFCC → NGSP
+    "glucose (fasting)": ("mg/dL", {"mmol/L": (18.016, 0.0)}),
+    "hemoglobin": ("g/dL", {"g/L": (0.1, 0.0)}),
+}
+
+# Флаги строк (колонка _issue); пусто — значение разобрано, единица стандартная
+ISSUE_UNPARSEABLE = "unparseable"        # значение не число (текст, смесь текста и числа)
+ISSUE_CONVERTED = "converted"            # единица нестандартная, значение пересчитано
+ISSUE_UNKNOWN_UNIT = "unknown_unit"      # единица нестандартная и пересчёт неизвестен — значения нет
+ISSUE_MISSING_UNIT = "missing_unit"      # единица не указана — значение оставлено как есть
+LAB_ISSUES = [ISSUE_UNPARSEABLE, ISSUE_CONVERTED, ISSUE_UNKNOWN_UNIT, ISSUE_MISSING_UNIT]
+
+def lab_test_key(name: Any) -> str:
+    """Ключ теста: без пробелов по краям, в нижнем регистре (как в TemporalIndex)."""
+    return str(name).strip().lower()
+
+def lab_unit_key(unit: Any) -> str:
+    """Ключ единицы: регистр, пробелы и написание µ/μ/u, ²/2 не различаются."""
+    if unit is None or (isinstance(unit, float) and math.isnan(unit)):
+        return ""
+    return (
+        str(unit).lower().replace(" ", "").replace("µ", "u").replace("μ", "u").replace("²", "2")
+    )
+
+def _build_conversions() -> Dict[Tuple[str, str], Tuple[float, float, bool]]:
+    table = {}
+    for test, (standard, others) in LAB_UNITS.items():
+        table[(test, lab_unit_key(standard))] = (1.0, 0.0, True)
+        for unit, (factor, offset) in others.items():
+            table[(test, lab_unit_key(unit))] = (factor, offset, False)
+    return table
+
+# (ключ теста, ключ единицы) → (множитель, сдвиг, единица стандартная)
+CONVERSIONS = _build_conversions()
+_STANDARD_UNITS = {test: standard for test, (standard, _) in LAB_UNITS.items()}
+
+_ARRAYS = None
+
+def _conversion_arrays():
+    """CONVERSIONS для normalize_labs: MultiIndex ключей и массивы множителей (строятся один раз)."""
+    global _ARRAYS
+    if _ARRAYS is None:
+        import numpy as np
+        import pandas as pd
+
+        _ARRAYS = (
+            pd.MultiIndex.from_tuples(list(CONVERSIONS), names=["test", "unit"]),
+            np.array([c[0] for c in CONVERSIONS.values()]),
+            np.array([c[1] for c in CONVERSIONS.values()]),
+            np.array([c[2] for c in CONVERSIONS.values()]),
+        )
+    return _ARRAYS
+
+def convert_value(test_name: Any, value: float, unit: Any) -> Optional[float]:
+    """
+    Одно значение в стандартной единице теста; None — пересчёт неизвестен.
+    Тесты без записи в LAB_UNITS и значения без единицы не пересчитываются.
+    Для файлов одного пациента (adapt_block2, без pandas); для таблиц — normalize_labs.
+    """
+    test = lab_test_key(test_name)
+    if test not in LAB_UNITS:
+        return value
+    unit = lab_unit_key(unit)
+    if not unit:
+        return value
+    conversion = CONVERSIONS.get((test, unit))
+    if conversion is None:
+        return None
+    factor, offset, _ = conversion
+    return value * factor + offset
+
+def _keys(values: "pd.Series", key):
+    """key() для каждой строки, но вычисленный по уникальным значениям колонки."""
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    # Пустые значения получают код -1 — последний элемент, key(None)
+    keys = np.array([key(u) for u in uniques] + [key(None)], dtype=object)
+    return keys[codes]
+
+def normalize_labs(labs: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Разбор и пересчёт значений «длинной» таблицы лабораторий (колонки
+    test_name, value и необязательная unit) целиком, без цикла по строкам.
+
+    Возвращает копию с колонками:
+        _value — число в стандартной единице теста (NaN — не разобрано
+            или пересчёт неизвестен)
+        _value_ok — значение пригодно: разобрано (или пустое — как float(NaN)
+            в adapt_block2) и, если нужен пересчёт, он известен
+        _unit — стандартная единица теста (для тестов вне LAB_UNITS — исходная)
+        _issue — категория из LAB_ISSUES или пусто (см. ISSUE_*)
+
+    Пересчёт — по таблице CONVERSIONS: ключи теста и единицы вычисляются по
+    уникальным значениям колонок, строки сопоставляются с таблицей одним
+    get_indexer по MultiIndex.
+    """
+    import numpy as np
+    import pandas as pd
+
+    index, factors, offsets, is_standard = _conversion_arrays()
+    frame = labs.copy()
+    n = len(frame)
+    raw = frame["value"] if "value" in frame.columns else pd.Series(np.nan, index=frame.index)
+    parsed = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=float)
+    blank = raw.isna().to_numpy()
+    unparseable = np.isnan(parsed) & ~blank
+
+    tests = _keys(frame["test_name"], lab_test_key) if "test_name" in frame.columns else np.full(n, "", dtype=object)
+    if "unit" in frame.columns:
+        units = _keys(frame["unit"], lab_unit_key)
+        no_unit = units == ""
+    else:
+        # Файл без колонки единиц: пересчитывать нечего, флаг не ставится
+        units = np.full(n, "", dtype=object)
+        no_unit = np.zeros(n, dtype=bool)
+
+    known_test = pd.Series(tests, dtype=object).isin(_STANDARD_UNITS).to_numpy()
+    position = index.get_indexer(pd.MultiIndex.from_arrays([tests, units]))
+    found = position >= 0
+    factor = np.where(found, factors[position], 1.0)
+    offset = np.where(found, offsets[position], 0.0)
+    converted = found & ~is_standard[position]
+    unknown_unit = known_test & ~found & ~(units == "")
+    missing_unit = known_test & no_unit
+
+    values = parsed * factor + offset
+    values[unknown_unit] = np.nan
+    frame["_value"] = values
+    frame["_value_ok"] = (~unparseable | blank) & ~unknown_unit
+
+    standard_units = pd.Series(tests, dtype=object).map(_STANDARD_UNITS).to_numpy(dtype=object)
+    original_units = frame["unit"].to_numpy(dtype=object) if "unit" in frame.columns else np.full(n, None, dtype=object)
+    frame["_unit"] = np.where(known_test, standard_units, original_units)
+
+    codes = np.select(
+        [unparseable, unknown_unit, missing_unit, converted],
+        [LAB_ISSUES.index(ISSUE_UNPARSEABLE), LAB_ISSUES.index(ISSUE_UNKNOWN_UNIT),
+         LAB_ISSUES.index(ISSUE_MISSING_UNIT), LAB_ISSUES.index(ISSUE_CONVERTED)],
+        default=-1,
+    )
+    frame["_issue"] = pd.Categorical.from_codes(codes, categories=LAB_ISSUES)
+
+    if METRICS.enabled:
+        for issue, count in frame["_issue"].value_counts().items():
+            if count:
+                METRICS.incr("lab_rows_flagged_total", int(count), issue=issue)
+    return frame
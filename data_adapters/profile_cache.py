@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional
+
+from core.models import PatientProfile
+from data_adapters import block1_adapter, block2_adapter
+
+def _stamp(kind: str) -> str:
+    """Штамп версии экстрактора: записи со старым штампом считаются устаревшими."""
+    module = block1_adapter if kind == "block1" else block2_adapter
+    return f"{kind}:{module.EXTRACTOR_VERSION}"
+
+def block1_fingerprint(row: Dict[str, Any]) -> str:
+    """Хэш полей строки TSV, которые читает adapt_block1, и версии экстрактора (EXTRACTOR_VERSION)."""
+    payload = json.dumps(
+        [str(row["patient_id"]), str(row["note"]), block1_adapter.EXTRACTOR_VERSION], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def files_fingerprint(paths: Iterable[str]) -> str:
+    """
+    Отпечаток набора файлов по размеру и mtime (без чтения содержимого).
+    Отсутствующие файлы тоже входят в отпечаток: появление нового файла
+    (например, renal_labs вместо blood_labs) меняет профиль.
+    """
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}|{st.st_size}|{st.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append(f"{path}|-")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+def _block2_key(patient_id: str, base_path: str, paths: Optional[List[str]] = None):
+    """
+    (источник, отпечаток) записи Block 2. paths — файлы пациента, если их имена
+    заданы manifest.csv (block2_study.patient_source_paths); по умолчанию —
+    имена {patient_id}_{kind}.csv в base_path.
+    """
+    source = f"block2:{os.path.abspath(base_path)}"
+    if paths is None:
+        paths = block2_adapter.source_paths(patient_id, base_path)
+    return source, files_fingerprint(paths)
+
+class ProfileCache:
+    """
+    Кэш извлечённых PatientProfile на диске (SQLite).
+
+    Запись хранится по (источник, patient_id) вместе с отпечатком исходных данных
+    и штампом EXTRACTOR_VERSION адаптера. Если отпечаток или версия не совпадают,
+    профиль извлекается заново и перезаписывается.
+
+    Пример:
+        cache = ProfileCache(".cache/profiles.sqlite")
+        profile = cache.block2("S0001", "data/Study W02/Eligible Patients")
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # timeout: несколько процессов screen.py могут писать одновременно
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " source TEXT NOT NULL,"
+            " patient_id TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " profile TEXT NOT NULL,"
+            " PRIMARY KEY (source, patient_id))"
+        )
+        self._conn.commit()
+        self._pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source: str, patient_id: str, fingerprint: str, kind: str) -> Optional[PatientProfile]:
+        row = self._conn.execute(
+            "SELECT fingerprint, version, profile FROM profiles WHERE source = ? AND patient_id = ?",
+            (source, patient_id),
+        ).fetchone()
+        if row is None or row[0] != fingerprint or row[1] != _stamp(kind):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return PatientProfile.model_validate_json(row[2])
+
+    def put(self, source: str, profile: PatientProfile, fingerprint: str, kind: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO profiles (source, patient_id, fingerprint, version, profile)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (source, profile.patient_id, fingerprint, _stamp(kind), profile.model_dump_json()),
+        )
+        # Коммитим пачками: на больших когортах коммит на каждую запись дорог
+        self._pending += 1
+        if self._pending >= 500:
+            self.flush()
+
+    def flush(self) -> None:
+        self._conn.commit()
+        self._pending = 0
+
+    def block1(self, row: Dict[str, Any]) -> PatientProfile:
+        """adapt_block1 с кэшем: ключ — patient_id и хэш текста заметки."""
+        fingerprint = block1_fingerprint(row)
+        patient_id = str(row["patient_id"])
+        profile = self.get("block1", patient_id, fingerprint, "block1")
+        if profile is None:
+            profile = block1_adapter.adapt_block1(row)
+            self.put("block1", profile, fingerprint, "block1")
+        return profile
+
+    def get_block2(
+        self, patient_id: str, base_path: str, paths: Optional[List[str]] = None
+    ) -> Optional[PatientProfile]:
+        """Профиль из кэша или None; base_path и paths — как в put_block2."""
+        source, fingerprint = _block2_key(patient_id, base_path, paths)
+        return self.get(source, patient_id, fingerprint, "block2")
+
+    def put_block2(self, profile: PatientProfile, base_path: str, paths: Optional[List[str]] = None) -> None:
+        """
+        base_path — папка пациента (adapt_block2) или исследования; paths — все
+        файлы пациента по manifest (block2_study.patient_source_paths).
+        """
+        source, fingerprint = _block2_key(profile.patient_id, base_path, paths)
+        self.put(source, profile, fingerprint, "block2")
+
+    def block2(self, patient_id: str, base_path: str) -> PatientProfile:
+        """adapt_block2 с кэшем: ключ — patient_id и размер/mtime всех файлов пациента."""
+        profile = self.get_block2(patient_id, base_path)
+        if profile is None:
+            profile = block2_adapter.adapt_block2(patient_id, base_path)
+            self.put_block2(profile, base_path)
+        return profile
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM profiles")
+        self.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
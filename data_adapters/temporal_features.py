@@ -0,0 +1,190 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_adapters.lab_units import lab_test_key as _test_key, normalize_labs
+
+def _to_days(dates: pd.Series) -> np.ndarray:
+    """Даты ISO-8601 → datetime64[D]; неразборчивые даты → NaT."""
+    parsed = pd.to_datetime(dates, errors="coerce", format="ISO8601")
+    return parsed.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+
+def _day(date: Any) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(date).date(), "D")
+
+def _sorted_groups(frame: pd.DataFrame, keys: list):
+    """
+    Сортирует frame по keys + day (стабильно: при равных датах сохраняется порядок
+    строк в файле). Возвращает отсортированную таблицу и список
+    (ключ-кортеж, начало, конец) непрерывных групп.
+    """
+    frame = frame.sort_values(keys + ["day"], kind="stable", ignore_index=True)
+    groups = []
+    for key, positions in frame.groupby(keys, sort=False).indices.items():
+        key = key if isinstance(key, tuple) else (key,)
+        groups.append((key, positions[0], positions[-1] + 1))
+    return frame, groups
+
+class TemporalIndex:
+    """
+    Индекс лабораторий и визитов по пациентам для запросов по временным окнам.
+
+    Для каждой пары (пациент, тест) хранятся отсортированные по дате массивы
+    дней и значений; для визитов — отсортированные дни (всего и по setting);
+    для строк с флагом lab_units (_issue) — отсортированные дни (всего и по тесту).
+    Любой запрос «в окне [start, end]» — два бинарных поиска (np.searchsorted),
+    то есть O(log n) на запрос независимо от длины истории пациента.
+    """
+
+    def __init__(self):
+        self._labs: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        self._encounters: Dict[Tuple[str, Optional[str]], np.ndarray] = {}
+        self._lab_issues: Dict[Tuple[str, Optional[str]], np.ndarray] = {}
+
+    @classmethod
+    def from_frames(
+        cls,
+        labs: Optional[pd.DataFrame] = None,
+        encounters: Optional[pd.DataFrame] = None
+    ) -> "TemporalIndex":
+        """
+        Строит индекс из «длинных» таблиц (см. Block2Study.frames).
+
+        Args:
+            labs: patient_id, collection_date, test_name, value и необязательная
+                unit — или уже нормализованная таблица (lab_units.normalize_labs:
+                _value, _issue); строки без даты или числа пропускаются
+            encounters: patient_id, encounter_date и необязательная колонка setting
+        """
+        index = cls()
+        if labs is not None and not labs.empty:
+            if "_value" not in labs.columns:
+                labs = normalize_labs(labs)
+            frame = pd.DataFrame({
+                "pid": labs["patient_id"].astype(str).to_numpy(),
+                "test": labs["test_name"].map(_test_key).to_numpy(),
+                "day": _to_days(labs["collection_date"]),
+                "value": labs["_value"].to_numpy(dtype=float),
+            })
+            frame = frame[frame["day"].notna()]
+
+            if "_issue" in labs.columns:
+                flagged = frame[labs["_issue"].notna().to_numpy()[frame.index]]
+                flagged, groups = _sorted_groups(flagged, ["pid"])
+                days, tests = flagged["day"].to_numpy(dtype="datetime64[D]"), flagged["test"].to_numpy()
+                for (pid,), start, end in groups:
+                    index._lab_issues[(pid, None)] = days[start:end]
+                    for test in set(tests[start:end]):
+                        mask = tests[start:end] == test
+                        index._lab_issues[(pid, test)] = days[start:end][mask]
+
+            frame = frame[frame["value"].notna()]
+            frame, groups = _sorted_groups(frame, ["pid", "test"])
+            days, vals = frame["day"].to_numpy(dtype="datetime64[D]"), frame["value"].to_numpy()
+            for (pid, test), start, end in groups:
+                index._labs[(pid, test)] = (days[start:end], vals[start:end])
+
+        if encounters is not None and not encounters.empty:
+            if "setting" in encounters.columns:
+                settings = encounters["setting"].map(_test_key).to_numpy()
+            else:
+                settings = ""
+            frame = pd.DataFrame({
+                "pid": encounters["patient_id"].astype(str).to_numpy(),
+                "setting": settings,
+                "day": _to_days(encounters["encounter_date"]),
+            })
+            frame = frame[frame["day"].notna()]
+            frame, groups = _sorted_groups(frame, ["pid"])
+            days, settings = frame["day"].to_numpy(dtype="datetime64[D]"), frame["setting"].to_numpy()
+            for (pid,), start, end in groups:
+                index._encounters[(pid, None)] = days[start:end]
+                for setting in set(settings[start:end]):
+                    mask = settings[start:end] == setting
+                    index._encounters[(pid, setting)] = days[start:end][mask]
+        return index
+
+    def _window(self, days: np.ndarray, start, end) -> Tuple[int, int]:
+        lo = np.searchsorted(days, start, side="left")
+        hi = np.searchsorted(days, end, side="right")
+        return lo, hi
+
+    def latest(self, patient_id: str, test: str, start, end) -> Optional[float]:
+        """Последнее значение теста в окне [start, end] (включительно) или None."""
+        series = self._labs.get((patient_id, _test_key(test)))
+        if series is None:
+            return None
+        lo, hi = self._window(series[0], start, end)
+        return float(series[1][hi - 1]) if hi > lo else None
+
+    def count(self, patient_id: str, test: str, start, end) -> int:
+        """Число значений теста в окне [start, end]."""
+        series = self._labs.get((patient_id, _test_key(test)))
+        if series is None:
+            return 0
+        lo, hi = self._window(series[0], start, end)
+        return int(hi - lo)
+
+    def encounter_count(self, patient_id: str, start, end, setting: Optional[str] = None) -> int:
+        """Число визитов в окне [start, end], при необходимости только с данным setting."""
+        key = (patient_id, _test_key(setting) if setting is not None else None)
+        days = self._encounters.get(key)
+        if days is None:
+            return 0
+        lo, hi = self._window(days, start, end)
+        return int(hi - lo)
+
+    def panel_complete(self, patient_id: str, tests: Iterable[str], start, end) -> bool:
+        """Есть ли хотя бы одно значение каждого теста панели в окне [start, end]."""
+        return all(self.count(patient_id, test, start, end) > 0 for test in tests)
+
+    def units_standard(self, patient_id: str, start, end, tests: Optional[Iterable[str]] = None) -> bool:
+        """
+        Все анализы в окне [start, end] — числа в стандартных единицах (без флагов
+        lab_units: пересчитанных, неразобранных, без единицы); tests — только эти тесты.
+        """
+        keys = [None] if tests is None else [_test_key(test) for test in tests]
+        for key in keys:
+            days = self._lab_issues.get((patient_id, key))
+            if days is not None:
+                lo, hi = self._window(days, start, end)
+                if hi > lo:
+                    return False
+        return True
+
+def compute_features(
+    index: TemporalIndex,
+    patient_id: str,
+    index_date: Any,
+    specs: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Вычисляет признаки пациента по описаниям из секции features: протокола.
+
+    Окна задаются в днях относительно даты индекса: window: [-60, 0].
+    Без даты индекса все признаки равны None (правила получат статус missing).
+    """
+    if index_date is None or (isinstance(index_date, float) and index_date != index_date):
+        return {name: None for name in specs}
+    day0 = _day(index_date)
+
+    features = {}
+    for name, spec in specs.items():
+        lo, hi = spec["window"]
+        start = day0 + np.timedelta64(int(lo), "D")
+        end = day0 + np.timedelta64(int(hi), "D")
+        kind = spec["kind"]
+        if kind == "latest":
+            features[name] = index.latest(patient_id, spec["test"], start, end)
+        elif kind == "count":
+            features[name] = index.count(patient_id, spec["test"], start, end)
+        elif kind == "encounter_count":
+            features[name] = index.encounter_count(patient_id, start, end, spec.get("setting"))
+        elif kind == "panel_complete":
+            features[name] = index.panel_complete(patient_id, spec["tests"], start, end)
+        elif kind == "units_standard":
+            features[name] = index.units_standard(patient_id, start, end, spec.get("tests"))
+        else:
+            raise ValueError(f"Unsupported feature kind: {kind}")
+    return features
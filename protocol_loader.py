@@ -8,7 +8,44 @@ Original file is located at
 """
 
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+# Виды временных признаков (секция features:) и обязательные ключи каждого вида
+FEATURE_KINDS = {
+    "latest": {"test", "window"},
+    "count": {"test", "window"},
+    "encounter_count": {"window"},
+    "panel_complete": {"tests", "window"},
+    "units_standard": {"window"},
+}
+
+_YAML = None
+
+def _yaml():
+    """(модуль yaml, загрузчик): импорт один раз на процесс; загрузчик на C (libyaml), если есть."""
+    global _YAML
+    if _YAML is None:
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError(
+                "PyYAML is required to load protocol files. "
+                "Install it with: pip install PyYAML"
+            )
+        _YAML = yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return _YAML
+
+def _read_yaml(file_path: str) -> Dict[str, Any]:
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Protocol file not found: {file_path}")
+
+    yaml, loader = _yaml()
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = yaml.load(f, Loader=loader)
+
+    if not isinstance(data, dict):
+        raise ValueError("Invalid YAML: root must be a dictionary")
+    return data
 
 def load_protocol_yaml(file_path: str) -> List[Dict[str, Any]]:
     """
@@ -22,6 +59,19 @@ def load_protocol_yaml(file_path: str) -> List[Dict[str, Any]]:
         operator: "<="
         value: 40
         description: "LVEF ≤ 40%"
+      - id: "R2"
+        type: "inclusion"
+        field: "age"
+        operator: "between"         # также "in": value — список значений
+        value: [18, 75]
+      - id: "R3"
+        type: "inclusion"
+        expr:                       # составное правило: all / any / not из сравнений
+          any:
+            - {field: "nt_probnp", operator: ">=", value: 600}
+            - all:
+                - {field: "nt_probnp", operator: ">=", value: 400}
+                - not: {field: "sglt2_inhibitor", operator: "==", value: true}
 
     Args:
         file_path: путь к YAML-файлу (например, "protocols/dapa_hf.yaml")
@@ -29,22 +79,7 @@ def load_protocol_yaml(file_path: str) -> List[Dict[str, Any]]:
     Returns:
         Список правил в виде словарей.
     """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Protocol file not found: {file_path}")
-
-    try:
-        import yaml
-    except ImportError:
-        raise ImportError(
-            "PyYAML is required to load protocol files. "
-            "Install it with: pip install PyYAML"
-        )
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-
-    if not isinstance(data, dict):
-        raise ValueError("Invalid YAML: root must be a dictionary")
+    data = _read_yaml(file_path)
 
     if "rules" not in data:
         raise ValueError("Invalid protocol: missing 'rules' key")
@@ -57,9 +92,65 @@ def load_protocol_yaml(file_path: str) -> List[Dict[str, Any]]:
     for i, rule in enumerate(rules):
         if not isinstance(rule, dict):
             raise ValueError(f"Rule {i} is not a dictionary")
-        required_keys = {"id", "type", "field", "operator", "value"}
+        required_keys = {"id", "type"} | ({"expr"} if "expr" in rule else {"field", "operator", "value"})
         if not required_keys.issubset(rule.keys()):
             missing = required_keys - rule.keys()
             raise ValueError(f"Rule {rule.get('id', i)} missing keys: {missing}")
+        if "expr" in rule and rule.keys() & {"field", "operator", "value"}:
+            raise ValueError(f"Rule {rule['id']}: expr cannot be combined with field/operator/value")
+
+    return rules
+
+def load_compiled_protocol(file_path: str, selectivity: Optional[Dict[str, Dict[str, float]]] = None):
+    """
+    Загружает протокол из YAML и сразу компилирует его (см. core.rule_engine.compile_protocol).
+
+    Скомпилированный протокол переиспользуется для всех пациентов:
+    операторы, разбиение на inclusion/exclusion и DAG составных правил
+    вычисляются один раз. selectivity — статистика прошлых прогонов
+    (core.rule_engine.selectivity_from_metrics) для порядка проверок.
+    """
+    from core.rule_engine import compile_protocol
+
+    return compile_protocol(load_protocol_yaml(file_path), selectivity)
+
+def load_protocol_meta(file_path: str) -> Dict[str, Any]:
+    """study_id и description протокола (None, если их нет в YAML)."""
+    data = _read_yaml(file_path)
+    return {"study_id": data.get("study_id"), "description": data.get("description")}
+
+def load_protocol_features(file_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Загружает описания временных признаков из секции features: протокола.
+
+    Правила ссылаются на признак по имени в поле field, как на обычное поле профиля.
+    Окно window задаётся в днях относительно даты индекса (границы включительно).
+
+    Ожидаемый формат YAML:
+    features:
+      baseline_ldl:
+        kind: "latest"            # latest | count | encounter_count | panel_complete | units_standard
+        test: "LDL-C"
+        window: [-60, 0]
+
+    Returns:
+        Словарь имя признака → описание (пустой, если секции нет).
+    """
+    features = _read_yaml(file_path).get("features") or {}
+    if not isinstance(features, dict):
+        raise ValueError("'features' must be a mapping of feature name to definition")
+
+    for name, spec in features.items():
+        if not isinstance(spec, dict):
+            raise ValueError(f"Feature {name} is not a dictionary")
+        kind = spec.get("kind")
+        if kind not in FEATURE_KINDS:
+            raise ValueError(f"Feature {name}: unsupported kind {kind!r}")
+        missing = FEATURE_KINDS[kind] - spec.keys()
+        if missing:
+            raise ValueError(f"Feature {name} missing keys: {missing}")
+        window = spec["window"]
+        if not isinstance(window, list) or len(window) != 2:
+            raise ValueError(f"Feature {name}: window must be [start_day, end_day]")
 
-    return rules
\ No newline at end of file
+    return features
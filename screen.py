@@ -0,0 +1,666 @@
+"""
+Пакетный скрининг когорты из командной строки.
+
+Примеры:
+    python screen.py protocols/dapa_hf.yaml data/block1_data.tsv --trial-id NCT03036124 -o dapa_hf.csv
+    python screen.py protocols/w02.yaml "data/Study W02" -o w02.parquet --workers 8
+    python screen.py protocols/dapa_hf.yaml data/block1_data.tsv --trial-id NCT03036124 -o dapa_hf.csv --store results.sqlite
+    python screen.py protocols/w02.yaml "data/Study W02" -o w02.csv --store results.sqlite --delta w02_delta.csv
+    python screen.py protocols/w02.yaml "data/Study W02" -o w02.csv --cohort-store cohorts
+    python screen.py protocols/w02.yaml "data/Study W02" -o w02.csv --selectivity last_run_metrics.json
+    python screen.py protocols/ data/block1_data.tsv -o matrix.csv
+
+Если вместо файла протокола указана папка, пациенты скринируются по всем
+её протоколам сразу (screen_protocols): результат — матрица пациент × протокол.
+
+Источник данных — TSV Block 1 или папка исследования Block 2 (с manifest.csv).
+Пациенты делятся на части и обрабатываются в ProcessPoolExecutor; каждый
+процесс загружает и компилирует протокол один раз. Результаты пишутся в CSV
+или Parquet по мере готовности частей.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from core.instrumentation import METRICS
+from core.rule_engine import evaluate_patient
+from protocol_loader import load_compiled_protocol, load_protocol_features
+
+# === Состояние процесса-исполнителя ===
+_PLAN = None
+_FEATURES = None
+_CACHE = None
+_FIELDS = None
+_EXTRACTOR = None
+_STOP_AT_MISSING = False
+_EXPORT = False
+_IO_THREADS = 1
+
+def _init_worker(
+    protocol_path: str,
+    cache_path: Optional[str] = None,
+    stop_at_missing: bool = False,
+    metrics: bool = False,
+    export: bool = False,
+    io_threads: int = 1,
+    selectivity_path: Optional[str] = None
+) -> None:
+    """
+    Загружает и компилирует протокол один раз на процесс; открывает кэш профилей.
+    Без кэша извлекаются только поля, на которые ссылается протокол
+    (в кэш пишутся полные профили, поэтому с кэшем — все поля; так же и при
+    export — выгрузке профилей в CohortStore).
+    io_threads: сколько файлов Block 2 читать одновременно.
+    selectivity_path: сводка метрик прошлого прогона (--metrics *.json) —
+    порядок проверок в составных правилах.
+    """
+    global _PLAN, _FEATURES, _CACHE, _FIELDS, _EXTRACTOR, _STOP_AT_MISSING, _EXPORT, _IO_THREADS
+    from data_adapters.block1_adapter import Block1Extractor
+
+    if metrics:
+        METRICS.enable()
+
+    _PLAN = load_compiled_protocol(protocol_path, _load_selectivity(selectivity_path))
+    _FEATURES = load_protocol_features(protocol_path)
+    _STOP_AT_MISSING = stop_at_missing
+    _EXPORT = export
+    _IO_THREADS = io_threads
+    if cache_path:
+        from data_adapters.profile_cache import ProfileCache
+
+        _CACHE = ProfileCache(cache_path)
+        _FIELDS = None
+    else:
+        _CACHE = None
+        _FIELDS = None if export else _PLAN.fields
+    _EXTRACTOR = Block1Extractor(_FIELDS)
+
+def _load_selectivity(path: Optional[str]) -> Optional[Dict[str, Dict[str, float]]]:
+    if not path:
+        return None
+    from core.rule_engine import selectivity_from_metrics
+
+    with open(path, encoding="utf-8") as f:
+        return selectivity_from_metrics(json.load(f))
+
+def _result_row(patient_id: str, result: Dict[str, Any], profile: Any = None) -> Dict[str, str]:
+    row = {"patient_id": patient_id, "overall_status": result["overall_status"]}
+    for r in result["rule_results"]:
+        row[r["rule_id"]] = r["status"]
+    if _EXPORT and profile is not None:
+        # Запись для CohortStore; родительский процесс забирает её до записи результатов
+        from core.cohort_store import cohort_record
+
+        row["_cohort"] = cohort_record(patient_id, profile, result)
+    return row
+
+def _screen_block1_chunk(rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    from core.models import BulkProfile
+
+    results = []
+    for row in rows:
+        if _CACHE:
+            # Промах кэша извлекает профиль через adapt_block1 — его время уже
+            # в block1.extract, здесь — вся работа с кэшем
+            with METRICS.timer("block1.cache"):
+                patient = BulkProfile.from_profile(_CACHE.block1(row))
+        else:
+            with METRICS.timer("block1.extract"):
+                if _STOP_AT_MISSING:
+                    # Поля извлекаются по мере проверки правил и только до первого missing
+                    patient = _EXTRACTOR.lazy(row["note"])
+                else:
+                    patient = _EXTRACTOR.extract(row["note"])
+        with METRICS.timer("evaluate"):
+            result = evaluate_patient(patient, _PLAN, stop_at_missing=_STOP_AT_MISSING)
+        results.append(_result_row(str(row["patient_id"]), result, patient))
+    if _CACHE:
+        _CACHE.flush()
+    return results
+
+def _screen_block2_chunk(study_dir: str, file_index: Dict[str, str], manifest) -> List[Dict[str, str]]:
+    """manifest — строки manifest.csv этой части (DataFrame), см. _block2_tasks."""
+    from core.models import BulkProfile
+    from data_adapters.block2_study import load_block2_study, patient_source_paths
+
+    patient_ids = manifest["patient_id"].tolist()
+    profiles = {}
+    if _CACHE:
+        # Ключ кэша — файлы пациента по manifest (имена *_file), как их читает Block2Study
+        source_paths = {
+            record["patient_id"]: patient_source_paths(record, study_dir, file_index)
+            for record in manifest.to_dict("records")
+        }
+        for pid in patient_ids:
+            cached = _CACHE.get_block2(pid, study_dir, source_paths[pid])
+            if cached is not None:
+                profiles[pid] = BulkProfile.from_profile(cached)
+
+    hits = [pid for pid in patient_ids if pid in profiles]
+    misses = [pid for pid in patient_ids if pid not in profiles]
+    studies = []
+    if misses:
+        study = load_block2_study(study_dir, misses, file_index, _FIELDS, io_threads=_IO_THREADS, manifest=manifest)
+        with METRICS.timer("block2_study.profiles"):
+            if _CACHE:
+                # В кэш пишутся проверенные PatientProfile
+                for pid, profile in study.profiles().items():
+                    _CACHE.put_block2(profile, study_dir, source_paths[pid])
+                    profiles[pid] = BulkProfile.from_profile(profile)
+                _CACHE.flush()
+            else:
+                profiles.update(study.bulk_profiles())
+        studies.append(study)
+    if _FEATURES and hits:
+        # Временные признаки не кэшируются: для профилей из кэша читаются
+        # только файлы, нужные признакам (лаборатории и визиты)
+        studies.append(load_block2_study(study_dir, hits, file_index, _FEATURES, io_threads=_IO_THREADS,
+                                         manifest=manifest))
+    if _FEATURES:
+        with METRICS.timer("block2_study.features"):
+            for study in studies:
+                for pid, features in study.features(_FEATURES).items():
+                    if pid in profiles:
+                        profiles[pid].update(features)
+
+    with METRICS.timer("evaluate"):
+        return [
+            _result_row(pid, evaluate_patient(profiles[pid], _PLAN, stop_at_missing=_STOP_AT_MISSING),
+                        profiles[pid])
+            for pid in patient_ids if pid in profiles
+        ]
+
+# === Источники данных ===
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _block1_tasks(path: str, trial_id: Optional[str], chunk_size: int):
+    from data_adapters.block1_source import iter_block1_rows
+
+    # Файл читается потоково: в памяти только части, которые сейчас в работе
+    rows = iter_block1_rows(path, trial_id or None, chunksize=chunk_size, usecols=("patient_id", "note"))
+    for chunk in _chunks(rows, chunk_size):
+        yield _screen_block1_chunk, (chunk,)
+
+def _block2_tasks(study_dir: str, chunk_size: int):
+    from data_adapters.block2_study import TABLE_KINDS, index_study_files, read_manifest
+
+    manifest = read_manifest(study_dir)
+    file_columns = [c for c in manifest.columns if c.endswith("_file")]
+    file_index = index_study_files(study_dir)
+    for start in range(0, len(manifest), chunk_size):
+        # Каждой части — только её строки manifest и её файлы, чтобы не
+        # пересылать весь индекс и не перечитывать manifest.csv в каждой части
+        part = manifest.iloc[start:start + chunk_size].reset_index(drop=True)
+        names = set()
+        for record in part.to_dict("records"):
+            names.update(f"{record['patient_id']}_{kind}.csv" for kind in TABLE_KINDS)
+            names.update(record[c] for c in file_columns if isinstance(record[c], str))
+        chunk_index = {name: file_index[name] for name in names if name in file_index}
+        yield _screen_block2_chunk, (study_dir, chunk_index, part)
+
+# === Запись результатов ===
+class _CsvSink:
+    def __init__(self, path: str, columns: List[str]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, rows: List[Dict[str, str]]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+class _ParquetSink:
+    def __init__(self, path: str, columns: List[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "pyarrow is required to write Parquet output. "
+                "Install it with: pip install pyarrow"
+            )
+        self._pa = pa
+        self._columns = columns
+        self._schema = pa.schema([(c, pa.string()) for c in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: List[Dict[str, str]]) -> None:
+        data = {c: [row.get(c) for row in rows] for c in self._columns}
+        self._writer.write_table(self._pa.Table.from_pydict(data, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+def _open_sink(path: str, fmt: Optional[str], columns: List[str]):
+    fmt = fmt or ("parquet" if path.endswith((".parquet", ".pq")) else "csv")
+    if fmt == "parquet":
+        return _ParquetSink(path, columns)
+    return _CsvSink(path, columns)
+
+# === Инкрементальный режим: результаты в ResultStore ===
+def _store_scope(protocol_path: str, source: str, trial_id: Optional[str]) -> str:
+    """Область хранилища: источник, исследование, имя протокола и его features:."""
+    features = json.dumps(load_protocol_features(protocol_path), sort_keys=True)
+    spec = hashlib.sha256(features.encode("utf-8")).hexdigest()[:12]
+    return f"{os.path.abspath(source)}|{trial_id or ''}|{os.path.basename(protocol_path)}|{spec}"
+
+def _block2_changes(
+    protocol_path: str,
+    source: str,
+    stored: Dict[str, Optional[str]],
+    io_threads: int = 1
+):
+    """
+    Block 2: отпечатки всех пациентов по размеру/mtime файлов и профили только
+    тех, у кого отпечаток не совпал с сохранённым.
+    """
+    from data_adapters.block2_study import index_study_files, load_block2_study, patient_fingerprints
+
+    file_index = index_study_files(source)
+    current = patient_fingerprints(source, file_index)
+    changed = [pid for pid, fp in current.items() if stored.get(pid) != fp]
+    if not changed:
+        return {}, current
+
+    study = load_block2_study(source, changed, file_index, io_threads=io_threads)
+    profiles = study.bulk_profiles()
+    for pid, features in study.features(load_protocol_features(protocol_path)).items():
+        profiles[pid].update(features)
+    return {pid: profile.to_dict() for pid, profile in profiles.items()}, current
+
+def _block1_changes(source: str, trial_id: Optional[str], stored: Dict[str, Optional[str]]):
+    """Block 1: отпечаток — хэш текста заметки; извлекаются только новые и изменённые строки."""
+    from data_adapters.block1_adapter import adapt_block1
+    from data_adapters.block1_source import iter_block1_rows
+    from data_adapters.profile_cache import block1_fingerprint
+
+    profiles, current = {}, {}
+    for row in iter_block1_rows(source, trial_id or None, usecols=("patient_id", "note")):
+        pid = str(row["patient_id"])
+        current[pid] = block1_fingerprint(row)
+        if stored.get(pid) != current[pid]:
+            profiles[pid] = adapt_block1(row).model_dump()
+    return profiles, current
+
+def screen_incremental(
+    protocol_path: str,
+    source: str,
+    store_path: str,
+    trial_id: Optional[str] = None,
+    refresh: bool = False,
+    io_threads: int = 1,
+) -> Dict[str, Any]:
+    """
+    Скрининг с сохранением профилей и статусов правил в ResultStore.
+
+    Извлекаются только пациенты, чьи исходные данные изменились (Block 2 —
+    размер/mtime файлов и строка manifest, Block 1 — хэш заметки; в отпечаток
+    входит EXTRACTOR_VERSION адаптера); оцениваются
+    только их правила и правила, добавленные или изменённые в протоколе.
+    refresh=True извлекает и оценивает всех заново.
+
+    Returns:
+        результат ResultStore.screen (results, evaluated, changed) плюс
+        extracted — число извлечённых профилей и removed — выбывшие пациенты
+        (patient_id → последний overall_status)
+    """
+    from core.result_store import ResultStore
+
+    store = ResultStore(store_path)
+    try:
+        scope = _store_scope(protocol_path, source, trial_id)
+        if refresh:
+            store.clear(scope)
+        stored = store.fingerprints(scope)
+        if os.path.isdir(source):
+            profiles, current = _block2_changes(protocol_path, source, stored, io_threads)
+        else:
+            profiles, current = _block1_changes(source, trial_id, stored)
+
+        previous = store.overall_statuses(scope)
+        removed = {pid: previous.get(pid) for pid in stored if pid not in current}
+        store.remove_patients(scope, removed)
+        store.put_profiles(scope, profiles, current)
+        update = store.screen(scope, load_compiled_protocol(protocol_path))
+        update["extracted"] = len(profiles)
+        update["removed"] = removed
+        return update
+    finally:
+        store.close()
+
+# === Запуск ===
+def _run_chunk(fn, args):
+    """Часть в процессе-исполнителе: строки результатов и метрики, накопленные с прошлой части."""
+    rows = fn(*args)
+    return rows, (METRICS.drain() if METRICS.enabled else None)
+
+def _collect(future) -> List[Dict[str, str]]:
+    rows, metrics = future.result()
+    if metrics:
+        METRICS.merge(metrics)
+    return rows
+
+def _run_tasks(
+    tasks,
+    protocol_path: str,
+    workers: int,
+    cache_path: Optional[str] = None,
+    stop_at_missing: bool = False,
+    metrics: bool = False,
+    export: bool = False,
+    io_threads: int = 1,
+    selectivity_path: Optional[str] = None
+) -> Iterator[List[Dict[str, str]]]:
+    """
+    Выполняет части и отдаёт результаты по мере готовности.
+    Одновременно в работе не больше 2 × workers частей, чтобы не держать
+    в памяти весь источник.
+    """
+    if workers <= 1:
+        _init_worker(protocol_path, cache_path, stop_at_missing, metrics, export, io_threads, selectivity_path)
+        for fn, args in tasks:
+            yield fn(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(protocol_path, cache_path, stop_at_missing, metrics, export, io_threads,
+                                       selectivity_path)) as pool:
+        pending = set()
+        for fn, args in tasks:
+            pending.add(pool.submit(_run_chunk, fn, args))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _collect(future)
+        for future in pending:
+            yield _collect(future)
+
+def _write_delta(path: str, update: Dict[str, Any]) -> None:
+    """Отчёт об изменениях: previous_status пуст у новых пациентов, overall_status — у выбывших."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["patient_id", "previous_status", "overall_status"])
+        for pid, (previous, current) in update["changed"].items():
+            writer.writerow([pid, previous or "", current])
+        for pid, previous in update["removed"].items():
+            writer.writerow([pid, previous or "", ""])
+
+def _output_columns(plan) -> List[str]:
+    return ["patient_id", "overall_status"] + list(dict.fromkeys(c[0] for c in plan.checks))
+
+def _cohort_partition(protocol_path: str, source: str, trial_id: Optional[str]):
+    """Раздел CohortStore по умолчанию: (имя папки исследования или trial_id / имя файла, имя протокола)."""
+    if os.path.isdir(source):
+        study = os.path.basename(os.path.normpath(source))
+    else:
+        study = trial_id or os.path.splitext(os.path.basename(source))[0]
+    return study, os.path.splitext(os.path.basename(protocol_path))[0]
+
+def screen(
+    protocol_path: str,
+    source: str,
+    output_path: str,
+    trial_id: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 500,
+    output_format: Optional[str] = None,
+    cache_path: Optional[str] = None,
+    stop_at_missing: bool = False,
+    metrics_path: Optional[str] = None,
+    cohort_store: Optional[str] = None,
+    study: Optional[str] = None,
+    io_threads: int = 1,
+    selectivity_path: Optional[str] = None,
+) -> Counter:
+    """
+    Скринирует всех пациентов источника и пишет результаты в output_path.
+    С cache_path профили берутся из ProfileCache, если исходные данные не менялись.
+    stop_at_missing: оценка пациента останавливается на первом правиле со статусом
+    missing (итог уже "not enough information"), остальные правила (и их поля)
+    не проверяются, их колонки пусты — см. evaluate_patient.
+    metrics_path: включить метрики (core.instrumentation) на время запуска и
+    записать сводку — JSON или формат Prometheus для *.prom.
+    cohort_store: корень CohortStore — профили (все поля) и статусы правил
+    пишутся ещё и в раздел (study, имя протокола); study по умолчанию — имя
+    папки исследования Block 2 или trial_id / имя файла Block 1. Несовместим
+    с stop_at_missing: в раздел попали бы непрочитанные поля и непроверенные правила.
+    io_threads: сколько файлов Block 2 каждый процесс читает одновременно
+    (на сетевом хранилище чтение — в основном ожидание, см. block2_ingest).
+    selectivity_path: JSON-сводка метрик прошлого прогона; по долям статусов
+    узлов составных правил упорядочиваются их проверки (результат тот же).
+
+    Returns:
+        Counter итоговых статусов.
+    """
+    if stop_at_missing and cohort_store:
+        raise ValueError(
+            "stop_at_missing cannot be combined with cohort_store: the partition needs every field and rule"
+        )
+    plan = load_compiled_protocol(protocol_path)
+    columns = _output_columns(plan)
+
+    if os.path.isdir(source):
+        tasks = _block2_tasks(source, chunk_size)
+    else:
+        tasks = _block1_tasks(source, trial_id, chunk_size)
+
+    was_enabled = METRICS.enabled
+    if metrics_path:
+        METRICS.reset()
+        METRICS.enable()
+    cohort = None
+    if cohort_store:
+        from core.cohort_store import CohortStore
+
+        default_study, protocol_name = _cohort_partition(protocol_path, source, trial_id)
+        cohort = CohortStore(cohort_store).writer(
+            study or default_study, protocol_name, plan, load_protocol_features(protocol_path)
+        )
+    counts = Counter()
+    sink = _open_sink(output_path, output_format, columns)
+    completed = False
+    try:
+        with METRICS.timer("screen.total"):
+            for rows in _run_tasks(tasks, protocol_path, workers or os.cpu_count() or 1, cache_path,
+                                   stop_at_missing, bool(metrics_path), cohort is not None, io_threads,
+                                   selectivity_path):
+                with METRICS.timer("screen.write"):
+                    if cohort is not None:
+                        cohort.append([row.pop("_cohort") for row in rows])
+                    sink.write(rows)
+                counts.update(row["overall_status"] for row in rows)
+        completed = True
+    finally:
+        sink.close()
+        if cohort is not None:
+            # Раздел заменяется только после полного прогона
+            if completed:
+                cohort.close()
+            else:
+                cohort.abort()
+        if metrics_path:
+            METRICS.write(metrics_path)
+            METRICS.enabled = was_enabled
+    return counts
+
+# === Все протоколы папки за один проход ===
+def screen_protocols(
+    protocols_dir: str,
+    source: str,
+    output_path: str,
+    trial_id: Optional[str] = None,
+    chunk_size: int = 500,
+    output_format: Optional[str] = None,
+    io_threads: int = 1,
+) -> Dict[str, Counter]:
+    """
+    Каждый пациент извлекается один раз (поля всех протоколов) и оценивается
+    по всем протоколам папки через core.multi_protocol.MultiProtocol.
+    В output_path — матрица: patient_id и по колонке итогового статуса на протокол.
+    Работает в одном процессе (без --workers, --metrics и --selectivity, см. main).
+
+    Returns:
+        протокол → Counter итоговых статусов.
+    """
+    from core.models import BulkProfile
+    from core.multi_protocol import load_protocols
+
+    multi = load_protocols(protocols_dir)
+    counts = {name: Counter() for name in multi.names}
+    sink = _open_sink(output_path, output_format, ["patient_id"] + multi.names)
+
+    def write(rows: List[Dict[str, str]]) -> None:
+        sink.write(rows)
+        for row in rows:
+            for name in multi.names:
+                counts[name][row[name]] += 1
+
+    try:
+        if os.path.isdir(source):
+            from data_adapters.block2_study import index_study_files, load_block2_study, read_manifest
+
+            file_index = index_study_files(source)
+            manifest = read_manifest(source)
+            for start in range(0, len(manifest), chunk_size):
+                part = manifest.iloc[start:start + chunk_size]
+                study = load_block2_study(source, None, file_index, multi.fields, io_threads=io_threads,
+                                          manifest=part)
+                profiles = study.bulk_profiles()
+                for pid, features in study.features(multi.features).items():
+                    profiles[pid].update(features)
+                write([{"patient_id": pid, **multi.overall(p)} for pid, p in profiles.items()])
+        else:
+            from data_adapters.block1_adapter import Block1Extractor
+            from data_adapters.block1_source import iter_block1_rows
+
+            extractor = Block1Extractor(multi.fields)
+            rows = iter_block1_rows(source, trial_id or None, chunksize=chunk_size, usecols=("patient_id", "note"))
+            for chunk in _chunks(rows, chunk_size):
+                write([
+                    {"patient_id": str(row["patient_id"]),
+                     **multi.overall(BulkProfile(str(row["patient_id"]), **extractor.extract(row["note"])))}
+                    for row in chunk
+                ])
+    finally:
+        sink.close()
+    return counts
+
+def _given(args: argparse.Namespace, flags: Iterable[str]) -> List[str]:
+    """Флаги из flags, заданные в командной строке (значение не None и не False)."""
+    return [flag for flag in flags if getattr(args, flag.lstrip("-").replace("-", "_")) not in (None, False)]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch eligibility screening (EnrollOrNot)")
+    parser.add_argument("protocol", help="protocol YAML, e.g. protocols/dapa_hf.yaml, "
+                                         "or a directory to screen against all its protocols")
+    parser.add_argument("source", help="Block 1 TSV file or Block 2 study directory")
+    parser.add_argument("-o", "--output", required=True, help="output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="output format (default: by extension)")
+    parser.add_argument("--trial-id", help="Block 1 only: screen rows of this trial_id")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="patients per task (default: 500)")
+    parser.add_argument("--cache", help="SQLite profile cache; unchanged patients skip extraction")
+    parser.add_argument("--stop-at-missing", action="store_true",
+                        help="stop at the first rule with missing data (its result is already "
+                             "not enough information); later rule columns are left blank")
+    parser.add_argument("--metrics", help="write stage timings and counters (.json, or .prom for Prometheus)")
+    parser.add_argument("--store", help="SQLite result store; only added or changed rules are re-evaluated")
+    parser.add_argument("--refresh", action="store_true", help="with --store: re-extract all profiles")
+    parser.add_argument("--delta", help="with --store: CSV of patients whose overall_status changed")
+    parser.add_argument("--cohort-store",
+                        help="also write profiles and rule statuses to this Parquet cohort store directory")
+    parser.add_argument("--study", help="with --cohort-store: study partition name (default: from source)")
+    parser.add_argument("--io-threads", type=int, default=1,
+                        help="Block 2: files read concurrently per process (helps on network storage)")
+    parser.add_argument("--selectivity",
+                        help="metrics JSON of a previous --metrics run; orders checks in compound rules")
+    args = parser.parse_args(argv)
+
+    # Флаги, которые без своего основного флага ничего не делают
+    for dependent, required in ((("--refresh", "--delta"), "--store"), (("--study",), "--cohort-store")):
+        orphaned = _given(args, dependent) if not _given(args, (required,)) else []
+        if orphaned:
+            parser.error(f"{', '.join(orphaned)} require {required}")
+
+    if os.path.isdir(args.protocol):
+        # screen_protocols работает в одном процессе и без метрик
+        unsupported = _given(args, ("--store", "--cache", "--cohort-store", "--stop-at-missing", "--workers",
+                                    "--metrics", "--selectivity"))
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} need a single protocol file")
+        counts = screen_protocols(args.protocol, args.source, args.output, trial_id=args.trial_id,
+                                  chunk_size=args.chunk_size or 500, output_format=args.format,
+                                  io_threads=args.io_threads)
+        for name, protocol_counts in counts.items():
+            summary = ", ".join(f"{status}: {n}" for status, n in sorted(protocol_counts.items()))
+            print(f"{name}: {summary}", file=sys.stderr)
+        print(f"→ {args.output}", file=sys.stderr)
+        return 0
+
+    if args.stop_at_missing and args.cohort_store:
+        # С stop_at_missing поля и статусы правил после остановки не вычисляются
+        parser.error("--stop-at-missing cannot be used with --cohort-store")
+
+    if args.store:
+        unsupported = _given(args, ("--workers", "--chunk-size", "--cache", "--stop-at-missing", "--metrics",
+                                    "--cohort-store", "--selectivity"))
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with --store")
+        update = screen_incremental(args.protocol, args.source, args.store,
+                                    trial_id=args.trial_id, refresh=args.refresh, io_threads=args.io_threads)
+        rows = [_result_row(pid, result) for pid, result in update["results"].items()]
+        sink = _open_sink(args.output, args.format, _output_columns(load_compiled_protocol(args.protocol)))
+        try:
+            sink.write(rows)
+        finally:
+            sink.close()
+        if args.delta:
+            _write_delta(args.delta, update)
+        print(
+            f"Screened {len(rows)} patients ({update['extracted']} re-extracted, "
+            f"{update['evaluated']} rule evaluations, {len(update['changed'])} status changes) → {args.output}",
+            file=sys.stderr,
+        )
+        return 0
+
+    counts = screen(
+        args.protocol,
+        args.source,
+        args.output,
+        trial_id=args.trial_id,
+        workers=args.workers,
+        chunk_size=args.chunk_size or 500,
+        output_format=args.format,
+        cache_path=args.cache,
+        stop_at_missing=args.stop_at_missing,
+        metrics_path=args.metrics,
+        cohort_store=args.cohort_store,
+        study=args.study,
+        io_threads=args.io_threads,
+        selectivity_path=args.selectivity,
+    )
+    total = sum(counts.values())
+    summary = ", ".join(f"{status}: {n}" for status, n in sorted(counts.items()))
+    print(f"Screened {total} patients ({summary}) → {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
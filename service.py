@@ -0,0 +1,259 @@
+"""
+HTTP/JSON-сервис скрининга: протоколы скомпилированы и держатся в памяти.
+
+Примеры:
+    python service.py --port 8080
+    curl localhost:8080/protocols
+    curl -X POST localhost:8080/protocols/dapa_hf/screen -d '{"patient_id": "P1", "age": 64, "lvef": 35}'
+    curl -X POST localhost:8080/protocols/dapa_hf/screen -d '[{"age": 64}, {"age": 70, "lvef": 30}]'
+
+Эндпоинты:
+    GET  /health                    {"status": "ok"}
+    GET  /protocols                 загруженные протоколы (имя = имя файла без .yaml)
+    POST /protocols/<имя>/screen    профиль → результат evaluate_patient;
+                                    список профилей (или {"profiles": [...]}) → список результатов
+    GET  /metrics                   метрики в формате Prometheus (с флагом --metrics)
+
+Параметр ?stop_at_missing=1 — как у evaluate_patient. Если в профиле есть
+patient_id, он возвращается в результате. Изменённые YAML-файлы
+перечитываются при следующем запросе (проверка mtime не чаще раза в
+--reload-interval секунд); при ошибке в файле остаётся прежняя версия.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from core.instrumentation import METRICS
+from core.rule_engine import CompiledProtocol, evaluate_patient
+from protocol_loader import load_compiled_protocol, load_protocol_meta
+
+# === Реестр протоколов ===
+class _Entry:
+    __slots__ = ("path", "stamp", "plan", "meta", "error", "checked")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stamp = None
+        self.plan: Optional[CompiledProtocol] = None
+        self.meta: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.checked = 0.0
+
+class ProtocolRegistry:
+    """
+    Скомпилированные протоколы папки (protocols/*.yaml) с перезагрузкой по mtime.
+
+    get(name) возвращает CompiledProtocol; файл проверяется (os.stat) не чаще
+    раза в reload_interval секунд и перекомпилируется, только если изменились
+    его размер или mtime. Новые файлы подхватываются при обращении к ним,
+    удалённые — исчезают из реестра.
+    """
+
+    def __init__(self, directory: str = "protocols", reload_interval: float = 1.0):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.yaml")
+
+    def refresh(self) -> None:
+        """Перечитывает список файлов и все изменённые протоколы."""
+        names = sorted(f[:-len(".yaml")] for f in os.listdir(self.directory) if f.endswith(".yaml"))
+        with self._lock:
+            for name in set(self._entries) - set(names):
+                del self._entries[name]
+        for name in names:
+            self._check(name, force=True)
+
+    def _check(self, name: str, force: bool = False) -> Optional[_Entry]:
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and not force and now - entry.checked < self.reload_interval:
+            return entry
+        with self._lock:
+            entry = self._entries.get(name)
+            path = self._path(name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self._entries.pop(name, None)
+                return None
+            if entry is None:
+                entry = self._entries[name] = _Entry(path)
+            entry.checked = now
+            stamp = (st.st_mtime_ns, st.st_size)
+            if stamp != entry.stamp:
+                entry.stamp = stamp
+                try:
+                    plan = load_compiled_protocol(path)
+                    meta = load_protocol_meta(path)
+                except Exception as e:
+                    # Прежняя (рабочая) версия остаётся в силе
+                    entry.error = f"{type(e).__name__}: {e}"
+                else:
+                    entry.plan, entry.error = plan, None
+                    entry.meta = {
+                        **meta,
+                        "rules": len(plan.rules),
+                        "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    }
+            return entry
+
+    def get(self, name: str) -> Optional[CompiledProtocol]:
+        entry = self._check(name)
+        return entry.plan if entry is not None else None
+
+    def describe(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        return [
+            {"name": name, **entry.meta, **({"error": entry.error} if entry.error else {})}
+            for name, entry in sorted(self._entries.items())
+        ]
+
+# === Оценка ===
+def screen_profiles(plan: CompiledProtocol, payload: Any, stop_at_missing: bool = False) -> Any:
+    """
+    Профиль (словарь) → результат; список профилей или {"profiles": [...]} → список
+    результатов. patient_id профиля, если есть, копируется в результат.
+    """
+    batch = payload.get("profiles") if isinstance(payload, dict) and "profiles" in payload else payload
+    single = isinstance(batch, dict)
+    profiles = [batch] if single else batch
+    if not isinstance(profiles, list) or not all(isinstance(p, dict) for p in profiles):
+        raise ValueError("Request body must be a profile object, a list of profiles or {\"profiles\": [...]}")
+
+    results = []
+    with METRICS.timer("service.evaluate"):
+        for profile in profiles:
+            result = evaluate_patient(profile, plan, stop_at_missing=stop_at_missing)
+            if "patient_id" in profile:
+                result = {"patient_id": profile["patient_id"], **result}
+            results.append(result)
+    if METRICS.enabled:
+        METRICS.incr("service_patients_total", len(results))
+    return results[0] if single else results
+
+# === HTTP ===
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive: клиент EHR-интеграции переиспользует соединение; без Nagle
+    # заголовки и тело ответа не ждут delayed ACK клиента (~40 мс на запрос)
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    registry: ProtocolRegistry = None
+    quiet = True
+
+    def _send(self, status: int, body: Any, content_type: str = "application/json") -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, {"error": message})
+
+    def _route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        parts = urlsplit(self.path)
+        return [p for p in parts.path.split("/") if p], parse_qs(parts.query)
+
+    def do_GET(self) -> None:
+        path, _ = self._route()
+        if path == ["health"]:
+            self._send(200, {"status": "ok"})
+        elif path == ["protocols"]:
+            self._send(200, self.registry.describe())
+        elif path == ["metrics"] and METRICS.enabled:
+            self._send(200, METRICS.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._error(404, f"Not found: {self.path}")
+
+    def do_POST(self) -> None:
+        path, query = self._route()
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            # Где кончается тело, неизвестно — соединение дальше не используется
+            self.close_connection = True
+            self._error(400, f"Invalid Content-Length: {self.headers.get('Content-Length')}")
+            return
+        body = self.rfile.read(length)
+        if len(path) != 3 or path[0] != "protocols" or path[2] != "screen":
+            self._error(404, f"Not found: {self.path}")
+            return
+        plan = self.registry.get(path[1])
+        if plan is None:
+            self._error(404, f"Unknown protocol: {path[1]}")
+            return
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as e:
+            self._error(400, f"Invalid JSON: {e}")
+            return
+        stop_at_missing = query.get("stop_at_missing", ["0"])[0].lower() in ("1", "true", "yes")
+        try:
+            with METRICS.timer("service.request"):
+                result = screen_profiles(plan, payload, stop_at_missing)
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        self._send(200, result)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    protocols_dir: str = "protocols",
+    reload_interval: float = 1.0,
+    quiet: bool = True
+) -> ThreadingHTTPServer:
+    """Сервер с собственным реестром протоколов (port=0 — свободный порт)."""
+    handler = type("Handler", (_Handler,), {
+        "registry": ProtocolRegistry(protocols_dir, reload_interval),
+        "quiet": quiet,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EnrollOrNot screening service (HTTP/JSON)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--protocols", default="protocols", help="directory with protocol YAML files")
+    parser.add_argument("--reload-interval", type=float, default=1.0,
+                        help="seconds between checks of a protocol file for changes")
+    parser.add_argument("--metrics", action="store_true", help="collect metrics and serve them at /metrics")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        METRICS.enable()
+    server = make_server(args.host, args.port, args.protocols, args.reload_interval, quiet=not args.verbose)
+    names = ", ".join(entry["name"] for entry in server.RequestHandlerClass.registry.describe())
+    print(f"Serving {names} on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
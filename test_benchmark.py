@@ -0,0 +1,30 @@
+import sys
+
+from benchmark import _run_stage, make_block1_cohort, make_block2_cohort
+from data_adapters.block1_source import iter_block1_rows
+from data_adapters.block2_study import load_block2_study
+
+def test_synthetic_cohorts(tmp_path):
+    rows = list(iter_block1_rows(make_block1_cohort(120, str(tmp_path))))
+    assert len({row["patient_id"] for row in rows}) == 120
+
+    study = load_block2_study(make_block2_cohort(45, str(tmp_path)))
+    profiles = study.profiles()
+    assert len(profiles) == 45
+    assert all(profile.egfr is not None for profile in profiles.values())
+
+def test_stage_report(tmp_path):
+    result = _run_stage("adapt_block1", 50, str(tmp_path), workers=1)
+    assert result["stage"] == "adapt_block1" and result["patients"] == 50
+    assert result["p50_ms"] <= result["p99_ms"]
+    rss = result["max_process_rss_mb"]
+    assert rss is None if sys.platform == "win32" else rss > 0
+
+def test_cold_start_avoids_heavy_imports():
+    from benchmark import measure_cold_start
+
+    results = {r["target"]: r for r in measure_cold_start(["screen_block1_worker", "adapt_block2"], repeat=1)}
+    # Исполнитель Block 1 работает с BulkProfile: ни pandas, ни pydantic
+    assert not {"pandas", "pydantic"} & set(results["screen_block1_worker"]["heavy_modules"])
+    assert "pandas" not in results["adapt_block2"]["heavy_modules"]
+    assert all(r["seconds"] > 0 for r in results.values())
@@ -1,27 +1,13 @@
-import pandas as pd
 from data_adapters.block1_adapter import adapt_block1
+from data_adapters.block1_source import BLOCK1_PATH, iter_block1_rows, sniff_encoding
 
-# Попытка загрузить с разными кодировками
-encodings = ["utf-8", "cp1252", "windows-1251"]
-df = None
-used_encoding = None
+# Кодировка определяется один раз по началу файла, файл читается частями
+used_encoding = sniff_encoding(BLOCK1_PATH)
+total = sum(1 for _ in iter_block1_rows(BLOCK1_PATH, usecols=("patient_id",), encoding=used_encoding))
 
-for enc in encodings:
-    try:
-        df = pd.read_csv("data/block1_data.tsv", sep="\t", encoding=enc)
-        used_encoding = enc
-        break
-    except UnicodeDecodeError:
-        continue
+print(f" TSV загружен (кодировка: {used_encoding}). Всего пациентов:", total)
 
-if df is None:
-    print("Не удалось загрузить файл ни с одной из кодировок:", encodings)
-    exit()
-
-print(f" TSV загружен (кодировка: {used_encoding}). Всего пациентов:", len(df))
-
-# Дальше — тот же код...
-first_row = df.iloc[0].to_dict()
+first_row = next(iter_block1_rows(BLOCK1_PATH, encoding=used_encoding))
 
 print("\n=== Первый пациент ===")
 print("patient_id:", first_row.get("patient_id"))
@@ -41,4 +27,4 @@ try:
     print("bp_diastolic:", profile.bp_diastolic)
 except Exception as e:
     print(" Ошибка в адаптере:", e)
-    raise
\ No newline at end of file
+    raise
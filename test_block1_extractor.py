@@ -0,0 +1,47 @@
+import pandas as pd
+from data_adapters import block1_adapter as b1
+
+def test_extractor_matches_field_functions():
+    df = pd.read_csv("data/block1_data.tsv", sep="\t", encoding="cp1252")
+    extractor = b1.Block1Extractor()
+    notes = list(df["note"]) + [
+        "NYHA class ii, 120/80 mmHg, no history of type 1 diabetes, on dapagliflozin",
+        "Never received canagliflozin; ARNI and MRA; HF at rest",
+    ]
+    for note in notes:
+        fields = extractor.extract(note)
+        assert fields == {
+            "age": b1.extract_age(note),
+            "gender": b1.extract_gender(note),
+            "lvef": b1.extract_lvef(note),
+            "nt_probnp": b1.extract_nt_probnp(note),
+            "egfr": b1.extract_egfr(note),
+            "nyha_class": b1.extract_nyha_class(note),
+            "gdmtd_hf_therapy": b1.extract_gdmtd_therapy(note),
+            "sglt2_inhibitor": b1.extract_sglt2_inhibitor(note),
+            "type1_diabetes": b1.extract_type1_diabetes(note),
+            "bp_systolic": b1.extract_systolic_bp(note),
+            "bp_diastolic": b1.extract_diastolic_bp(note),
+            "congestive_hf": b1.extract_congestive_hf(note),
+            "unstable_angina": b1.extract_unstable_angina(note),
+            "calcium_channel_blocker": b1.extract_calcium_channel_blocker(note),
+            "sbp": b1.extract_sbp(note),
+        }
+
+def test_extractor_limited_to_protocol_fields():
+    from protocol_loader import load_compiled_protocol
+
+    plan = load_compiled_protocol("protocols/dapa_hf.yaml")
+    df = pd.read_csv("data/block1_data.tsv", sep="\t", encoding="cp1252")
+    full = b1.Block1Extractor()
+    limited = b1.Block1Extractor(plan.fields)
+    assert set(limited.fields) == plan.fields & set(b1.BLOCK1_FIELDS)
+    assert "calcium_channel_blocker" not in limited.fields
+
+    for note in df["note"]:
+        expected = {f: v for f, v in full.extract(note).items() if f in plan.fields}
+        assert limited.extract(note) == expected
+        lazy = limited.lazy(note)
+        assert lazy.get("lvef") == expected["lvef"]
+        assert lazy.to_dict() == {"lvef": expected["lvef"]}
+        assert lazy.get("calcium_channel_blocker") is None
@@ -0,0 +1,45 @@
+from data_adapters.block1_source import iter_block1_rows, sniff_encoding
+
+def test_sniff_encoding(tmp_path):
+    utf8 = tmp_path / "utf8.tsv"
+    utf8.write_bytes("patient_id\tnote\ttrial_id\np1\tBP 118/72 mmHg — ok\tT1\n".encode("utf-8"))
+    # Префикс обрывается посреди многобайтного «—»: это всё ещё utf-8
+    cut = utf8.read_bytes().index("—".encode("utf-8")) + 1
+    assert sniff_encoding(str(utf8), prefix_size=cut) == "utf-8"
+    assert sniff_encoding("data/block1_data.tsv") == "cp1252"
+
+def test_cp1252_bytes_after_ascii_prefix(tmp_path):
+    path = tmp_path / "late.tsv"
+    path.write_bytes(b"patient_id\tnote\n" + b"p1\tok\n" * 1000 + b"p2\tBP 120\x96130, caf\xe9\n")
+    # Префикс — чистый ASCII, поэтому выбрана utf-8; байты cp1252 дальше не обрывают чтение
+    assert sniff_encoding(str(path), prefix_size=1024) == "utf-8"
+    rows = list(iter_block1_rows(str(path), chunksize=100, encoding="utf-8"))
+    assert len(rows) == 1001
+    assert rows[-1]["note"] == "BP 120–130, café"
+
+def test_trial_filter_and_columns():
+    rows = list(iter_block1_rows(trial_id="NCT03036124", chunksize=7, usecols=("patient_id", "note")))
+    assert len(rows) == 55
+    assert set(rows[0]) == {"patient_id", "note", "trial_id"}
+
+def test_dataset_interns_trial_criteria():
+    import pandas as pd
+    from data_adapters.block1_source import load_block1_dataset
+
+    dataset = load_block1_dataset(chunksize=17)
+    df = pd.read_csv("data/block1_data.tsv", sep="\t", encoding="cp1252")
+    assert len(dataset) == len(df)
+    assert len(dataset.trials) < 10
+    assert "trial_inclusion" not in dataset.patients.columns
+    original = df.iloc[42].to_dict()
+    assert dataset.row(original["patient_id"]) == original
+    assert dataset.trial(original["trial_id"])["trial_inclusion"] == original["trial_inclusion"]
+    assert len(list(dataset.rows("NCT03036124"))) == 55
+
+def test_import_does_not_load_pydantic():
+    import subprocess
+    import sys
+
+    code = "import sys, data_adapters.block1_source; print('pydantic' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "False"
@@ -0,0 +1,41 @@
+from data_adapters.block2_adapter import adapt_block2
+from data_adapters.block2_ingest import iter_block2_profiles, prefetch_patient_files
+from data_adapters.block2_study import load_block2_study
+
+def test_prefetched_profiles_match_adapt_block2():
+    for study_dir in ["data/Study W01", "data/Study W02"]:
+        base_paths = load_block2_study(study_dir).base_paths
+        # Очередь меньше числа пациентов: порядок сохраняется, чтение идёт с опережением
+        profiles = list(iter_block2_profiles(study_dir, concurrency=4, max_pending=3))
+        assert [p.patient_id for p in profiles] == list(base_paths)
+        for profile in profiles:
+            assert profile == adapt_block2(profile.patient_id, base_paths[profile.patient_id])
+
+def test_prefetch_reads_only_files_for_fields():
+    base_paths = load_block2_study("data/Study W01").base_paths
+    pid = next(iter(base_paths))
+    _, _, frames = next(prefetch_patient_files([(pid, base_paths[pid])], fields=["uacr"]))
+    assert set(frames) == {"urinalysis"}
+
+def test_threaded_study_load_matches_serial():
+    serial = load_block2_study("data/Study W02")
+    threaded = load_block2_study("data/Study W02", io_threads=8)
+    assert threaded.profiles() == serial.profiles()
+    assert threaded.frames["encounters"].equals(serial.frames["encounters"])
+
+def test_source_table_reads_like_pandas(tmp_path):
+    import pandas as pd
+
+    from data_adapters.block2_adapter import read_source_table
+
+    path = tmp_path / "P1_renal_labs.csv"
+    path.write_text('\ufefftest_name,value,unit\neGFR,NA,mL/min\n\n"HbA1c, %",7.1\neGFR,45,mL/min\n', encoding="utf-8")
+    table = read_source_table(str(path))
+    df = pd.read_csv(path)
+    assert table.columns == list(df.columns)
+    assert len(table.rows) == len(df)
+    assert table.column("value") == [None, "7.1", "45"]
+    assert table.column("unit") == [None if pd.isna(v) else v for v in df["unit"]]
+
+    profile = adapt_block2("P1", str(tmp_path), fields=["egfr", "hba1c"])
+    assert profile.egfr == 45.0 and profile.hba1c == 7.1
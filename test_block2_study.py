@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+import pytest
+
+from data_adapters.block2_adapter import adapt_block2
+from data_adapters.block2_study import load_block2_study
+
+def _assert_same_as_adapter(study):
+    profiles = study.profiles()
+    assert list(profiles) == study.patient_ids
+    for pid, profile in profiles.items():
+        assert profile == adapt_block2(pid, study.base_paths[pid])
+
+def test_study_profiles_match_adapter():
+    for study_dir in ["data/Study W01", "data/Study W02"]:
+        _assert_same_as_adapter(load_block2_study(study_dir))
+
+def test_study_edge_cases(tmp_path):
+    folder = tmp_path / "Patients"
+    folder.mkdir()
+    (tmp_path / "manifest.csv").write_text("patient_id\nX1\nX2\n")
+    header = "patient_id,collection_date,test_name,value,unit\n"
+    # X1: пустой renal_labs перекрывает blood_labs, нечисловой UACR пропускается
+    (folder / "X1_renal_labs.csv").write_text(header)
+    (folder / "X1_blood_labs.csv").write_text(header + "X1,2025-01-01,eGFR,50,x\n")
+    (folder / "X1_urinalysis.csv").write_text(header + "X1,2025-01-01,UACR,40,mg/g\nX1,2025-01-02,UACR,trace,mg/g\n")
+    # X2: широкий формат лабораторий → fallback на adapt_block2
+    (folder / "X2_blood_labs.csv").write_text("patient_id,egfr\nX2,61\nX2,\n")
+    (folder / "X2_anamnesis.csv").write_text("patient_id,narrative_note\nX2,Type 1 diabetes since childhood\n")
+
+    study = load_block2_study(str(tmp_path))
+    _assert_same_as_adapter(study)
+    profiles = study.profiles()
+    assert profiles["X1"].egfr is None and profiles["X1"].uacr == 40.0
+    assert profiles["X2"].egfr == 61.0 and profiles["X2"].type1_diabetes is True
+    assert os.path.basename(profiles["X2"].source_files["labs"]) == "X2_blood_labs.csv"
+
+def test_study_converts_lab_units(tmp_path):
+    folder = tmp_path / "Patients"
+    folder.mkdir()
+    (tmp_path / "manifest.csv").write_text("patient_id\nX1\n")
+    header = "patient_id,collection_date,test_name,value,unit\n"
+    # HbA1c в IFCC пересчитывается в %, eGFR с неизвестной единицей пропускается
+    (folder / "X1_renal_labs.csv").write_text(
+        header
+        + "X1,2025-01-01,eGFR (CKD-EPI),55,mL/min/1.73m2\n"
+        + "X1,2025-01-02,eGFR (CKD-EPI),0.9,mL/s\n"
+        + "X1,2025-01-02,HbA1c,53,mmol/mol\n"
+    )
+    (folder / "X1_urinalysis.csv").write_text(header + "X1,2025-01-01,Urine albumin/creatinine ratio,5,mg/mmol\n")
+
+    study = load_block2_study(str(tmp_path))
+    _assert_same_as_adapter(study)
+    profile = study.profiles()["X1"]
+    assert profile.egfr == 55.0
+    assert profile.hba1c == pytest.approx(53 * 0.09148 + 2.152)
+    assert profile.uacr == pytest.approx(44.2)
+    issues = study.frames["renal_labs"]["_issue"].tolist()
+    assert issues[1:] == ["unknown_unit", "converted"] and pd.isna(issues[0])
+
+def test_study_reads_only_files_for_protocol_fields():
+    study = load_block2_study("data/Study W01", fields={"egfr"})
+    assert study.frames["urinalysis"].empty and study.frames["anamnesis"].empty
+    full = load_block2_study("data/Study W01").profiles()
+    for pid, profile in study.profiles().items():
+        assert profile.egfr == full[pid].egfr
+        assert profile.uacr is None and profile.type1_diabetes is None
+        assert adapt_block2(pid, study.base_paths[pid], {"egfr"}) == profile
@@ -0,0 +1,31 @@
+import pandas as pd
+from core.cohort_engine import evaluate_cohort
+from core.rule_engine import evaluate_patient
+from data_adapters.block1_adapter import adapt_block1
+from protocol_loader import load_compiled_protocol
+
+def test_cohort_matches_evaluate_patient():
+    df = pd.read_csv("data/block1_data.tsv", sep="\t", encoding="cp1252")
+    profiles = [adapt_block1(row).model_dump() for row in df.to_dict("records")]
+    # Несовместимые типы и пустые значения тоже должны совпадать
+    profiles.append({"patient_id": "odd", "age": "unknown", "sbp": 120})
+    # NaN (пустая ячейка из адаптеров Block 2) — отсутствующее значение в обоих движках
+    profiles.append({"patient_id": "nan", "age": 60, "lvef": 30.0, "egfr": float("nan"), "sbp": float("nan")})
+    profiles_df = pd.DataFrame(profiles)
+
+    for path in ["protocols/dapa_hf.yaml", "protocols/sigir_20141.yaml"]:
+        plan = load_compiled_protocol(path)
+        matrix = evaluate_cohort(profiles_df, plan)
+        for i, profile in enumerate(profiles):
+            expected = evaluate_patient(profile, plan)
+            row = matrix.iloc[i]
+            assert row["overall_status"] == expected["overall_status"]
+            for r in expected["rule_results"]:
+                assert row[r["rule_id"]] == r["status"]
+
+def test_cohort_missing_column():
+    plan = load_compiled_protocol("protocols/w01.yaml")
+    matrix = evaluate_cohort(pd.DataFrame({"egfr": [45.0, 20.0]}), plan)
+    assert list(matrix["R1"]) == ["passed", "failed"]
+    assert list(matrix["R2"]) == ["missing", "missing"]
+    assert set(matrix["overall_status"]) == {"not enough information"}
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from core.cohort_store import CohortStore, cohort_record
+from core.models import BulkProfile
+from core.rule_engine import evaluate_patient
+
+RULES = [
+    {"id": "R1", "type": "inclusion", "field": "lvef", "operator": "<=", "value": 40},
+    {"id": "R2", "type": "inclusion", "field": "egfr", "operator": ">=", "value": 30},
+    {"id": "R3", "type": "exclusion", "field": "type1_diabetes", "operator": "==", "value": False},
+]
+PROFILES = {
+    "P1": BulkProfile("P1", lvef=35.0, egfr=27.0, type1_diabetes=False),
+    "P2": BulkProfile("P2", lvef=30.0, egfr=45.0, type1_diabetes=False),
+    "P3": BulkProfile("P3", lvef=38.0, egfr=None, type1_diabetes=False),
+    "P4": BulkProfile("P4", lvef=55.0, egfr=60.0, type1_diabetes=True),
+}
+
+def _store(tmp_path):
+    store = CohortStore(str(tmp_path / "cohorts"))
+    records = [cohort_record(pid, p, evaluate_patient(p, RULES)) for pid, p in PROFILES.items()]
+    assert store.write("Study A", "dapa", RULES, records) == 4
+    return store
+
+def test_write_and_read_partition(tmp_path):
+    store = _store(tmp_path)
+    assert store.partitions() == [("Study A", "dapa")]
+
+    table = store.read("Study A", "dapa", columns=["patient_id", "egfr", "status.R2", "overall_status"])
+    assert table.column_names == ["patient_id", "egfr", "status.R2", "overall_status"]
+    rows = {row["patient_id"]: row for row in table.to_pylist()}
+    assert rows["P1"]["status.R2"] == "failed"
+    assert rows["P2"]["overall_status"] == "included"
+    assert rows["P3"]["egfr"] is None and rows["P3"]["overall_status"] == "not enough information"
+
+    # Раздел перезаписывается целиком
+    store.write("Study A", "dapa", RULES, [cohort_record("P9", PROFILES["P2"], evaluate_patient(PROFILES["P2"], RULES))])
+    assert store.read("Study A", "dapa", ["patient_id"]).column("patient_id").to_pylist() == ["P9"]
+
+def test_feasibility_queries_match_full_evaluation(tmp_path):
+    store = _store(tmp_path)
+    assert store.count_where("Study A", "dapa", "egfr", ">=", 25) == {"passed": 3, "failed": 0, "missing": 1}
+    for operator, value in [("between", [20, 50]), ("in", [28.0, 60.0])]:
+        rule = {"id": "X", "type": "inclusion", "field": "egfr", "operator": operator, "value": value}
+        statuses = [evaluate_patient(p, [rule])["rule_results"][0]["status"] for p in PROFILES.values()]
+        expected = {status: statuses.count(status) for status in ("passed", "failed", "missing")}
+        assert store.count_where("Study A", "dapa", "egfr", operator, value) == expected
+    with pytest.raises(ValueError):
+        store.count_where("Study A", "dapa", "egfr", "between", 20)
+
+    amended = [dict(RULES[0]), dict(RULES[1], value=25), dict(RULES[2])]
+    cohort = store.what_if("Study A", "dapa", amended)
+    for pid, profile in PROFILES.items():
+        assert cohort.loc[pid, "overall_status"] == evaluate_patient(profile, amended)["overall_status"]
+    assert cohort.loc["P1", "overall_status"] == "included"
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from core.cohort_engine import evaluate_cohort
+from core.feasibility import sweep_threshold
+from data_adapters.block1_adapter import adapt_block1
+from protocol_loader import load_protocol_yaml
+
+def test_sweep_matches_evaluate_cohort():
+    df = pd.read_csv("data/block1_data.tsv", sep="\t", encoding="cp1252")
+    profiles = [adapt_block1(row).model_dump() for row in df.to_dict("records")]
+    profiles.append({"patient_id": "odd", "age": "unknown", "lvef": 30, "egfr": 40})
+    # Число в строке — не число: сравнение с порогом не проходит, как в evaluate_patient
+    profiles.append({"patient_id": "text", "age": 60, "lvef": "35", "nt_probnp": 900, "egfr": 40,
+                     "sglt2_inhibitor": True, "type1_diabetes": True, "bp_systolic": 80})
+    profiles_df = pd.DataFrame(profiles)
+    rules = load_protocol_yaml("protocols/dapa_hf.yaml")
+    # Без отсутствующих полей, иначе почти все пациенты — not enough information
+    profiles_df = profiles_df.fillna({r["field"]: 0 for r in rules if r["field"] != "egfr"})
+
+    for rule in rules:
+        if isinstance(rule["value"], bool):
+            thresholds = [False, True]
+        else:
+            thresholds = list(np.linspace(0, 2 * rule["value"], 9))
+        for op in ("<=", ">=", "<", ">", "==", "!="):
+            amended_rules = [dict(r, operator=op) if r is rule else r for r in rules]
+            sweep = sweep_threshold(profiles_df, amended_rules, rule["id"], thresholds)
+            for t in thresholds:
+                amended = [dict(r, operator=op, value=t) if r is rule else r for r in rules]
+                expected = evaluate_cohort(profiles_df, amended)["overall_status"].value_counts()
+                assert sweep.loc[t].to_dict() == expected.to_dict(), (rule["id"], op, t)
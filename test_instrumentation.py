@@ -0,0 +1,37 @@
+import json
+
+from core.instrumentation import METRICS, Metrics
+from screen import screen
+
+def test_metrics_summary_and_prometheus():
+    metrics = Metrics()
+    with metrics.timer("extract"):
+        pass
+    assert metrics.timers == {}  # выключены — ничего не записывается
+
+    metrics.enable()
+    with metrics.timer("extract"):
+        pass
+    metrics.incr("files_opened_total")
+    metrics.incr("rule_status_total", rule="R1", status="passed")
+    metrics.incr("rule_status_total", rule="R1", status="missing", value=3)
+
+    other = Metrics()
+    other.merge(metrics.drain())
+    assert metrics.counters == {}
+    summary = other.summary()
+    assert summary["stages"]["extract"]["calls"] == 1
+    assert summary["rules"]["R1"] == {"evaluated": 4, "missing": 3, "missing_rate": 0.75}
+    prom = other.to_prometheus()
+    assert 'enrollornot_rule_status_total{rule="R1",status="missing"} 3' in prom
+    assert "enrollornot_files_opened_total 1" in prom
+
+def test_screen_metrics_from_workers(tmp_path):
+    path = tmp_path / "metrics.json"
+    screen("protocols/w01.yaml", "data/Study W01", str(tmp_path / "w01.csv"),
+           workers=2, chunk_size=4, metrics_path=str(path))
+    summary = json.loads(path.read_text(encoding="utf-8"))
+    assert summary["counters"]["files_opened_total"] == 30
+    assert summary["rules"]["R1"]["evaluated"] == 10
+    assert "block2_study.load" in summary["stages"]
+    assert not METRICS.enabled
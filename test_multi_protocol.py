@@ -0,0 +1,39 @@
+import csv
+import os
+
+from core.multi_protocol import MultiProtocol, load_protocols
+from core.rule_engine import evaluate_patient
+from data_adapters.block1_adapter import adapt_block1
+from data_adapters.block1_source import iter_block1_rows
+from protocol_loader import load_compiled_protocol
+from screen import screen, screen_protocols
+
+def test_shared_conditions_are_deduplicated():
+    egfr = {"id": "R1", "type": "inclusion", "field": "egfr", "operator": ">=", "value": 30}
+    multi = MultiProtocol({
+        "a": [egfr],
+        "b": [dict(egfr, id="E1"), {"id": "E2", "type": "exclusion", "field": "egfr", "operator": "<", "value": 15}],
+    })
+    assert multi.n_conditions == 2
+    assert multi.overall({"egfr": 20}) == {"a": "excluded", "b": "excluded"}
+    assert multi.overall({"egfr": None}) == {"a": "not enough information", "b": "not enough information"}
+
+def test_multi_protocol_matches_evaluate_patient():
+    multi = load_protocols("protocols")
+    plans = {name: load_compiled_protocol(f"protocols/{name}.yaml") for name in multi.names}
+    for row in iter_block1_rows("data/block1_data.tsv"):
+        profile = adapt_block1(row).model_dump()
+        assert multi.evaluate(profile) == {name: evaluate_patient(profile, plan) for name, plan in plans.items()}
+
+def test_screen_protocols_matrix(tmp_path):
+    out = tmp_path / "matrix.csv"
+    counts = screen_protocols("protocols", "data/Study W01", str(out), chunk_size=4)
+    with open(out, encoding="utf-8") as f:
+        matrix = {row["patient_id"]: row for row in csv.DictReader(f)}
+    assert len(matrix) == 10
+    for name in counts:
+        single = tmp_path / f"{name}.csv"
+        screen(os.path.join("protocols", f"{name}.yaml"), "data/Study W01", str(single), workers=1)
+        with open(single, encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                assert matrix[row["patient_id"]][name] == row["overall_status"]
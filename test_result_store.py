@@ -0,0 +1,37 @@
+from core.result_store import ResultStore
+from core.rule_engine import evaluate_patient
+
+RULES = [
+    {"id": "R1", "type": "inclusion", "field": "lvef", "operator": "<=", "value": 40},
+    {"id": "R2", "type": "exclusion", "field": "type1_diabetes", "operator": "==", "value": False},
+]
+PROFILES = {
+    "P1": {"lvef": 35, "type1_diabetes": False},
+    "P2": {"lvef": 42, "type1_diabetes": False},
+    "P3": {"lvef": None, "type1_diabetes": True},
+}
+
+def test_only_changed_rules_are_reevaluated(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    store.put_profiles("dapa", PROFILES)
+
+    first = store.screen("dapa", RULES)
+    assert first["evaluated"] == 6
+    assert store.screen("dapa", RULES)["evaluated"] == 0
+
+    # Правка порога: переоценивается одно правило, остальное — из хранилища
+    amended = [dict(RULES[0], value=45), dict(RULES[1], description="renamed")]
+    update = store.screen("dapa", amended)
+    assert update["evaluated"] == 3
+    assert update["changed"] == {"P2": ("excluded", "included")}
+    for pid, profile in PROFILES.items():
+        assert update["results"][pid] == evaluate_patient(profile, amended)
+
+    # Новое правило и обновлённый профиль
+    added = amended + [{"id": "R3", "type": "inclusion", "field": "egfr", "operator": ">=", "value": 30}]
+    store.put_profiles("dapa", {"P1": {"lvef": 35, "type1_diabetes": False, "egfr": 50}})
+    update = store.screen("dapa", added)
+    assert update["evaluated"] == 3 + 2
+    assert update["results"]["P1"]["overall_status"] == "included"
+    assert update["results"]["P2"]["overall_status"] == "not enough information"
+    store.close()
@@ -0,0 +1,231 @@
+from core.rule_engine import compile_protocol, evaluate_patient
+from protocol_loader import load_compiled_protocol, load_protocol_yaml
+
+def test_compiled_protocol_split():
+    plan = load_compiled_protocol("protocols/dapa_hf.yaml")
+    assert [plan.checks[i][0] for i in plan.inclusion_idx] == ["R1", "R2", "R3", "R4"]
+    assert [plan.checks[i][0] for i in plan.exclusion_idx] == ["R5", "R6", "R7"]
+    assert plan.rules_by_id["R2"]["field"] == "lvef"
+    assert "egfr" in plan.fields
+
+def test_compiled_matches_raw_rules():
+    def statuses(profile, rules):
+        result = evaluate_patient(profile, rules)
+        return [r["status"] for r in result["rule_results"]], result["overall_status"]
+
+    # Ожидаемые статусы записаны явно: и список правил, и CompiledProtocol
+    # должны давать именно их
+    rules = load_protocol_yaml("protocols/sigir_20141.yaml")
+    cases = [
+        ({"age": 40, "congestive_hf": False, "unstable_angina": False,
+          "calcium_channel_blocker": False, "type1_diabetes": False, "sbp": 120},
+         (["passed", "passed", "failed", "failed", "failed", "failed", "failed", "failed"], "excluded")),
+        ({"age": 70, "sbp": 120},
+         (["passed", "failed", "missing", "missing", "missing", "missing", "failed", "failed"],
+          "not enough information")),
+        # Строка вместо числа несравнима с порогом — правило не выполнено
+        ({"age": "unknown", "congestive_hf": True, "unstable_angina": True,
+          "calcium_channel_blocker": True, "type1_diabetes": True, "sbp": 190},
+         (["failed", "failed", "passed", "passed", "passed", "passed", "failed", "passed"], "excluded")),
+    ]
+    for profile, expected in cases:
+        assert statuses(profile, rules) == expected, profile
+        assert statuses(profile, compile_protocol(rules)) == expected, profile
+
+    # Правило без типа inclusion/exclusion на итог влияет только через missing
+    rules = [
+        {"id": "R1", "type": "inclusion", "field": "egfr", "operator": ">=", "value": 30},
+        {"id": "R2", "type": "exclusion", "field": "pregnant", "operator": "==", "value": False},
+        {"id": "R3", "type": "note", "field": "age", "operator": ">=", "value": 18},
+    ]
+    cases = [
+        ({"egfr": 45, "pregnant": False, "age": 12}, (["passed", "passed", "failed"], "included")),
+        ({"egfr": 45, "pregnant": True, "age": 40}, (["passed", "failed", "passed"], "excluded")),
+        ({"egfr": "45", "pregnant": False, "age": 40}, (["failed", "passed", "passed"], "excluded")),
+        ({"egfr": float("nan"), "pregnant": False, "age": 40},
+         (["missing", "passed", "passed"], "not enough information")),
+        ({"egfr": 45, "pregnant": False}, (["passed", "passed", "missing"], "not enough information")),
+    ]
+    for profile, expected in cases:
+        assert statuses(profile, rules) == expected, profile
+        assert statuses(profile, compile_protocol(rules)) == expected, profile
+
+def test_stop_at_missing_stops_at_first_missing_rule():
+    plan = load_compiled_protocol("protocols/dapa_hf.yaml")
+    requested = []
+
+    class Profile(dict):
+        def get(self, field, default=None):
+            requested.append(field)
+            return super().get(field, default)
+
+    # R1 (age >= 18) не выполнено, lvef (R2) и остальные поля отсутствуют:
+    # итог решён на R2, дальше поля не читаются
+    profile = Profile(age=16)
+    result = evaluate_patient(profile, plan, stop_at_missing=True)
+    assert result == {
+        "rule_results": [{"rule_id": "R1", "status": "failed"}, {"rule_id": "R2", "status": "missing"}],
+        "overall_status": "not enough information",
+    }
+    assert requested == ["age", "lvef"]
+
+    # Итог всегда как у полной оценки; rule_results — её начало
+    rules = [
+        {"id": "R1", "type": "inclusion", "field": "egfr", "operator": ">=", "value": 30},
+        {"id": "R2", "type": "inclusion", "field": "lvef", "operator": "<=", "value": 40},
+        {"id": "R3", "type": "note", "field": "age", "operator": ">=", "value": 18},
+    ]
+    for profile in [{"egfr": 10}, {"egfr": 10, "lvef": 30, "age": 12}, {"egfr": 45, "lvef": 30, "age": 12},
+                    {"lvef": 50, "age": 40}, {"egfr": 45, "lvef": 50, "age": 40}]:
+        full, early = evaluate_patient(profile, rules), evaluate_patient(profile, rules, stop_at_missing=True)
+        assert early["overall_status"] == full["overall_status"], profile
+        assert early["rule_results"] == full["rule_results"][:len(early["rule_results"])]
+    assert evaluate_patient({"egfr": 10}, rules, stop_at_missing=True)["overall_status"] == "not enough information"
+
+def test_bulk_profile_reads_like_dict():
+    from core.models import BulkProfile, PatientProfile
+
+    plan = load_compiled_protocol("protocols/dapa_hf.yaml")
+    profile = PatientProfile(patient_id="P1", age=64, lvef=30.0, nt_probnp=900.0, egfr=45.0,
+                             nyha_class=2, gdmtd_hf_therapy=True, sglt2_inhibitor=False,
+                             type1_diabetes=False)
+    bulk = BulkProfile.from_profile(profile)
+    assert evaluate_patient(bulk, plan) == evaluate_patient(profile.model_dump(), plan)
+    assert bulk.to_profile() == profile
+    assert bulk.to_dict() == profile.model_dump()
+
+    bulk.update({"baseline_ldl": 150.0})
+    assert bulk.get("baseline_ldl") == 150.0 and bulk["lvef"] == 30.0
+    assert "baseline_ldl" in bulk and bulk.get("uacr") is None and bulk.get("unknown", 0) == 0
+
+# Составные правила: диапазон возраста, OR по маркерам, NOT
+COMPOUND_RULES = [
+    {"id": "C1", "type": "inclusion", "field": "age", "operator": "between", "value": [18, 75]},
+    {"id": "C2", "type": "inclusion", "expr": {"any": [
+        {"field": "lvef", "operator": "<=", "value": 40},
+        {"all": [
+            {"field": "nt_probnp", "operator": ">=", "value": 600},
+            {"not": {"field": "sglt2_inhibitor", "operator": "==", "value": True}},
+        ]},
+    ]}},
+    {"id": "C3", "type": "exclusion", "expr": {"all": [
+        {"field": "nyha_class", "operator": "in", "value": [3, 4]},
+        {"field": "lvef", "operator": "<=", "value": 40},
+    ]}},
+]
+
+def _compound_profiles():
+    import itertools
+
+    values = {
+        "age": [None, 16, 60],
+        "lvef": [None, 30.0, 50.0],
+        "nt_probnp": [None, 300.0, 900.0],
+        "sglt2_inhibitor": [None, True, False],
+        "nyha_class": [None, 2, 3],
+    }
+    for combo in itertools.product(*values.values()):
+        yield {k: v for k, v in zip(values, combo) if v is not None}
+
+def _kleene(statuses, kind):
+    decisive, other = ("failed", "passed") if kind == "all" else ("passed", "failed")
+    if decisive in statuses:
+        return decisive
+    return "missing" if "missing" in statuses else other
+
+def test_compound_rules_three_valued_logic():
+    plan = compile_protocol(COMPOUND_RULES)
+    assert plan.fields == {"age", "lvef", "nt_probnp", "sglt2_inhibitor", "nyha_class"}
+    assert plan.rule_fields["C3"] == {"nyha_class", "lvef"}
+
+    def leaf(profile, field, check):
+        value = profile.get(field)
+        return "missing" if value is None else ("passed" if check(value) else "failed")
+
+    for profile in _compound_profiles():
+        lvef = leaf(profile, "lvef", lambda v: v <= 40)
+        probnp = leaf(profile, "nt_probnp", lambda v: v >= 600)
+        sglt2 = {"passed": "failed", "failed": "passed"}.get(leaf(profile, "sglt2_inhibitor", lambda v: v), "missing")
+        expected = [
+            leaf(profile, "age", lambda v: 18 <= v <= 75),
+            _kleene([lvef, _kleene([probnp, sglt2], "all")], "any"),
+            _kleene([leaf(profile, "nyha_class", lambda v: v in (3, 4)), lvef], "all"),
+        ]
+        result = evaluate_patient(profile, plan)
+        assert [r["status"] for r in result["rule_results"]] == expected, profile
+
+def test_compound_cohort_matches_patient():
+    import pandas as pd
+
+    from core.cohort_engine import evaluate_cohort
+
+    plan = compile_protocol(COMPOUND_RULES)
+    profiles = list(_compound_profiles())
+    matrix = evaluate_cohort(pd.DataFrame(profiles), plan)
+    for i, profile in enumerate(profiles):
+        result = evaluate_patient(profile, plan)
+        assert matrix["overall_status"].iloc[i] == result["overall_status"]
+        for r in result["rule_results"]:
+            assert matrix[r["rule_id"]].iloc[i] == r["status"]
+
+def test_shared_subexpressions_are_evaluated_once():
+    plan = compile_protocol(COMPOUND_RULES)
+    # lvef <= 40 встречается в C2 и C3 — один узел
+    leaves = [node for node in plan.expressions.values() if node.kind == "leaf" and node.field == "lvef"]
+    assert len(leaves) == 1
+
+    requested = []
+
+    class Profile(dict):
+        def get(self, field, default=None):
+            requested.append(field)
+            return super().get(field, default)
+
+    evaluate_patient(Profile(age=60, lvef=30.0, nyha_class=3), plan)
+    assert sorted(requested) == ["age", "lvef", "nyha_class"]
+
+def test_selectivity_orders_checks_without_changing_results():
+    from core.instrumentation import METRICS
+    from core.rule_engine import selectivity_from_metrics
+
+    profiles = list(_compound_profiles())
+    plan = compile_protocol(COMPOUND_RULES)
+    METRICS.reset()
+    METRICS.enable()
+    try:
+        expected = [evaluate_patient(p, plan) for p in profiles]
+        summary = METRICS.summary()
+    finally:
+        METRICS.disable()
+        METRICS.reset()
+
+    selectivity = selectivity_from_metrics(summary)
+    c2 = plan.checks[1][2]
+    assert c2.label in selectivity
+    # В any первым проверяется ребёнок, который чаще passed
+    reordered = compile_protocol(COMPOUND_RULES, selectivity)
+    rates = [selectivity[child.label]["passed_rate"] for child in reordered.checks[1][2].children]
+    assert rates == sorted(rates, reverse=True)
+
+    inverted = {label: {"passed_rate": 1 - s["passed_rate"], "failed_rate": 1 - s["failed_rate"]}
+                for label, s in selectivity.items()}
+    for other in (reordered, compile_protocol(COMPOUND_RULES, inverted)):
+        assert [evaluate_patient(p, other) for p in profiles] == expected
+
+def test_invalid_compound_rules_rejected():
+    import pytest
+
+    from core.models import Rule
+
+    with pytest.raises(ValueError):
+        compile_protocol([{"id": "X", "type": "inclusion", "expr": {"all": [], "any": []}}])
+    with pytest.raises(ValueError):
+        compile_protocol([{"id": "X", "type": "inclusion", "expr": {"any": []}}])
+    with pytest.raises(ValueError):
+        compile_protocol([{"id": "X", "type": "inclusion", "field": "age", "operator": "between", "value": 18}])
+    assert Rule(**COMPOUND_RULES[1]).expr is not None
+    with pytest.raises(ValueError):
+        Rule(id="X", type="inclusion", field="age", operator=">=", value=18, expr={"not": {}})
+    with pytest.raises(ValueError):
+        Rule(id="X", type="inclusion", field="age", operator=">=")
+    assert Rule(id="X", type="exclusion", field="gender", operator="==", value=None).value is None
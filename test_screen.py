@@ -0,0 +1,185 @@
+import csv
+from screen import screen
+
+def test_screen_block2_csv(tmp_path):
+    out = tmp_path / "w01.csv"
+    counts = screen("protocols/w01.yaml", "data/Study W01", str(out), workers=1, chunk_size=3)
+    with open(out, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == sum(counts.values()) == 10
+    assert list(rows[0]) == ["patient_id", "overall_status", "R1", "R2", "R3"]
+    assert {row["patient_id"] for row in rows} == {f"P{i:04d}" for i in range(1, 11)}
+
+def test_screen_block2_reads_manifest_once(tmp_path, monkeypatch):
+    from data_adapters import block2_study
+
+    reads = []
+    read_manifest = block2_study.read_manifest
+    monkeypatch.setattr(block2_study, "read_manifest", lambda d: reads.append(d) or read_manifest(d))
+    counts = screen("protocols/w02.yaml", "data/Study W02", str(tmp_path / "w02.csv"), workers=1, chunk_size=4)
+    assert sum(counts.values()) == 30
+    assert reads == ["data/Study W02"]
+
+def test_screen_w02_statuses(tmp_path):
+    import pandas as pd
+
+    out = tmp_path / "w02.csv"
+    counts = screen("protocols/w02.yaml", "data/Study W02", str(out), workers=1)
+    # UACR (R2) в данных W02 нет, поэтому итог у всех "not enough information",
+    # а R4–R9 видны только в колонках правил
+    assert counts == {"not enough information": 30}
+    rows = pd.read_csv(out).set_index("patient_id")
+    assert (rows["R2"] == "missing").all()
+    # S0026: ЛПНП в mmol/L пересчитан (R4 проходит), но единицы нестандартные (R9)
+    assert rows.loc["S0026", ["R4", "R9"]].tolist() == ["passed", "failed"]
+    assert (rows["R9"] == "failed").sum() == 1
+
+def test_screen_block1_trial_filter(tmp_path):
+    out = tmp_path / "dapa.csv"
+    counts = screen("protocols/dapa_hf.yaml", "data/block1_data.tsv", str(out),
+                    trial_id="NCT03036124", workers=2, chunk_size=20)
+    assert sum(counts.values()) == 55
+
+def test_profile_cache_reuse_and_invalidation(tmp_path, monkeypatch):
+    from data_adapters import block2_adapter
+    from data_adapters.profile_cache import ProfileCache
+
+    cache = ProfileCache(str(tmp_path / "profiles.sqlite"))
+    base = "data/Study W01/Eligible Patients"
+    first = cache.block2("P0001", base)
+    assert cache.block2("P0001", base) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    monkeypatch.setattr(block2_adapter, "EXTRACTOR_VERSION", "test")
+    assert cache.block2("P0001", base) == first
+    assert cache.misses == 2
+    cache.close()
+
+    out = tmp_path / "w01.csv"
+    screen("protocols/w01.yaml", "data/Study W01", str(out), workers=1, cache_path=cache.path)
+    screen("protocols/w01.yaml", "data/Study W01", str(out), workers=1, cache_path=cache.path)
+    import screen as screen_module
+    assert screen_module._CACHE.hits >= 10
+
+def test_profile_cache_follows_manifest_file_names(tmp_path):
+    import shutil
+    import screen as screen_module
+
+    study = tmp_path / "W01"
+    shutil.copytree("data/Study W01", study)
+    labs = study / "Eligible Patients" / "P0001_blood_labs.csv"
+    renamed = labs.with_name("P0001_labs_export.csv")
+    labs.rename(renamed)
+    manifest = study / "manifest.csv"
+    manifest.write_text(manifest.read_text().replace("P0001_blood_labs.csv", renamed.name))
+
+    cache, out = str(tmp_path / "profiles.sqlite"), tmp_path / "w01.csv"
+    screen("protocols/w01.yaml", str(study), str(out), workers=1, cache_path=cache)
+    screen("protocols/w01.yaml", str(study), str(out), workers=1, cache_path=cache)
+    assert (screen_module._CACHE.hits, screen_module._CACHE.misses) == (10, 0)
+
+    # Файл с именем из manifest изменился — профиль извлекается заново
+    with open(renamed, "a", encoding="utf-8") as f:
+        f.write("P0001,2025-11-10,Blood,eGFR (CKD-EPI),20.0,mL/min/1.73 m²,≥ 60,L,Central Lab,\n")
+    screen("protocols/w01.yaml", str(study), str(out), workers=1, cache_path=cache)
+    assert (screen_module._CACHE.hits, screen_module._CACHE.misses) == (9, 1)
+    with open(out, encoding="utf-8") as f:
+        rows = {row["patient_id"]: row for row in csv.DictReader(f)}
+    assert rows["P0001"]["R1"] == "failed"
+
+def test_profile_cache_with_features_reads_only_feature_files(tmp_path, monkeypatch):
+    from data_adapters import block2_study
+
+    cache = str(tmp_path / "profiles.sqlite")
+    first, second = tmp_path / "first.csv", tmp_path / "second.csv"
+    screen("protocols/w02.yaml", "data/Study W02", str(first), workers=1, cache_path=cache)
+
+    read = []
+    read_many = block2_study.read_many
+    monkeypatch.setattr(block2_study, "read_many", lambda paths, n: read.extend(paths) or read_many(paths, n))
+    screen("protocols/w02.yaml", "data/Study W02", str(second), workers=1, cache_path=cache)
+    assert read and not [path for path in read if path.endswith("_clinical_note.csv")]
+    assert first.read_text() == second.read_text()
+
+def test_incremental_screen_reextracts_on_extractor_version(tmp_path, monkeypatch):
+    from data_adapters import block1_adapter, block2_adapter
+    from screen import screen_incremental
+
+    store = str(tmp_path / "results.sqlite")
+    screen_incremental("protocols/w01.yaml", "data/Study W01", store)
+    assert screen_incremental("protocols/w01.yaml", "data/Study W01", store)["extracted"] == 0
+    monkeypatch.setattr(block2_adapter, "EXTRACTOR_VERSION", "test")
+    assert screen_incremental("protocols/w01.yaml", "data/Study W01", store)["extracted"] == 10
+
+    args = ("protocols/dapa_hf.yaml", "data/block1_data.tsv", store, "NCT03036124")
+    screen_incremental(*args)
+    monkeypatch.setattr(block1_adapter, "EXTRACTOR_VERSION", "test")
+    assert screen_incremental(*args)["extracted"] == 55
+
+def test_incremental_screen_reextracts_changed_patients(tmp_path):
+    import glob
+    import os
+    import shutil
+    from screen import screen_incremental
+
+    study = tmp_path / "W01"
+    shutil.copytree("data/Study W01", study)
+    store = str(tmp_path / "results.sqlite")
+
+    first = screen_incremental("protocols/w01.yaml", str(study), store)
+    assert first["extracted"] == 10
+    assert first["results"]["P0001"]["overall_status"] == "excluded"
+
+    again = screen_incremental("protocols/w01.yaml", str(study), store)
+    assert (again["extracted"], again["evaluated"], again["changed"]) == (0, 0, {})
+
+    # Пропал файл мочи одного пациента: UACR неизвестен
+    for path in glob.glob(str(study / "*" / "P0001_urinalysis.csv")):
+        os.remove(path)
+    delta = screen_incremental("protocols/w01.yaml", str(study), store)
+    assert delta["extracted"] == 1
+    assert delta["evaluated"] == 3
+    assert delta["changed"] == {"P0001": ("excluded", "not enough information")}
+
+def test_store_rejects_flags_it_ignores(tmp_path, capsys):
+    import pytest
+    from screen import main
+
+    args = ["protocols/w01.yaml", "data/Study W01", "-o", str(tmp_path / "w01.csv"),
+            "--store", str(tmp_path / "results.sqlite")]
+    with pytest.raises(SystemExit):
+        main(args + ["--workers", "4", "--stop-at-missing"])
+    assert "--workers, --stop-at-missing cannot be used with --store" in capsys.readouterr().err
+    assert main(args + ["--io-threads", "2"]) == 0
+
+def test_dependent_flags_require_their_parent(tmp_path, capsys):
+    import pytest
+    from screen import main
+
+    args = ["protocols/w01.yaml", "data/Study W01", "-o", str(tmp_path / "w01.csv")]
+    with pytest.raises(SystemExit):
+        main(args + ["--refresh", "--delta", str(tmp_path / "delta.csv")])
+    assert "--refresh, --delta require --store" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        main(args + ["--study", "W01"])
+    assert "--study require --cohort-store" in capsys.readouterr().err
+
+def test_protocol_directory_rejects_single_protocol_flags(tmp_path, capsys):
+    import pytest
+    from screen import main
+
+    with pytest.raises(SystemExit):
+        main(["protocols", "data/Study W01", "-o", str(tmp_path / "matrix.csv"), "--workers", "4"])
+    assert "--workers need a single protocol file" in capsys.readouterr().err
+
+def test_cohort_store_rejects_stop_at_missing(tmp_path, capsys):
+    import pytest
+    from screen import main
+
+    with pytest.raises(SystemExit):
+        main(["protocols/sigir_20141.yaml", "data/block1_data.tsv", "-o", str(tmp_path / "out.csv"),
+              "--cohort-store", str(tmp_path / "cohorts"), "--stop-at-missing"])
+    assert "--stop-at-missing cannot be used with --cohort-store" in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        screen("protocols/w01.yaml", "data/Study W01", str(tmp_path / "w01.csv"), workers=1,
+               stop_at_missing=True, cohort_store=str(tmp_path / "cohorts"))
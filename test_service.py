@@ -0,0 +1,79 @@
+import http.client
+import json
+import shutil
+import threading
+
+import pytest
+
+from core.rule_engine import evaluate_patient
+from protocol_loader import load_protocol_yaml
+from service import make_server
+
+@pytest.fixture
+def server(tmp_path):
+    protocols = tmp_path / "protocols"
+    shutil.copytree("protocols", protocols)
+    server = make_server(port=0, protocols_dir=str(protocols), reload_interval=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, protocols
+    server.shutdown()
+    server.server_close()
+
+def _request(server, method, path, body=None):
+    conn = http.client.HTTPConnection(*server.server_address)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None)
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return response.status, data
+
+def test_single_and_batched_profiles(server):
+    server, _ = server
+    rules = load_protocol_yaml("protocols/dapa_hf.yaml")
+    profiles = [
+        {"patient_id": "P1", "age": 64, "lvef": 35, "nt_probnp": 900, "egfr": 45},
+        {"age": 70, "lvef": 55},
+    ]
+    status, result = _request(server, "POST", "/protocols/dapa_hf/screen", profiles[0])
+    assert status == 200
+    assert result == {"patient_id": "P1", **evaluate_patient(profiles[0], rules)}
+
+    status, results = _request(server, "POST", "/protocols/dapa_hf/screen", {"profiles": profiles})
+    assert status == 200
+    assert results[1] == evaluate_patient(profiles[1], rules)
+
+    assert _request(server, "POST", "/protocols/unknown/screen", {})[0] == 404
+    assert _request(server, "POST", "/protocols/dapa_hf/screen", [1, 2])[0] == 400
+
+def test_invalid_content_length(server):
+    server, _ = server
+    for length in ("abc", "-1"):
+        conn = http.client.HTTPConnection(*server.server_address)
+        conn.putrequest("POST", "/protocols/dapa_hf/screen")
+        conn.putheader("Content-Length", length)
+        conn.endheaders()
+        response = conn.getresponse()
+        assert response.status == 400
+        assert json.loads(response.read()) == {"error": f"Invalid Content-Length: {length}"}
+        conn.close()
+
+def test_protocol_hot_reload(server):
+    server, protocols = server
+    path = protocols / "w01.yaml"
+    profile = {"egfr": 25}
+    _, before = _request(server, "POST", "/protocols/w01/screen", profile)
+    assert before["rule_results"][0]["status"] == "failed"
+
+    text = path.read_text(encoding="utf-8")
+    rules = load_protocol_yaml(str(path))
+    amended = text.replace(f"value: {rules[0]['value']}", "value: 20", 1)
+    path.write_text(amended + "\n", encoding="utf-8")
+    _, after = _request(server, "POST", "/protocols/w01/screen", profile)
+    assert after["rule_results"][0]["status"] == "passed"
+
+    # Сломанный YAML не заменяет рабочую версию
+    path.write_text("rules: [", encoding="utf-8")
+    assert _request(server, "POST", "/protocols/w01/screen", profile)[1] == after
+    _, listed = _request(server, "GET", "/protocols")
+    assert "error" in next(p for p in listed if p["name"] == "w01")
@@ -0,0 +1,63 @@
+import random
+
+from core.rule_engine import evaluate_patient
+from core.trial_index import TrialIndex, build_trial_index
+from data_adapters.block1_adapter import adapt_block1
+from data_adapters.block1_source import iter_block1_rows
+
+def _expected(index, profile):
+    results = {name: evaluate_patient(profile, plan)["overall_status"] for name, plan in index.plans.items()}
+    return {name: status for name, status in results.items() if status != "excluded"}
+
+def test_match_agrees_with_rule_engine():
+    rng = random.Random(7)
+    protocols = {}
+    for n in range(300):
+        rules = [
+            {"id": f"R{j}", "type": rng.choice(["inclusion", "exclusion"]), "field": field,
+             "operator": rng.choice([">=", "<=", ">", "<", "==", "!="]), "value": rng.choice([20, 30, 30.5, 40])}
+            for j, field in enumerate(rng.sample(["age", "egfr", "lvef"], rng.randint(1, 3)))
+        ]
+        if n % 7 == 0:
+            rules.append({"id": "B", "type": "exclusion", "field": "type1_diabetes", "operator": "==", "value": False})
+        if n % 11 == 0:
+            rules.append({"id": "G", "type": "inclusion", "field": "gender", "operator": "==", "value": "male"})
+        protocols[f"p{n}"] = rules
+    index = TrialIndex(protocols)
+
+    values = [None, 10, 20, 25, 30, 30.5, 35, 40, 50, "unknown"]
+    for _ in range(200):
+        profile = {field: rng.choice(values) for field in ("age", "egfr", "lvef")}
+        profile.update(type1_diabetes=rng.choice([True, False, None]), gender=rng.choice(["male", "female", None]))
+        expected = _expected(index, profile)
+        assert index.match(profile, include_unknown=True) == expected
+        assert index.match(profile) == {k: v for k, v in expected.items() if v == "included"}
+
+def test_repository_protocols():
+    index = build_trial_index("protocols")
+    for row in iter_block1_rows("data/block1_data.tsv"):
+        profile = adapt_block1(row).model_dump()
+        assert index.match(profile, include_unknown=True) == _expected(index, profile)
+    # В sigir_20141 должны выполняться и sbp < 100, и sbp >= 180: пустой
+    # интервал, протокол не становится кандидатом ни при каком sbp
+    profile = {field: True for field in index.plans["sigir_20141"].fields}
+    for sbp in (90, 100, 150, 180, 200):
+        assert "sigir_20141" not in index.candidates(dict(profile, age=40, sbp=sbp))
+
+def test_between_and_compound_rules():
+    protocols = {
+        "range": [{"id": "R1", "type": "inclusion", "field": "age", "operator": "between", "value": [18, 65]}],
+        "compound": [
+            {"id": "R1", "type": "inclusion", "field": "age", "operator": ">=", "value": 40},
+            {"id": "R2", "type": "inclusion", "expr": {"any": [
+                {"field": "lvef", "operator": "<=", "value": 40},
+                {"field": "nyha_class", "operator": "in", "value": [3, 4]},
+            ]}},
+        ],
+    }
+    index = TrialIndex(protocols)
+    assert index.candidates({"age": 70}) == ["compound"]
+    assert index.match({"age": 50, "nyha_class": 3}) == {"range": "included", "compound": "included"}
+    # age < 40 отсеивает compound в индексе, но без lvef/nyha_class итог — not enough information
+    assert index.match({"age": 30}, include_unknown=True) == {
+        "range": "included", "compound": "not enough information"}